@@ -3,8 +3,15 @@ import subprocess
 import tempfile
 import os
 import base64
+import hashlib
+import json
 from datetime import datetime
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # ANSI color codes
 BLUE = "\033[94m"
 RED = "\033[91m"
@@ -16,6 +23,11 @@ OUTPUT_CONFIGMAP = "users.yaml"
 CERT_FILE = "pub-cert.pem"
 NAMESPACE = "postgres"
 OUTPUT_SEALED = "sealed-users.yaml"
+# Pre-compiled copy of users.yaml for the controller: "json", "msgpack" or "none"
+SIDECAR_FORMAT = os.getenv("SIDECAR_FORMAT", "json")
+# Split the desired state over this many ConfigMaps (CONFIGMAP_SELECTOR on the controller)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_LABEL = "postgres-controller/users-shard"
 
 def load_users():
     with open(EDIT_FILE, "r") as f:
@@ -61,6 +73,70 @@ def seal(secret_yaml):
 
     return yaml.safe_load(result.stdout.decode())
 
+def add_sidecar(configmap, users):
+    """Add users.sha256 and a pre-compiled users.json/users.msgpack next to users.yaml"""
+    if SIDECAR_FORMAT == "none":
+        return
+    data = configmap["data"]
+    # The controller only trusts the sidecar while this digest matches users.yaml
+    data["users.sha256"] = hashlib.sha256(data["users.yaml"].encode()).hexdigest()
+    if SIDECAR_FORMAT == "msgpack":
+        if msgpack is None:
+            print(f"{RED}SIDECAR_FORMAT=msgpack requires the msgpack package{RESET}")
+            exit(1)
+        configmap["binaryData"] = {
+            "users.msgpack": base64.b64encode(msgpack.packb({"users": users})).decode()
+        }
+    else:
+        data["users.json"] = json.dumps({"users": users}, separators=(",", ":"))
+
+def shard_of(username):
+    """Stable shard index, so editing one user only changes that user's shard"""
+    return int(hashlib.sha256(username.encode()).hexdigest(), 16) % SHARD_COUNT
+
+def make_configmaps(users):
+    """One ConfigMap with every user, or SHARD_COUNT labeled shards"""
+    if SHARD_COUNT <= 1:
+        configmap = {
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": {
+                "name": "postgres-users-config",
+                "namespace": NAMESPACE
+            },
+            "data": {
+                "users.yaml": yaml.dump({
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "users": users
+                })
+            }
+        }
+        add_sidecar(configmap, users)
+        return [configmap]
+
+    shards = [[] for _ in range(SHARD_COUNT)]
+    for user in users:
+        shards[shard_of(user["username"])].append(user)
+
+    configmaps = []
+    for index, shard_users in enumerate(shards):
+        # No timestamp: an unchanged shard must keep its resourceVersion
+        configmap = {
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": {
+                "name": f"postgres-users-config-{index:03d}",
+                "namespace": NAMESPACE,
+                "labels": {SHARD_LABEL: "true"}
+            },
+            "data": {
+                "users.yaml": yaml.dump({"users": shard_users})
+            }
+        }
+        add_sidecar(configmap, shard_users)
+        configmaps.append(configmap)
+    return configmaps
+
 def main():
     users = load_users()
     sealed_secrets = [seal(make_secret_yaml(user)) for user in users]
@@ -76,23 +152,12 @@ def main():
         cleaned = {k: v for k, v in user.items() if k != "password"}
         cleaned_users.append(cleaned)
 
-    users_configmap = {
-        "apiVersion": "v1",
-        "kind": "ConfigMap",
-        "metadata": {
-            "name": "postgres-users-config",
-            "namespace": NAMESPACE
-        },
-        "data": {
-            "users.yaml": yaml.dump({
-                "timestamp": datetime.utcnow().isoformat(),
-                "users": cleaned_users
-            })
-        }
-    }
+    configmaps = make_configmaps(cleaned_users)
 
     with open(OUTPUT_CONFIGMAP, "w") as f:
-        yaml.dump(users_configmap, f)
+        yaml.dump_all(configmaps, f)
+    if len(configmaps) > 1:
+        print(f"{WHITE}Users split over {len(configmaps)} ConfigMaps labeled {SHARD_LABEL}{RESET}")
 
     print(f"{WHITE}Passwords removed from output: {OUTPUT_CONFIGMAP}{RESET}")
 
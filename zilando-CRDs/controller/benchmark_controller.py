@@ -0,0 +1,1072 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the PostgreSQL User Controller
+
+Runs the controller in-process against a local fake Kubernetes API server
+(ConfigMaps and Secrets, including watch streams with bookmarks) and an
+in-memory stand-in for the database catalog, and prints machine-readable
+JSON results.
+
+Usage:
+    python benchmark_controller.py watch-latency --mode watch --changes 20
+    python benchmark_controller.py watch-latency --mode poll --sync-interval 2
+    python benchmark_controller.py scale --users 1000,10000,100000 --output baseline.json
+    python benchmark_controller.py scale --users 10000 --baseline baseline.json
+    python benchmark_controller.py state --users 1000,10000,100000
+    python benchmark_controller.py parse --users 1000,10000,50000
+    python benchmark_controller.py failover --mode crash --downtime 2
+    python benchmark_controller.py plan --users 1000,10000,100000
+    python benchmark_controller.py memory --users 10000,100000
+"""
+
+import sys
+import os
+import json
+import time
+import base64
+import logging
+import random
+import gc
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, List, Optional, Set, Tuple
+
+import yaml
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from kubernetes import client
+
+import controller as ctl
+from controller import (
+    Config, UserSpec, CatalogSnapshot, KubernetesClient, StateManager, SQLiteStateManager,
+    PostgresUserController, DesiredStateLoader, create_state_manager
+)
+
+
+# ============================================================================
+# FAKE KUBERNETES API
+# ============================================================================
+
+KINDS = {"configmaps": "ConfigMap", "secrets": "Secret"}
+
+
+class FakeKubeAPI:
+    """In-process fake of the CoreV1 ConfigMap/Secret endpoints, including watch"""
+
+    def __init__(self, namespace: str, bookmark_interval: float = 1.0):
+        self.namespace = namespace
+        self.bookmark_interval = bookmark_interval
+        self.objects: Dict[str, Dict[str, dict]] = {kind: {} for kind in KINDS}
+        self.events: Dict[str, List[tuple]] = {kind: [] for kind in KINDS}
+        self.resource_version = 0
+        self.requests = 0
+        self.cond = threading.Condition()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def _record(self, kind: str, event_type: str, obj: dict):
+        self.resource_version += 1
+        obj["metadata"]["resourceVersion"] = str(self.resource_version)
+        self.events[kind].append((self.resource_version, event_type, obj))
+        self.cond.notify_all()
+
+    def apply(self, kind: str, name: str, data: Dict[str, str]):
+        """Create or replace an object and emit the matching watch event"""
+        with self.cond:
+            event_type = "MODIFIED" if name in self.objects[kind] else "ADDED"
+            obj = {
+                "apiVersion": "v1",
+                "kind": KINDS[kind],
+                "metadata": {"name": name, "namespace": self.namespace},
+                "data": dict(data),
+            }
+            self.objects[kind][name] = obj
+            self._record(kind, event_type, obj)
+
+    def delete(self, kind: str, name: str):
+        """Delete an object and emit a DELETED event"""
+        with self.cond:
+            obj = self.objects[kind].pop(name, None)
+            if obj is not None:
+                self._record(kind, "DELETED", obj)
+
+    def apply_users(self, users: List[dict]):
+        """Write users.yaml to the users ConfigMap"""
+        self.apply("configmaps", Config.CONFIGMAP_NAME, {
+            "users.yaml": yaml.safe_dump({"users": users})
+        })
+
+    def apply_secret(self, username: str, password: str):
+        """Write a user-<name>-secret Secret"""
+        self.apply("secrets", ctl.secret_name_for_user(username), {
+            "password": base64.b64encode(password.encode()).decode()
+        })
+
+    def start(self) -> str:
+        """Start serving on an ephemeral port and return the base URL"""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                api.requests += 1
+                api.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+    def handle(self, req: BaseHTTPRequestHandler):
+        url = urlparse(req.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        # /api/v1/namespaces/{ns}/{kind}[/{name}]
+        if len(parts) < 5 or parts[4] not in KINDS:
+            return self._send(req, 404, {"kind": "Status", "code": 404})
+        kind = parts[4]
+
+        if len(parts) == 6:
+            with self.cond:
+                obj = self.objects[kind].get(parts[5])
+            if obj is None:
+                return self._send(req, 404, {"kind": "Status", "code": 404, "reason": "NotFound"})
+            return self._send(req, 200, obj)
+
+        name = None
+        selector = query.get("fieldSelector", "")
+        if selector.startswith("metadata.name="):
+            name = selector.split("=", 1)[1]
+
+        if query.get("watch") in ("true", "1", "True"):
+            return self._watch(req, kind, name, query)
+
+        with self.cond:
+            items = [o for n, o in self.objects[kind].items() if name is None or n == name]
+            body = {
+                "apiVersion": "v1",
+                "kind": KINDS[kind] + "List",
+                "metadata": {"resourceVersion": str(self.resource_version)},
+                "items": items,
+            }
+        return self._send(req, 200, body)
+
+    def _send(self, req, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(payload)))
+        req.end_headers()
+        req.wfile.write(payload)
+
+    def _watch(self, req, kind: str, name: Optional[str], query: dict):
+        since = int(query.get("resourceVersion") or 0)
+        deadline = time.monotonic() + int(query.get("timeoutSeconds") or 300)
+        bookmarks = query.get("allowWatchBookmarks") in ("true", "True")
+
+        req.send_response(200)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Transfer-Encoding", "chunked")
+        req.end_headers()
+
+        try:
+            while time.monotonic() < deadline:
+                with self.cond:
+                    pending = [e for e in self.events[kind] if e[0] > since]
+                    if not pending:
+                        self.cond.wait(min(self.bookmark_interval, max(deadline - time.monotonic(), 0)))
+                        pending = [e for e in self.events[kind] if e[0] > since]
+                    current = self.resource_version
+
+                lines = []
+                for rv, event_type, obj in pending:
+                    since = rv
+                    if name is None or obj["metadata"]["name"] == name:
+                        lines.append({"type": event_type, "object": obj})
+                if not pending and bookmarks:
+                    lines.append({"type": "BOOKMARK", "object": {
+                        "apiVersion": "v1",
+                        "kind": KINDS[kind],
+                        "metadata": {"resourceVersion": str(current)},
+                    }})
+                for line in lines:
+                    chunk = json.dumps(line).encode() + b"\n"
+                    req.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                req.wfile.flush()
+            req.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+# ============================================================================
+# IN-MEMORY DATABASE
+# ============================================================================
+
+class InMemoryDatabaseClient:
+    """Stand-in for DatabaseClient that applies changes to an in-memory catalog"""
+
+    dbname = "postgres"
+
+    def __init__(self):
+        self.users: Dict[str, Set[str]] = {}
+        self.roles: Set[str] = set()
+        self.applied_at: Dict[str, float] = {}
+        self.statements = 0
+        self.lock = threading.Lock()
+
+    def fetch_existing_users(self) -> Set[str]:
+        with self.lock:
+            return set(self.users) | set(self.roles)
+
+    def fetch_existing_roles(self) -> Set[str]:
+        with self.lock:
+            return set(self.roles)
+
+    def fetch_user_roles(self, username: str) -> Set[str]:
+        with self.lock:
+            return set(self.users.get(username, set()))
+
+    def fetch_catalog_snapshot(self) -> CatalogSnapshot:
+        with self.lock:
+            roles = {name: False for name in self.roles}
+            roles.update({name: True for name in self.users})
+            memberships = {name: set(granted) for name, granted in self.users.items() if granted}
+            # Every user was created through this fake, so all carry the managed comment
+            return CatalogSnapshot(roles, memberships, {name: {"postgres"} for name in self.users},
+                                   managed=set(self.users))
+
+    def fetch_catalog_digest(self) -> str:
+        with self.lock:
+            return repr((sorted(self.roles), sorted((u, sorted(r)) for u, r in self.users.items())))
+
+    def fetch_dependency_counts(self, usernames: List[str]) -> Dict[str, Dict[Optional[str], Tuple[int, int]]]:
+        # Nothing is owned; each user holds CONNECT on its database
+        return {username: {None: (0, 1)} for username in usernames if username in self.users}
+
+    def map_databases(self, func, items: Dict[str, object]) -> Dict[str, object]:
+        return {dbname: func(self, item) for dbname, item in items.items()}
+
+    def fetch_privilege_index(self, targets) -> ctl.PrivilegeIndex:
+        # Every user holds CONNECT on its database and nothing else
+        with self.lock:
+            connect = [f"{username}=c/postgres" for username in self.users]
+        return ctl.PrivilegeIndex({target: connect for target in targets if target[0] == "database"})
+
+    def create_role(self, role_name: str, dry_run: bool = False):
+        with self.lock:
+            self.roles.add(role_name)
+            self.statements += 1
+
+    def drop_role(self, role_name: str, dry_run: bool = False):
+        with self.lock:
+            self.roles.discard(role_name)
+            self.statements += 1
+
+    def create_user(self, user_spec: UserSpec, password: str, dry_run: bool = False):
+        with self.lock:
+            self.users[user_spec.username] = set(user_spec.roles)
+            self.applied_at[user_spec.username] = time.monotonic()
+            self.statements += 2 + len(user_spec.roles)
+
+    def update_user_roles(self, username: str, old_roles: Set[str], new_roles: Set[str], dry_run: bool = False):
+        with self.lock:
+            self.users[username] = set(new_roles)
+            self.applied_at[username] = time.monotonic()
+            self.statements += len(old_roles ^ new_roles)
+
+    def drop_user(self, username: str, dry_run: bool = False):
+        with self.lock:
+            self.users.pop(username, None)
+            self.applied_at.pop(username, None)
+            self.statements += 4
+
+    def apply_operation(self, operation, dry_run: bool = False):
+        if operation.kind == "create_role":
+            self.create_role(operation.username)
+        elif operation.kind == "drop":
+            self.drop_user(operation.username)
+        elif operation.kind == "create":
+            self.create_user(operation.spec, operation.password)
+        elif operation.kind == "update":
+            current = self.fetch_user_roles(operation.username)
+            self.update_user_roles(operation.username, current, (current - operation.revoke) | operation.grant)
+
+    def apply_batch(self, kind: str, operations) -> int:
+        before = self.statements
+        for operation in operations:
+            self.apply_operation(operation)
+        return self.statements - before
+
+    def close(self):
+        pass
+
+
+# ============================================================================
+# TWO-NODE CLUSTER STAND-IN
+# ============================================================================
+
+class TwoNodeCluster:
+    """
+    Stand-in for a Patroni cluster of two members behind one address
+
+    Replaces psycopg2's ThreadedConnectionPool with a pool whose connections
+    are bound to the member that was primary when they were opened, and
+    answer DatabaseClient's primary probe like that member would.
+    """
+
+    def __init__(self, members=("10.0.0.1", "10.0.0.2")):
+        self.members = list(members)
+        self.primary: Optional[str] = self.members[0]
+        self.down: Set[str] = set()
+        self.started = {member: str(time.time()) for member in self.members}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def connect(self) -> "FakeConnection":
+        """Open a connection like target_session_attrs=read-write would"""
+        with self.lock:
+            if self.primary is None:
+                raise ctl.psycopg2.OperationalError("could not connect: no server accepts read-write sessions")
+            self.connections += 1
+            return FakeConnection(self, self.primary)
+
+    def crash(self, downtime: float):
+        """Lose the primary; the other member is promoted after downtime seconds"""
+        with self.lock:
+            old, self.primary = self.primary, None
+            self.down.add(old)
+        threading.Timer(downtime, self._promote, args=(old,)).start()
+
+    def switchover(self, downtime: float):
+        """Demote the primary to a replica (its connections stay open) and promote the other"""
+        with self.lock:
+            old, self.primary = self.primary, None
+        threading.Timer(downtime, self._promote, args=(old,)).start()
+
+    def _promote(self, old: str):
+        with self.lock:
+            self.primary = next(member for member in self.members if member != old)
+            # The old primary rejoins as a replica
+            self.down.discard(old)
+            self.started[old] = str(time.time())
+
+    def pool(self, minconn: int, maxconn: int, **params) -> "FakePool":
+        return FakePool(self, minconn)
+
+
+class FakeConnection:
+    def __init__(self, cluster: TwoNodeCluster, member: str):
+        self.cluster = cluster
+        self.member = member
+        self.started = cluster.started[member]
+        self.closed = 0
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        cluster, conn = self.conn.cluster, self.conn
+        if conn.closed or conn.member in cluster.down or cluster.started[conn.member] != conn.started:
+            conn.closed = 2
+            raise ctl.psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.row = (cluster.primary != conn.member, conn.member, conn.started)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakePool:
+    def __init__(self, cluster: TwoNodeCluster, minconn: int):
+        self.cluster = cluster
+        self.idle = [cluster.connect() for _ in range(minconn)]
+        self.used: List[FakeConnection] = []
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else self.cluster.connect()
+            self.used.append(conn)
+            return conn
+
+    def putconn(self, conn, close=False):
+        with self.lock:
+            if conn not in self.used:
+                raise ctl.pool.PoolError("trying to put unkeyed connection")
+            self.used.remove(conn)
+            if not (close or conn.closed):
+                self.idle.append(conn)
+
+    def closeall(self):
+        with self.lock:
+            for conn in self.idle + self.used:
+                conn.close()
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> dict:
+    """Summarize latency samples (seconds) in milliseconds"""
+    return {
+        "samples": len(samples),
+        "mean_ms": round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(1000 * percentile(samples, 50), 3),
+        "p95_ms": round(1000 * percentile(samples, 95), 3),
+        "p99_ms": round(1000 * percentile(samples, 99), 3),
+        "max_ms": round(1000 * max(samples), 3) if samples else 0.0,
+    }
+
+
+def make_user(index: int, roles: List[str]) -> dict:
+    return {"username": f"bench_user_{index}", "database": "postgres", "roles": roles}
+
+
+def wait_until(predicate, timeout: float, interval: float = 0.001) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def bench_watch_latency(args) -> dict:
+    """Measure ConfigMap-change-to-applied latency in watch or poll mode"""
+    api = FakeKubeAPI(Config.NAMESPACE, bookmark_interval=args.bookmark_interval)
+    url = api.start()
+
+    users = [make_user(i, ["bench_role"]) for i in range(args.users)]
+    for user in users:
+        api.apply_secret(user["username"], "secret")
+    api.apply_users(users)
+
+    Config.SYNC_INTERVAL = args.sync_interval
+    Config.RESYNC_INTERVAL = args.resync_interval
+    Config.WATCH_DEBOUNCE_SECONDS = args.debounce
+
+    state_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+    os.unlink(state_file)
+    db = InMemoryDatabaseClient()
+    k8s = KubernetesClient(api_client=client.ApiClient(client.Configuration(host=url)))
+    controller = PostgresUserController(k8s_client=k8s, db_client=db, state_manager=create_state_manager(state_file))
+
+    stop_event = threading.Event()
+    if args.mode == "watch":
+        target = lambda: controller.run_watch_loop(stop_event)
+    else:
+        target = controller.run_reconciliation_loop
+    threading.Thread(target=target, daemon=True).start()
+
+    if not wait_until(lambda: len(db.users) >= args.users, timeout=60):
+        raise RuntimeError("Initial users were not applied")
+
+    samples = []
+    requests_before = api.requests
+    for i in range(args.users, args.users + args.changes):
+        user = make_user(i, ["bench_role"])
+        users.append(user)
+        api.apply_secret(user["username"], "secret")
+        started = time.monotonic()
+        api.apply_users(users)
+        if not wait_until(lambda: user["username"] in db.applied_at, timeout=args.sync_interval + 30):
+            raise RuntimeError(f"Change {i} was not applied")
+        samples.append(db.applied_at[user["username"]] - started)
+
+    stop_event.set()
+    controller.stop()
+    api.stop()
+    if os.path.exists(state_file):
+        os.unlink(state_file)
+
+    return {
+        "benchmark": "watch-latency",
+        "mode": args.mode,
+        "initial_users": args.users,
+        "changes": args.changes,
+        "api_requests": api.requests - requests_before,
+        "watch_events": controller.metrics.watch_events_count,
+        "latency": latency_summary(samples),
+    }
+
+
+def generate_users(count: int, roles: int, fan_out: int, rng: random.Random, start: int = 0) -> List[dict]:
+    """Generate users with fan_out roles each, drawn from a pool of roles"""
+    pool = [f"bench_role_{i}" for i in range(roles)]
+    return [make_user(i, sorted(rng.sample(pool, min(fan_out, roles)))) for i in range(start, start + count)]
+
+
+def apply_churn(users: List[dict], api: FakeKubeAPI, churn: float, roles: int, fan_out: int,
+                rng: random.Random, next_index: int) -> int:
+    """
+    Mutate a churn fraction of the users: a third removed, a third added,
+    a third re-granted. Returns the next unused user index.
+    """
+    changes = int(len(users) * churn)
+    removed, added, regranted = changes // 3, changes // 3, changes - 2 * (changes // 3)
+
+    for user in rng.sample(users, min(removed, len(users))):
+        users.remove(user)
+    for user in rng.sample(users, min(regranted, len(users))):
+        user["roles"] = generate_users(1, roles, fan_out, rng)[0]["roles"]
+    new_users = generate_users(added, roles, fan_out, rng, start=next_index)
+    for user in new_users:
+        api.apply_secret(user["username"], "secret")
+    users.extend(new_users)
+    return next_index + added
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scale(args, users_count: int) -> dict:
+    """Run the initial sync plus churn cycles for one population size"""
+    rng = random.Random(args.seed)
+    api = FakeKubeAPI(Config.NAMESPACE)
+    url = api.start()
+
+    users = generate_users(users_count, args.roles, args.fan_out, rng)
+    for user in users:
+        api.apply_secret(user["username"], "secret")
+    api.apply_users(users)
+
+    Config.DDL_BATCH_SIZE = args.batch_size
+    Config.RECONCILE_WORKERS = args.workers
+    state_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+    os.unlink(state_file)
+    # --database postgres uses DB_HOST/DB_USER/... and must point at a throwaway instance
+    db = ctl.DatabaseClient() if args.database == "postgres" else InMemoryDatabaseClient()
+    k8s = KubernetesClient(api_client=client.ApiClient(client.Configuration(host=url)))
+    controller = PostgresUserController(k8s_client=k8s, db_client=db, state_manager=create_state_manager(state_file))
+
+    statements = []
+    execute = controller.executor.execute
+
+    def counting_execute(operations, dry_run=False):
+        results = execute(operations, dry_run=dry_run)
+        statements.append(sum(r.statements for r in results))
+        return results
+
+    controller.executor.execute = counting_execute
+
+    def timed_cycle(reason: str) -> Tuple[float, int]:
+        del statements[:]
+        started = time.perf_counter()
+        stats = controller.run_cycle(reason)
+        if stats.errors:
+            raise RuntimeError(f"Cycle '{reason}' finished with {stats.errors} errors")
+        return time.perf_counter() - started, sum(statements)
+
+    try:
+        initial_seconds, initial_statements = timed_cycle("initial sync")
+
+        samples, churn_statements = [], 0
+        next_index = users_count
+        for _ in range(args.cycles):
+            next_index = apply_churn(users, api, args.churn, args.roles, args.fan_out, rng, next_index)
+            api.apply_users(users)
+            seconds, count = timed_cycle("churn")
+            samples.append(seconds)
+            churn_statements += count
+    finally:
+        api.stop()
+        db.close()
+        if os.path.exists(state_file):
+            os.unlink(state_file)
+
+    with controller.metrics._lock:
+        phases = {
+            label: round(histogram.sum, 4)
+            for (family, label), histogram in sorted(controller.metrics.histograms.items())
+            if family == "postgres_controller_phase_duration_seconds"
+        }
+
+    return {
+        "users": users_count,
+        "initial_sync": {
+            "seconds": round(initial_seconds, 4),
+            "ddl_statements": initial_statements,
+            "ddl_per_second": round(initial_statements / initial_seconds, 1) if initial_seconds else 0.0,
+        },
+        "cycle_latency": latency_summary(samples),
+        "churn_ddl_per_second": round(churn_statements / sum(samples), 1) if sum(samples) else 0.0,
+        "phase_seconds_total": phases,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_state(args) -> dict:
+    """Compare load/save cost of the JSON and SQLite state backends as users grow"""
+    runs = []
+    for size in [int(size) for size in args.users.split(",")]:
+        rng = random.Random(args.seed)
+        users = {u["username"]: UserSpec(**u) for u in generate_users(size, args.roles, args.fan_out, rng)}
+        run = {"users": size}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backends = {
+                "json": StateManager(os.path.join(tmpdir, "state.json")),
+                "sqlite": SQLiteStateManager(os.path.join(tmpdir, "state.db")),
+            }
+            for name, manager in backends.items():
+                manager.save_state(users)
+                manager.close()
+                # Reopen so the first load pays for reading the whole store, as after a restart
+                manager = StateManager(manager.state_file) if name == "json" else SQLiteStateManager(manager.db_file)
+                started = time.perf_counter()
+                manager.load_state()
+                first_load = time.perf_counter() - started
+                loads, saves = [], []
+                for _ in range(args.cycles):
+                    changed = rng.sample(sorted(users), min(size, args.changes))
+                    for username in changed:
+                        users[username] = UserSpec(username=username, database="postgres",
+                                                   roles=[f"bench_role_{rng.randrange(args.roles)}"])
+                    started = time.perf_counter()
+                    state = manager.load_state()
+                    # The planner reads the previous spec of every desired user
+                    for username in users:
+                        state.get(username)
+                    loads.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    manager.save_state(users)
+                    saves.append(time.perf_counter() - started)
+                run[name] = {"first_load_ms": round(1000 * first_load, 3),
+                             "load": latency_summary(loads), "save": latency_summary(saves)}
+                manager.close()
+        runs.append(run)
+    return {"benchmark": "state", "changes": args.changes, "cycles": args.cycles, "runs": runs}
+
+
+def bench_parse(args) -> dict:
+    """Compare parse time and peak allocations of the desired-state loaders by user count"""
+    runs = []
+    for size in [int(size) for size in args.users.split(",")]:
+        users = generate_users(size, args.roles, args.fan_out, random.Random(args.seed))
+        document = yaml.safe_dump({"users": users})
+        variants = {
+            "yaml_pure": (DesiredStateLoader(streaming=False), document, yaml.SafeLoader),
+            "yaml_libyaml": (DesiredStateLoader(streaming=False), document, ctl.YAML_LOADER),
+            "yaml_streaming": (DesiredStateLoader(streaming=True), document, None),
+            "json_sidecar": (DesiredStateLoader(), json.dumps({"users": users}), None),
+        }
+        if ctl.msgpack is not None:
+            variants["msgpack_sidecar"] = (DesiredStateLoader(), ctl.msgpack.packb({"users": users}), None)
+
+        run = {"users": size, "document_mb": round(len(document) / 1e6, 2)}
+        for name, (loader, content, yaml_loader) in variants.items():
+            original = ctl.YAML_LOADER
+            if yaml_loader is not None:
+                ctl.YAML_LOADER = yaml_loader
+            try:
+                samples = []
+                for _ in range(args.cycles):
+                    started = time.perf_counter()
+                    count = sum(1 for _ in loader.iter_users(content))
+                    samples.append(time.perf_counter() - started)
+                tracemalloc.start()
+                sum(1 for _ in loader.iter_users(content))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            finally:
+                ctl.YAML_LOADER = original
+            assert count == size
+            run[name] = {"parse": latency_summary(samples), "peak_alloc_mb": round(peak / 1e6, 1)}
+
+        # Unchanged content only costs the digest
+        loader = DesiredStateLoader()
+        loader.load(document)
+        started = time.perf_counter()
+        loader.load(document)
+        run["memoized_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        runs.append(run)
+    return {"benchmark": "parse", "libyaml": ctl.YAML_LOADER is not yaml.SafeLoader, "runs": runs}
+
+
+def bench_failover(args) -> dict:
+    """Measure time-to-recover of DatabaseClient after primary failovers of a two-node stand-in"""
+    cluster = TwoNodeCluster()
+    original = ctl.psycopg2.pool.ThreadedConnectionPool
+    ctl.psycopg2.pool.ThreadedConnectionPool = cluster.pool
+    Config.RETRY_BASE_DELAY = args.retry_base_delay
+    Config.RETRY_MAX_DELAY = args.retry_max_delay
+    Config.BREAKER_RESET_SECONDS = args.breaker_reset
+    try:
+        db = ctl.DatabaseClient()
+        db.metrics = ctl.Metrics()
+        outages, failed_checkouts = [], 0
+        for _ in range(args.failovers):
+            getattr(cluster, args.mode)(args.downtime)
+            failed_at = time.monotonic()
+            # Reconcile cycles keep checking out connections at a fixed interval
+            while True:
+                ctl.Retrier.start_cycle(budget=args.interval)
+                try:
+                    conn = db.get_connection()
+                except (ctl.psycopg2.Error, ctl.CircuitOpenError):
+                    failed_checkouts += 1
+                    time.sleep(args.interval)
+                    continue
+                db.return_connection(conn)
+                outages.append(time.monotonic() - failed_at)
+                break
+            time.sleep(args.interval)
+        histogram = db.metrics.histograms.get(("postgres_controller_failover_recovery_seconds", ""))
+    finally:
+        ctl.psycopg2.pool.ThreadedConnectionPool = original
+    return {
+        "benchmark": "failover",
+        "mode": args.mode,
+        "downtime_s": args.downtime,
+        "interval_s": args.interval,
+        "breaker_reset_s": args.breaker_reset,
+        "failovers": args.failovers,
+        # From the failover to the first connection to the new primary
+        "time_to_recover": latency_summary(outages),
+        # From detection, as exported by postgres_controller_failover_recovery_seconds
+        "detected_to_recovered_mean_ms": round(1000 * histogram.sum / histogram.count, 3) if histogram else 0.0,
+        "pool_invalidations": db.metrics.pool_invalidations_count,
+        "failed_checkouts": failed_checkouts,
+        "connections_opened": cluster.connections,
+    }
+
+
+def bench_plan(args) -> dict:
+    """Time planning (ordering, batching, cost estimates, JSON) separately from executing the same plan"""
+    runs = []
+    for size in [int(size) for size in args.users.split(",")]:
+        users = generate_users(size, args.roles, args.fan_out, random.Random(args.seed))
+        db = InMemoryDatabaseClient()
+        executor = ctl.PlanExecutor(db, batch_size=args.batch_size, metrics=ctl.Metrics())
+        stages = {
+            "create": [ctl.UserOperation("create_role", f"bench_role_{i}") for i in range(args.roles)] + [
+                ctl.UserOperation("create", user["username"], spec=UserSpec(**user), password="pw")
+                for user in users],
+            "drop": [ctl.UserOperation("drop", user["username"]) for user in users],
+        }
+        run = {"users": size}
+        for stage, operations in stages.items():
+            started = time.perf_counter()
+            plan = executor.plan(operations)
+            plan_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            document = plan.to_json()
+            json_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            results = executor.execute(plan)
+            execute_seconds = time.perf_counter() - started
+            totals = plan.totals()
+            run[stage] = {
+                "plan_ms": round(plan_seconds * 1000, 3),
+                "json_ms": round(json_seconds * 1000, 3),
+                "json_mb": round(len(document) / 1e6, 2),
+                "execute_ms": round(execute_seconds * 1000, 3),
+                "batches": totals["batches"],
+                "statements_estimated": totals["statements"],
+                "statements_executed": sum(result.statements for result in results),
+            }
+        runs.append(run)
+    return {"benchmark": "plan", "batch_size": args.batch_size, "runs": runs}
+
+
+def bench_memory(args) -> dict:
+    """Bytes per user retained by the desired state, the previous state and the drift sets"""
+    runs = []
+    for size in [int(size) for size in args.users.split(",")]:
+        rng = random.Random(args.seed)
+        users = generate_users(size, args.roles, args.fan_out, rng)
+        for user in rng.sample(users, int(size * args.privileges)):
+            user["privileges"] = {"public.orders": ["SELECT", "INSERT"], "schema:app": ["USAGE"]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = StateManager(os.path.join(tmpdir, "state.json"))
+            state.save_state({user["username"]: UserSpec(**user) for user in users})
+            content = json.dumps({"users": users})
+            # Usernames as the catalog returns them: distinct string objects
+            catalog = json.dumps([user["username"] for user in users])
+            del users
+            gc.collect()
+
+            tracemalloc.start()
+            desired = DesiredStateLoader().load(content)
+            desired_bytes = tracemalloc.get_traced_memory()[0]
+            previous = state.load_state()
+            previous_bytes = tracemalloc.get_traced_memory()[0] - desired_bytes
+            actual = set(json.loads(catalog))
+            drift = PostgresUserController.detect_drift(None, desired, actual)
+            drift_bytes = tracemalloc.get_traced_memory()[0] - desired_bytes - previous_bytes
+            tracemalloc.stop()
+
+        timings = {}
+        for name, work in (("hash_cold", lambda: [hash(spec) for spec in desired.values()]),
+                           ("hash_warm", lambda: [hash(spec) for spec in desired.values()]),
+                           ("compare", lambda: [previous[username] == spec for username, spec in desired.items()])):
+            started = time.perf_counter()
+            work()
+            timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        assert len(desired) == len(previous) == len(drift[2]) == size
+        runs.append({
+            "users": size,
+            "bytes_per_user": {
+                "desired": round(desired_bytes / size),
+                "previous": round(previous_bytes / size),
+                "drift_sets": round(drift_bytes / size),
+                "total": round((desired_bytes + previous_bytes + drift_bytes) / size),
+            },
+            **timings,
+        })
+    return {"benchmark": "memory", "roles": args.roles, "fan_out": args.fan_out,
+            "privileges": args.privileges, "runs": runs}
+
+
+def bench_roles(args) -> dict:
+    """Role graph cost: full build, incremental update after churn, topological order and planning"""
+    roles = {f"bench_role_{i}": ctl.RoleSpec(f"bench_role_{i}", [f"bench_role_{(i - 1) // 2}"] if i else [])
+             for i in range(args.roles)}
+    runs = []
+    for size in [int(size) for size in args.users.split(",")]:
+        rng = random.Random(args.seed)
+        desired = {user["username"]: UserSpec(**user)
+                   for user in generate_users(size, args.roles, args.fan_out, rng)}
+        timings = {}
+
+        def timed(name, work):
+            started = time.perf_counter()
+            value = work()
+            timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return value
+
+        graph = ctl.RoleGraph()
+        timed("build", lambda: graph.update(desired, roles))
+        order = timed("topological_order", graph.topological_order)
+        # Every role missing: the whole hierarchy is created in one plan
+        snapshot = CatalogSnapshot({}, {}, {})
+        operations = timed("plan_create", lambda: PostgresUserController.plan_role_operations(
+            None, desired, snapshot, graph=graph))
+
+        # Re-grant a churn fraction of the users from every role but the root
+        changed = rng.sample(sorted(desired), int(size * args.churn))
+        pool = [f"bench_role_{i}" for i in range(1, args.roles)]
+        for username in changed:
+            desired[username] = desired[username].replace(roles=rng.sample(pool, min(args.fan_out, len(pool))))
+        edges = timed("incremental_update", lambda: graph.update(desired, roles, changed))
+        timed("full_rebuild", lambda: ctl.RoleGraph().update(desired, roles))
+        runs.append({
+            "users": size,
+            "changed_users": len(changed),
+            "changed_edges": edges,
+            "roles_created": len(operations),
+            "orphans": len(graph.orphans),
+            **timings,
+        })
+        assert len(order) == len(operations) == args.roles
+    return {"benchmark": "roles", "roles": args.roles, "fan_out": args.fan_out, "churn": args.churn, "runs": runs}
+
+
+# Compared metrics: (path, True if higher is worse)
+REGRESSION_KEYS = [
+    (("initial_sync", "seconds"), True),
+    (("cycle_latency", "p95_ms"), True),
+    (("initial_sync", "ddl_per_second"), False),
+    (("peak_rss_mb",), True),
+]
+
+
+def compare_to_baseline(results: List[dict], baseline: dict, tolerance: float) -> List[dict]:
+    """List metrics that regressed by more than the tolerance against a baseline run"""
+    previous = {run["users"]: run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in results:
+        base = previous.get(run["users"])
+        if base is None:
+            continue
+        for path, higher_is_worse in REGRESSION_KEYS:
+            current, old = run, base
+            for key in path:
+                current, old = current[key], old[key]
+            if not old:
+                continue
+            change = (current - old) / old
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append({"users": run["users"], "metric": ".".join(path),
+                                    "baseline": old, "current": current, "change": round(change, 3)})
+    return regressions
+
+
+def bench_scale(args) -> dict:
+    """Measure cycle latency, DDL throughput and peak RSS at several population sizes"""
+    sizes = [int(size) for size in args.users.split(",")]
+    runs = []
+    if len(sizes) == 1:
+        runs.append(run_scale(args, sizes[0]))
+    else:
+        # One process per size so peak RSS is not inherited from a larger run
+        for size in sizes:
+            command = [sys.executable, os.path.abspath(__file__)] + (["--verbose"] if args.verbose else [])
+            command += ["scale", "--users", str(size), "--roles", str(args.roles), "--fan-out", str(args.fan_out),
+                        "--churn", str(args.churn), "--cycles", str(args.cycles), "--seed", str(args.seed),
+                        "--batch-size", str(args.batch_size), "--workers", str(args.workers),
+                        "--database", args.database]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            runs.extend(json.loads(output[output.index("{"):])["runs"])
+
+    result = {
+        "benchmark": "scale",
+        "database": args.database,
+        "roles": args.roles,
+        "fan_out": args.fan_out,
+        "churn": args.churn,
+        "cycles": args.cycles,
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "runs": runs,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare_to_baseline(runs, json.load(f), args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PostgreSQL User Controller benchmarks")
+    parser.add_argument("--verbose", action="store_true", help="Show controller logs")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("watch-latency", help="ConfigMap change to applied latency")
+    p.add_argument("--mode", choices=["watch", "poll"], default="watch")
+    p.add_argument("--users", type=int, default=10, help="Initial managed users")
+    p.add_argument("--changes", type=int, default=20, help="Number of ConfigMap changes to measure")
+    p.add_argument("--sync-interval", type=int, default=2, help="Poll interval (poll mode)")
+    p.add_argument("--resync-interval", type=int, default=600, help="Safety-net resync (watch mode)")
+    p.add_argument("--debounce", type=float, default=Config.WATCH_DEBOUNCE_SECONDS)
+    p.add_argument("--bookmark-interval", type=float, default=1.0)
+    p.set_defaults(func=bench_watch_latency)
+
+    p = sub.add_parser("scale", help="Cycle latency, DDL/s and peak RSS for large user populations")
+    p.add_argument("--users", default="1000,10000,100000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50, help="Size of the role pool")
+    p.add_argument("--fan-out", type=int, default=3, help="Roles granted to each user")
+    p.add_argument("--churn", type=float, default=0.01, help="Fraction of users changed per cycle")
+    p.add_argument("--cycles", type=int, default=10, help="Churn cycles measured after the initial sync")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--batch-size", type=int, default=Config.DDL_BATCH_SIZE)
+    p.add_argument("--workers", type=int, default=Config.RECONCILE_WORKERS)
+    p.add_argument("--database", choices=["memory", "postgres"], default="memory",
+                   help="postgres: a throwaway instance from DB_HOST/DB_USER/DB_PASS (unmanaged users are dropped)")
+    p.add_argument("--output", help="Write the results to this file")
+    p.add_argument("--baseline", help="Compare against a previous --output file")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    p.set_defaults(func=bench_scale)
+
+    p = sub.add_parser("state", help="Load/save cost of the state backends by user count")
+    p.add_argument("--users", default="1000,10000,100000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50)
+    p.add_argument("--fan-out", type=int, default=3)
+    p.add_argument("--changes", type=int, default=100, help="Users changed per save")
+    p.add_argument("--cycles", type=int, default=10)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_state)
+
+    p = sub.add_parser("parse", help="Desired-state parse cost by loader, format and user count")
+    p.add_argument("--users", default="1000,10000,50000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50)
+    p.add_argument("--fan-out", type=int, default=3)
+    p.add_argument("--cycles", type=int, default=3, help="Parses measured per variant")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("plan", help="Planning and JSON cost of a cycle's plan, separate from executing it")
+    p.add_argument("--users", default="1000,10000,100000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50)
+    p.add_argument("--fan-out", type=int, default=3)
+    p.add_argument("--batch-size", type=int, default=Config.DDL_BATCH_SIZE)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_plan)
+
+    p = sub.add_parser("memory", help="Retained bytes per user of the desired, previous and drift state")
+    p.add_argument("--users", default="10000,100000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50)
+    p.add_argument("--fan-out", type=int, default=3)
+    p.add_argument("--privileges", type=float, default=0.1, help="Fraction of users with object privileges")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("roles", help="Role graph build, incremental update and ordered role creation cost")
+    p.add_argument("--users", default="10000,100000", help="Comma-separated population sizes")
+    p.add_argument("--roles", type=int, default=50, help="Declared roles, nested as a binary tree")
+    p.add_argument("--fan-out", type=int, default=3)
+    p.add_argument("--churn", type=float, default=0.01, help="Fraction of users re-granted before the update")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_roles)
+
+    p = sub.add_parser("failover", help="Time-to-recover after failovers of a two-node stand-in cluster")
+    p.add_argument("--mode", choices=["crash", "switchover"], default="crash",
+                   help="crash: the primary goes down; switchover: it is demoted to a replica")
+    p.add_argument("--failovers", type=int, default=5)
+    p.add_argument("--downtime", type=float, default=1.0, help="Seconds until the other member is promoted")
+    p.add_argument("--interval", type=float, default=0.1, help="Seconds between connection checkouts")
+    p.add_argument("--retry-base-delay", type=float, default=Config.RETRY_BASE_DELAY)
+    p.add_argument("--retry-max-delay", type=float, default=Config.RETRY_MAX_DELAY)
+    p.add_argument("--breaker-reset", type=float, default=Config.BREAKER_RESET_SECONDS,
+                   help="Seconds an open circuit fails fast; bounds recovery once it opens")
+    p.set_defaults(func=bench_failover)
+
+    args = parser.parse_args()
+    if not args.verbose:
+        ctl.logger.setLevel(logging.WARNING)
+
+    result = args.func(args)
+    print(json.dumps(result, indent=2))
+    return 1 if result.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,22 +16,55 @@ Features:
 """
 
 import os
+import re
 import sys
 import time
+import asyncio
+import bisect
+import select
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import yaml
 import json
 import base64
+import binascii
+import hmac
 import logging
 import psycopg2
 from psycopg2 import sql, pool
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from kubernetes import client, config
+import urllib3
+from kubernetes import client, config, watch
 from kubernetes.client.rest import ApiException
-from datetime import datetime
-from typing import Dict, Set, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, Set, List, Optional, Tuple, Union
+from dataclasses import dataclass, asdict, field, replace
 from pathlib import Path
 import hashlib
+import heapq
+import itertools
+import random
+import sqlite3
+import unicodedata
+from collections.abc import Mapping
+
+# Optional dependencies of the asyncio engine (CONTROLLER_ENGINE=async)
+try:
+    import asyncpg
+    from kubernetes_asyncio import client as async_client, config as async_config
+except ImportError:
+    asyncpg = None
+    async_client = None
+    async_config = None
+
+# Optional: reading the users.msgpack sidecar written by seal_users.py
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # ANSI color codes
 BLUE = "\033[94m"
@@ -60,6 +93,10 @@ class Config:
     # Kubernetes settings
     NAMESPACE = os.getenv("NAMESPACE", "postgres")
     CONFIGMAP_NAME = os.getenv("CONFIGMAP_NAME", "postgres-users-config")
+    # Label selector of desired state shards; replaces CONFIGMAP_NAME when set
+    CONFIGMAP_SELECTOR = os.getenv("CONFIGMAP_SELECTOR", "")
+    # Desired state source: "configmap" (users.yaml) or "crd" (PostgreSQLUser objects)
+    USERS_SOURCE = os.getenv("USERS_SOURCE", "configmap").lower()
     
     # PostgreSQL settings
     DB_HOST = os.getenv("DB_HOST", "acid-minimal-cluster.default.svc.cluster.local")
@@ -68,17 +105,98 @@ class Config:
     DB_USER = os.getenv("DB_USER", "postgres")
     DB_PASS = os.getenv("DB_PASS", "postgres")
     
+    # Multi-cluster settings: explicit targets and/or discovery of Spilo clusters
+    DB_CLUSTERS = os.getenv("DB_CLUSTERS", "")
+    DISCOVER_CLUSTERS = os.getenv("DISCOVER_CLUSTERS", "false").lower() == "true"
+    CLUSTER_NAMESPACE = os.getenv("CLUSTER_NAMESPACE", "")
+    CLUSTER_LABEL_SELECTOR = os.getenv("CLUSTER_LABEL_SELECTOR", "application=spilo,spilo-role=master")
+    CLUSTER_NAME_LABEL = os.getenv("CLUSTER_NAME_LABEL", "cluster-name")
+    CLUSTER_CREDENTIALS_SECRET = os.getenv(
+        "CLUSTER_CREDENTIALS_SECRET", "postgres.{cluster}.credentials.postgresql.acid.zalan.do"
+    )
+    CLUSTER_DISCOVERY_INTERVAL = int(os.getenv("CLUSTER_DISCOVERY_INTERVAL", "300"))
+    
     # Controller settings
     SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "30"))
     STATE_FILE = os.getenv("STATE_FILE", "/tmp/users_state.json")
+    # "sqlite" keeps state in an indexed store next to STATE_FILE (<name>.db), "json" in STATE_FILE
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite").lower()
     DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
+    # File receiving each cycle's plan as JSON (empty: off), and the DDL
+    # statement latency assumed by cost estimates until one was measured
+    PLAN_OUTPUT = os.getenv("PLAN_OUTPUT", "")
+    PLAN_STATEMENT_SECONDS = float(os.getenv("PLAN_STATEMENT_SECONDS", "0.002"))
+    # Parse users.yaml event by event (lower peak memory, pure-Python parser)
+    YAML_STREAMING = os.getenv("YAML_STREAMING", "false").lower() == "true"
+    SHORT_CIRCUIT_UNCHANGED = os.getenv("SHORT_CIRCUIT_UNCHANGED", "true").lower() == "true"
+    # Compare direct table/schema/database privileges of existing users against users.yaml
+    RECONCILE_PRIVILEGES = os.getenv("RECONCILE_PRIVILEGES", "true").lower() == "true"
+    # Compare stored password verifiers of existing users against their Secrets
+    RECONCILE_PASSWORDS = os.getenv("RECONCILE_PASSWORDS", "true").lower() == "true"
+    # Drop group roles that lost their last reference in the desired state
+    DROP_UNUSED_ROLES = os.getenv("DROP_UNUSED_ROLES", "false").lower() == "true"
+    CONTROLLER_ENGINE = os.getenv("CONTROLLER_ENGINE", "sync").lower()
     MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
     RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "2.0"))
     
+    # Kubernetes and database call retries (seconds): full jitter over RETRY_BASE_DELAY *
+    # RETRY_BACKOFF_BASE ** attempt, capped at RETRY_MAX_DELAY and by a budget per cycle
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "5"))
+    RETRY_BUDGET_SECONDS = float(os.getenv("RETRY_BUDGET_SECONDS", "10"))
+    # Consecutive failures opening an endpoint's circuit, and seconds until a trial call
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+    
+    # Per-user retry backoff (seconds): full jitter over base * RETRY_BACKOFF_BASE ** failures
+    WORKQUEUE_BASE_DELAY = float(os.getenv("WORKQUEUE_BASE_DELAY", "1.0"))
+    WORKQUEUE_MAX_DELAY = float(os.getenv("WORKQUEUE_MAX_DELAY", "300"))
+    
+    # Event-driven reconciliation settings ("poll" or "watch")
+    RECONCILE_MODE = os.getenv("RECONCILE_MODE", "poll").lower()
+    RESYNC_INTERVAL = int(os.getenv("RESYNC_INTERVAL", "600"))
+    WATCH_TIMEOUT_SECONDS = int(os.getenv("WATCH_TIMEOUT_SECONDS", "300"))
+    WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "0.05"))
+    # Watch mode: install an event trigger that NOTIFYs hand-made privilege changes, and LISTEN for them
+    DRIFT_NOTIFY = os.getenv("DRIFT_NOTIFY", "false").lower() == "true"
+    DRIFT_CHANNEL = os.getenv("DRIFT_CHANNEL", "postgres_controller_drift")
+    
+    # Optional label selector narrowing the user Secrets that are listed/watched
+    SECRET_LABEL_SELECTOR = os.getenv("SECRET_LABEL_SELECTOR", "")
+    
     # Connection pool settings
     DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "1"))
     DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "5"))
     
+    # Failover handling: libpq target_session_attrs for new connections (DB_HOST
+    # may list several comma-separated hosts) and primary checks on checkout
+    DB_TARGET_SESSION_ATTRS = os.getenv("DB_TARGET_SESSION_ATTRS", "read-write")
+    DB_VALIDATE_ON_CHECKOUT = os.getenv("DB_VALIDATE_ON_CHECKOUT", "true").lower() == "true"
+    
+    # Pools of the users' databases other than DB_NAME (object grants, dropping
+    # owned objects) and how many of them are worked on concurrently
+    DATABASE_POOL_MAX_CONN = int(os.getenv("DATABASE_POOL_MAX_CONN", "2"))
+    DATABASE_WORKERS = int(os.getenv("DATABASE_WORKERS", "8"))
+    
+    # DDL batching settings (users per transaction)
+    DDL_BATCH_SIZE = int(os.getenv("DDL_BATCH_SIZE", "500"))
+    
+    # Parallel batches per phase (capped at DB_POOL_MAX_CONN, 1 = sequential)
+    RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", "1"))
+    
+    # Metrics and health endpoint (0 disables the HTTP server)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "8080"))
+    
+    # Replica coordination through coordination.k8s.io Leases: one active leader,
+    # or SHARDING=true to split usernames across all live replicas
+    LEADER_ELECTION = os.getenv("LEADER_ELECTION", "false").lower() == "true"
+    SHARDING = os.getenv("SHARDING", "false").lower() == "true"
+    POD_NAME = os.getenv("POD_NAME", socket.gethostname())
+    LEASE_NAME = os.getenv("LEASE_NAME", "user-controller")
+    LEASE_DURATION_SECONDS = int(os.getenv("LEASE_DURATION_SECONDS", "15"))
+    LEASE_RENEW_SECONDS = float(os.getenv("LEASE_RENEW_SECONDS", "5"))
+    SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+    
     # System roles to exclude from management
     SYSTEM_ROLES = {
         'postgres', 'pg_monitor', 'pg_read_all_settings', 'pg_read_all_stats',
@@ -91,20 +209,206 @@ class Config:
 # DATA MODELS
 # ============================================================================
 
-@dataclass
+class NameTable:
+    """
+    Interned names, each with a dense integer id
+    
+    Role sets are stored as bitsets over these ids: one int per user, and
+    set comparisons are integer comparisons. Ids are never reused, so the
+    table grows with the number of distinct names ever seen, not with users.
+    """
+    
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # Identical privilege maps share one tuple
+        self._privileges: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._names)
+    
+    def id_of(self, name: str) -> int:
+        """Id of a name, assigned on first sight"""
+        index = self._ids.get(name)
+        if index is None:
+            with self._lock:
+                index = self._ids.get(name)
+                if index is None:
+                    index = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._ids[self._names[index]] = index
+        return index
+    
+    def encode(self, names) -> int:
+        """Bitset of names"""
+        bits = 0
+        for name in names:
+            bits |= 1 << self.id_of(name)
+        return bits
+    
+    def decode(self, bits: int) -> List[str]:
+        """Names of a bitset, in id order"""
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self._names[low.bit_length() - 1])
+            bits ^= low
+        return names
+    
+    def intern_privileges(self, privileges: Optional[Dict[str, List[str]]]) -> Optional[tuple]:
+        """Shared, immutable form of a privileges map"""
+        if not privileges:
+            return None
+        key = tuple((sys.intern(str(target)), tuple(sys.intern(str(name)) for name in names or ()))
+                    for target, names in sorted(privileges.items()))
+        return self._privileges.setdefault(key, key)
+
+
+# Role names of every UserSpec
+ROLE_NAMES = NameTable()
+
+
 class UserSpec:
-    """User specification from ConfigMap"""
-    username: str
-    database: str
-    roles: List[str]
-    privileges: Optional[Dict[str, List[str]]] = None
+    """
+    User specification from ConfigMap
+    
+    An immutable value: roles are held as a bitset over ROLE_NAMES, names
+    are interned and identical privilege maps are shared, so the desired
+    and previous state of 100k users stay small. Replace a spec with
+    replace() instead of modifying it.
+    """
+    
+    __slots__ = ("username", "database", "role_bits", "_privileges", "_fingerprint")
+    
+    def __init__(self, username: str, database: str, roles: Optional[List[str]] = None,
+                 privileges: Optional[Dict[str, List[str]]] = None):
+        self.username = sys.intern(username)
+        self.database = sys.intern(database)
+        self.role_bits = ROLE_NAMES.encode(roles or ())
+        self._privileges = ROLE_NAMES.intern_privileges(privileges)
+        self._fingerprint: Optional[str] = None
+    
+    @property
+    def roles(self) -> List[str]:
+        """Granted roles (a new list on every access)"""
+        return ROLE_NAMES.decode(self.role_bits)
+    
+    @property
+    def privileges(self) -> Optional[Dict[str, List[str]]]:
+        """Object privileges by target (a new dict on every access)"""
+        if self._privileges is None:
+            return None
+        return {target: list(names) for target, names in self._privileges}
+    
+    @property
+    def fingerprint(self) -> str:
+        """SHA-256 of the spec, computed once"""
+        if self._fingerprint is None:
+            content = f"{self.username}:{self.database}:{sorted(self.roles)}"
+            if self._privileges:
+                content += f":{sorted(self.privileges.items())}"
+            self._fingerprint = hashlib.sha256(content.encode()).hexdigest()
+        return self._fingerprint
     
     def __hash__(self):
-        """Generate hash for change detection"""
-        content = f"{self.username}:{self.database}:{sorted(self.roles)}"
-        if self.privileges:
-            content += f":{sorted(self.privileges.items())}"
-        return int(hashlib.sha256(content.encode()).hexdigest(), 16)
+        """Hash for change detection, stable across processes"""
+        return int(self.fingerprint[:16], 16)
+    
+    def __eq__(self, other):
+        if not isinstance(other, UserSpec):
+            return NotImplemented
+        return (self.username == other.username and self.database == other.database
+                and self.role_bits == other.role_bits and self._privileges == other._privileges)
+    
+    def __repr__(self):
+        return (f"UserSpec(username={self.username!r}, database={self.database!r}, "
+                f"roles={self.roles!r}, privileges={self.privileges!r})")
+    
+    def to_dict(self) -> dict:
+        """Plain fields, as stored in state files and users.yaml"""
+        return {"username": self.username, "database": self.database,
+                "roles": self.roles, "privileges": self.privileges}
+    
+    def replace(self, **changes) -> "UserSpec":
+        """Copy of the spec with some fields changed"""
+        return UserSpec(**{**self.to_dict(), **changes})
+
+
+@dataclass
+class RoleSpec:
+    """Group role declared in the roles section of the desired state"""
+    name: str
+    # Roles this role is a member of
+    member_of: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ConfigMapShard:
+    """A ConfigMap holding all or part of the desired state"""
+    name: str
+    resource_version: Optional[str]
+    content: Union[str, bytes]
+
+
+@dataclass
+class UserResource:
+    """A PostgreSQLUser object as held by the informer cache"""
+    name: str
+    # uid and metadata.generation: changes with the spec, not with status updates
+    version: str
+    generation: int
+    spec: UserSpec
+    shard: ConfigMapShard
+    status: dict = field(default_factory=dict)
+
+
+@dataclass
+class ClusterTarget:
+    """A PostgreSQL cluster managed by the controller"""
+    name: str
+    host: str
+    port: Optional[str] = None
+    dbname: Optional[str] = None
+    user: Optional[str] = None
+    password: Optional[str] = None
+    
+    def connection_params(self) -> dict:
+        """libpq connection parameters, falling back to the global settings"""
+        return {
+            "host": self.host,
+            "port": self.port or Config.DB_PORT,
+            "dbname": self.dbname or Config.DB_NAME,
+            "user": self.user or Config.DB_USER,
+            "password": self.password or Config.DB_PASS,
+        }
+
+
+def parse_cluster_targets(value: str) -> List[ClusterTarget]:
+    """
+    Parse DB_CLUSTERS
+    
+    Accepts either a JSON list of objects with ClusterTarget fields or a
+    comma-separated list of name=host[:port] entries.
+    
+    Args:
+        value: Raw DB_CLUSTERS value
+        
+    Returns:
+        List of ClusterTarget
+    """
+    value = value.strip()
+    if not value:
+        return []
+    if value.startswith("["):
+        return [ClusterTarget(**entry) for entry in json.loads(value)]
+    
+    targets = []
+    for entry in value.split(","):
+        name, _, address = entry.strip().partition("=")
+        host, _, port = (address or name).partition(":")
+        targets.append(ClusterTarget(name=name, host=host, port=port or None))
+    return targets
 
 
 @dataclass
@@ -113,10 +417,18 @@ class ReconciliationStats:
     users_created: int = 0
     users_updated: int = 0
     users_deleted: int = 0
+    passwords_updated: int = 0
+    privileges_updated: int = 0
     roles_created: int = 0
+    roles_updated: int = 0
     roles_deleted: int = 0
     drift_detected: int = 0
     errors: int = 0
+    ddl_batches: int = 0
+    ddl_fallbacks: int = 0
+    users_deferred: int = 0
+    short_circuited: bool = False
+    standby: bool = False
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     
@@ -134,13 +446,536 @@ class ReconciliationStats:
         }
 
 
+@dataclass
+class CatalogSnapshot:
+    """Point-in-time view of roles, memberships, CONNECT grants and password verifiers"""
+    roles: Dict[str, bool]
+    memberships: Dict[str, Set[str]]
+    connect_grants: Dict[str, Set[str]]
+    taken_at: Optional[datetime] = None
+    verifiers: Dict[str, str] = field(default_factory=dict)
+    # Roles carrying MANAGED_ROLE_COMMENT
+    managed: Set[str] = field(default_factory=set)
+    
+    def __post_init__(self):
+        # Reverse index: role -> members holding it
+        self.members_of: Dict[str, Set[str]] = {}
+        for member, granted in self.memberships.items():
+            for role in granted:
+                self.members_of.setdefault(role, set()).add(member)
+    
+    @property
+    def users(self) -> Set[str]:
+        """All non-system roles (equivalent to fetch_existing_users)"""
+        return set(self.roles)
+    
+    @property
+    def group_roles(self) -> Set[str]:
+        """Non-login roles (equivalent to fetch_existing_roles)"""
+        return {name for name, can_login in self.roles.items() if not can_login}
+    
+    def roles_of(self, username: str) -> Set[str]:
+        """Roles granted to a user (equivalent to fetch_user_roles)"""
+        return set(self.memberships.get(username, ()))
+    
+    def can_connect(self, username: str, database: str) -> bool:
+        """Check for an explicit CONNECT grant on a database"""
+        return database in self.connect_grants.get(username, ())
+    
+    def record_role_created(self, role_name: str):
+        """Reflect a role created during the current cycle"""
+        self.roles[role_name] = False
+    
+    def record_role_dropped(self, role_name: str):
+        """Reflect a role dropped during the current cycle"""
+        self.roles.pop(role_name, None)
+        for parent in self.memberships.pop(role_name, ()):
+            self.members_of.get(parent, set()).discard(role_name)
+        for member in self.members_of.pop(role_name, ()):
+            self.memberships.get(member, set()).discard(role_name)
+
+
+# Operations on group roles rather than users: never queued for a per-user retry
+ROLE_KINDS = ("create_role", "role_update", "drop_role")
+
+
+@dataclass
+class UserOperation:
+    """A single planned change for one user or role"""
+    kind: str  # create_role, role_update, drop, create, password, update, privileges or drop_role
+    username: str
+    spec: Optional[UserSpec] = None
+    password: Optional[str] = None
+    grant: Set[str] = field(default_factory=set)
+    revoke: Set[str] = field(default_factory=set)
+    # privileges: (kind, name) -> (bits to grant, bits to revoke)
+    privilege_changes: Dict[Tuple[str, str], Tuple[int, int]] = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one DDL batch transaction"""
+    kind: str
+    size: int
+    statements: int = 0
+    duration_seconds: float = 0.0
+    fallback: bool = False
+    succeeded: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+
+
+# ============================================================================
+# ROLE GRAPH
+# ============================================================================
+
+class RoleCycleError(ValueError):
+    """Role memberships that would form a cycle, which PostgreSQL rejects"""
+    
+    def __init__(self, cycle: List[str]):
+        super().__init__(f"Role memberships form a cycle: {' -> '.join(cycle)}")
+        self.cycle = cycle
+
+
+class RoleGraph:
+    """
+    Role memberships as a directed graph: member -> roles it is granted
+    
+    Members are users and declared group roles; their edges are role
+    bitsets over ROLE_NAMES, like UserSpec.role_bits. Every role keeps a
+    reference count (one per member granted it, plus one if it is declared),
+    so updates cost O(changed edges) and a role whose count drops to zero is
+    collected in orphans as it happens, without a scan for unused roles.
+    """
+    
+    def __init__(self):
+        self.edges: Dict[str, int] = {}
+        self.declared: Set[str] = set()
+        self.refcounts: Dict[str, int] = {}
+        # Roles that lost their last reference, until re-referenced or forgotten
+        self.orphans: Set[str] = set()
+    
+    @classmethod
+    def from_catalog(cls, snapshot: "CatalogSnapshot", members: Iterable[str]) -> "RoleGraph":
+        """
+        Graph of the memberships in pg_auth_members
+        
+        Args:
+            snapshot: Catalog snapshot of the current cycle
+            members: Members whose edges are loaded
+        """
+        graph = cls()
+        for member in members:
+            graph.set_member(member, ROLE_NAMES.encode(snapshot.memberships.get(member, ())))
+        return graph
+    
+    @property
+    def roles(self) -> Set[str]:
+        """Roles that are declared or granted to a member"""
+        return set(self.refcounts)
+    
+    def parents_of(self, member: str) -> List[str]:
+        """Roles granted to a member, sorted"""
+        return sorted(ROLE_NAMES.decode(self.edges.get(member, 0)))
+    
+    def _reference(self, role: str, delta: int):
+        count = self.refcounts.get(role, 0) + delta
+        if count > 0:
+            self.refcounts[role] = count
+            self.orphans.discard(role)
+        else:
+            self.refcounts.pop(role, None)
+            self.orphans.add(role)
+    
+    def set_member(self, member: str, role_bits: int) -> int:
+        """
+        Replace the roles granted to a member
+        
+        Returns:
+            Number of edges added or removed
+        """
+        old = self.edges.get(member, 0)
+        if old == role_bits:
+            return 0
+        if role_bits:
+            self.edges[member] = role_bits
+        else:
+            self.edges.pop(member, None)
+        added = ROLE_NAMES.decode(role_bits & ~old)
+        removed = ROLE_NAMES.decode(old & ~role_bits)
+        for role in added:
+            self._reference(role, 1)
+        for role in removed:
+            self._reference(role, -1)
+        return len(added) + len(removed)
+    
+    def update(self, users: Mapping, roles: Dict[str, RoleSpec], usernames: Optional[Iterable[str]] = None) -> int:
+        """
+        Bring the graph in line with the desired state
+        
+        Args:
+            users: Desired user specifications
+            roles: Declared group roles
+            usernames: Users that may have changed since the last update
+                (None: compare every desired and known user)
+            
+        Returns:
+            Number of edges added or removed
+        """
+        changed = 0
+        for name in self.declared - set(roles):
+            self.declared.discard(name)
+            changed += self.set_member(name, 0)
+            self._reference(name, -1)
+        for name, role in roles.items():
+            if name not in self.declared:
+                self.declared.add(name)
+                self._reference(name, 1)
+            changed += self.set_member(name, ROLE_NAMES.encode(role.member_of))
+        
+        if usernames is None:
+            usernames = set(users) | set(self.edges)
+        for username in usernames:
+            if username in self.declared:
+                continue
+            spec = users.get(username)
+            changed += self.set_member(username, spec.role_bits if spec is not None else 0)
+        return changed
+    
+    def forget(self, role: str):
+        """Stop tracking a role that was dropped"""
+        self.orphans.discard(role)
+    
+    def topological_order(self) -> List[str]:
+        """
+        Every role of the graph, each after the roles it is a member of
+        
+        Raises:
+            RoleCycleError: If declared memberships form a cycle
+        """
+        order: List[str] = []
+        done: Set[str] = set()
+        for root in sorted(self.refcounts):
+            if root in done:
+                continue
+            path = [root]
+            pending = [iter(self.parents_of(root))]
+            while pending:
+                parent = next(pending[-1], None)
+                if parent is None:
+                    node = path.pop()
+                    pending.pop()
+                    done.add(node)
+                    order.append(node)
+                elif parent in path:
+                    raise RoleCycleError(path[path.index(parent):] + [parent])
+                elif parent not in done:
+                    path.append(parent)
+                    pending.append(iter(self.parents_of(parent)))
+        return order
+    
+    def diff(self, actual: "RoleGraph", members: Iterable[str]) -> Dict[str, Tuple[Set[str], Set[str]]]:
+        """
+        Memberships to change so that members hold the roles of this graph
+        
+        Args:
+            actual: Graph of the current memberships
+            members: Members to compare
+            
+        Returns:
+            (roles to grant, roles to revoke) per member that differs
+        """
+        changes = {}
+        for member in members:
+            want, have = self.edges.get(member, 0), actual.edges.get(member, 0)
+            if want != have:
+                changes[member] = (set(ROLE_NAMES.decode(want & ~have)), set(ROLE_NAMES.decode(have & ~want)))
+        return changes
+
+
+# ============================================================================
+# PRIVILEGES
+# ============================================================================
+
+# aclitem privilege letters (see PostgreSQL's "Privileges" chapter), one bit each
+ACL_LETTERS = {
+    "r": "SELECT", "a": "INSERT", "w": "UPDATE", "d": "DELETE", "D": "TRUNCATE",
+    "x": "REFERENCES", "t": "TRIGGER", "X": "EXECUTE", "U": "USAGE", "C": "CREATE",
+    "c": "CONNECT", "T": "TEMPORARY", "m": "MAINTAIN",
+}
+PRIVILEGE_BITS = {name: 1 << bit for bit, name in enumerate(ACL_LETTERS.values())}
+ACL_BITS = {letter: PRIVILEGE_BITS[name] for letter, name in ACL_LETTERS.items()}
+PRIVILEGE_ALIASES = {"TEMP": "TEMPORARY"}
+
+# Privileges that can be granted on each managed object kind ("ALL" expands to these)
+OBJECT_PRIVILEGES = {
+    "table": ("SELECT", "INSERT", "UPDATE", "DELETE", "TRUNCATE", "REFERENCES", "TRIGGER"),
+    "schema": ("USAGE", "CREATE"),
+    "database": ("CONNECT", "CREATE", "TEMPORARY"),
+}
+OBJECT_MASKS = {
+    kind: sum(PRIVILEGE_BITS[name] for name in names) for kind, names in OBJECT_PRIVILEGES.items()
+}
+
+# (kind, name), e.g. ("table", "public.orders") or ("database", "app")
+PrivilegeTarget = Tuple[str, str]
+
+
+def parse_privilege_target(key: str) -> PrivilegeTarget:
+    """
+    Parse a key of a user's privileges mapping
+    
+    "schema:<name>" and "database:<name>" address those objects; anything
+    else is a table, optionally schema-qualified (also as "table:<name>").
+    """
+    kind, separator, name = key.partition(":")
+    if separator and kind.lower() in OBJECT_PRIVILEGES:
+        return kind.lower(), name
+    return "table", key
+
+
+def privilege_bits(kind: str, privileges: List[str]) -> int:
+    """Bitmap of privilege names applicable to an object kind (ALL expands, unknown names are ignored)"""
+    bits = 0
+    for privilege in privileges:
+        name = " ".join(str(privilege).upper().split())
+        if name in ("ALL", "ALL PRIVILEGES"):
+            bits |= OBJECT_MASKS[kind]
+            continue
+        bit = PRIVILEGE_BITS.get(PRIVILEGE_ALIASES.get(name, name), 0)
+        if not bit & OBJECT_MASKS[kind]:
+            logger.warning(f"Ignoring privilege {privilege!r}, not applicable to a {kind}")
+        bits |= bit & OBJECT_MASKS[kind]
+    return bits
+
+
+def privilege_names(bits: int) -> List[str]:
+    """Privilege names of a bitmap, in catalog order"""
+    return [name for name, bit in PRIVILEGE_BITS.items() if bits & bit]
+
+
+def desired_privileges(user_spec: UserSpec, include_connect: bool = True) -> Dict[PrivilegeTarget, int]:
+    """
+    Privilege bitmaps a user should hold directly, per object
+    
+    Args:
+        user_spec: User specification
+        include_connect: Whether to include CONNECT on the user's database
+        
+    Returns:
+        Mapping of privilege target to bitmap
+    """
+    wanted: Dict[PrivilegeTarget, int] = {}
+    if include_connect:
+        wanted[("database", user_spec.database)] = PRIVILEGE_BITS["CONNECT"]
+    for key, privileges in (user_spec.privileges or {}).items():
+        target = parse_privilege_target(key)
+        wanted[target] = wanted.get(target, 0) | privilege_bits(target[0], privileges or [])
+    return wanted
+
+
+def privilege_target_parts(target: PrivilegeTarget) -> List[str]:
+    """Identifier parts of a privilege target (schema and table for qualified tables)"""
+    kind, name = target
+    return name.split(".", 1) if kind == "table" else [name]
+
+
+def parse_aclitem(item: str) -> Tuple[str, int]:
+    """
+    Parse an aclitem ("grantee=privileges/grantor") into grantee and bitmap
+    
+    Grant options ("r*") count as the plain privilege; PUBLIC is returned
+    as an empty grantee.
+    """
+    if item.startswith('"'):
+        grantee, position = [], 1
+        while True:
+            end = item.index('"', position)
+            grantee.append(item[position:end])
+            if item[end + 1:end + 2] != '"':
+                break
+            grantee.append('"')
+            position = end + 2
+        name, rest = "".join(grantee), item[end + 2:]
+    else:
+        name, _, rest = item.partition("=")
+    bits = 0
+    for letter in rest.partition("/")[0]:
+        bits |= ACL_BITS.get(letter, 0)
+    return name, bits
+
+
+class PrivilegeIndex:
+    """
+    Direct privileges on the managed objects, as one bitmap per object and grantee
+    
+    Built from the raw relacl/nspacl/datacl arrays of a single catalog query,
+    so comparing the whole fleet against its desired privileges needs no
+    per-object or per-user round trips.
+    """
+    
+    def __init__(self, acls: Dict[PrivilegeTarget, Optional[List[str]]]):
+        """
+        Args:
+            acls: ACL items of each existing managed object (None for default ACLs)
+        """
+        self.grants: Dict[PrivilegeTarget, Dict[str, int]] = {}
+        # Reverse index: grantee -> objects it holds privileges on
+        self.targets_of: Dict[str, Set[PrivilegeTarget]] = {}
+        for target, items in acls.items():
+            grants = self.grants[target] = {}
+            for item in items or ():
+                grantee, bits = parse_aclitem(item)
+                if grantee and bits:
+                    grants[grantee] = grants.get(grantee, 0) | bits
+                    self.targets_of.setdefault(grantee, set()).add(target)
+    
+    def __contains__(self, target) -> bool:
+        return target in self.grants
+    
+    def bits(self, target: PrivilegeTarget, grantee: str) -> int:
+        """Privileges a grantee holds directly on an object"""
+        return self.grants.get(target, {}).get(grantee, 0)
+
+
+# ============================================================================
+# PASSWORDS
+# ============================================================================
+
+def scram_keys(password: str, salt: bytes, iterations: int) -> Tuple[bytes, bytes]:
+    """StoredKey and ServerKey of a SCRAM-SHA-256 verifier (RFC 5802)"""
+    if not password.isascii():
+        # Approximates the server's SASLprep; ASCII passwords are used as-is
+        password = unicodedata.normalize("NFKC", password)
+    salted = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    client_key = hmac.new(salted, b"Client Key", hashlib.sha256).digest()
+    server_key = hmac.new(salted, b"Server Key", hashlib.sha256).digest()
+    return hashlib.sha256(client_key).digest(), server_key
+
+
+def verify_password(username: str, password: str, verifier: Optional[str]) -> bool:
+    """
+    Check a password against a pg_authid.rolpassword verifier
+    
+    SCRAM-SHA-256 verifiers are recomputed with their stored salt and
+    iteration count; MD5 verifiers salt with the username.
+    
+    Args:
+        username: Role name
+        password: Password from the user's Secret
+        verifier: Stored verifier, None if the role has no password
+        
+    Returns:
+        True if the role would accept the password
+    """
+    if not verifier:
+        return False
+    if verifier.startswith("SCRAM-SHA-256$"):
+        try:
+            _, parameters, keys = verifier.split("$")
+            iterations, salt = parameters.split(":")
+            stored_key, server_key = (base64.b64decode(key) for key in keys.split(":"))
+            expected_stored, expected_server = scram_keys(password, base64.b64decode(salt), int(iterations))
+        except (ValueError, binascii.Error):
+            logger.warning(f"Unparseable SCRAM verifier for {username}")
+            return False
+        return hmac.compare_digest(stored_key, expected_stored) and hmac.compare_digest(server_key, expected_server)
+    if verifier.startswith("md5"):
+        expected = "md5" + hashlib.md5((password + username).encode()).hexdigest()
+        return hmac.compare_digest(verifier, expected)
+    return False
+
+
+class VerifierCache:
+    """
+    Results of password checks, keyed by Secret resourceVersion and stored verifier
+    
+    PBKDF2 at the server's iteration count is deliberately slow, so a user is
+    only checked again once its Secret or its verifier in pg_authid changed.
+    """
+    
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, str, bool]] = {}
+        self.computed = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def matches(self, username: str, secret_version: Optional[str], password: str,
+                verifier: Optional[str]) -> bool:
+        """
+        Check a user's password, reusing the previous result when nothing changed
+        
+        Args:
+            username: Role name
+            secret_version: resourceVersion of the user's Secret (None disables caching)
+            password: Password from the Secret
+            verifier: Stored verifier from pg_authid
+            
+        Returns:
+            True if the stored verifier matches the password
+        """
+        entry = self._entries.get(username)
+        if secret_version is not None and entry is not None and entry[:2] == (secret_version, verifier):
+            return entry[2]
+        matched = verify_password(username, password, verifier)
+        self.computed += 1
+        if secret_version is not None:
+            self._entries[username] = (secret_version, verifier, matched)
+        return matched
+    
+    def retain(self, usernames: Set[str]):
+        """Drop the entries of users that are no longer checked"""
+        for username in set(self._entries) - usernames:
+            del self._entries[username]
+
+
 # ============================================================================
 # METRICS (Prometheus-compatible)
 # ============================================================================
 
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus data model"""
+    
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        """Record one observation (caller holds the Metrics lock)"""
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+    
+    def render(self, name: str, labels: str = "") -> List[str]:
+        """Render the _bucket, _sum and _count samples"""
+        prefix = f"{labels}," if labels else ""
+        lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
 class Metrics:
     """Simple in-memory metrics for Prometheus exposition"""
     
+    # Histogram families: name -> (help text, label name or None)
+    HISTOGRAMS = {
+        "postgres_controller_phase_duration_seconds": ("Duration of each reconcile cycle phase", "phase"),
+        "postgres_controller_ddl_statement_duration_seconds": ("Latency of DDL statements by operation kind", "kind"),
+        "postgres_controller_kube_api_duration_seconds": ("Latency of Kubernetes API calls", "call"),
+        "postgres_controller_db_pool_wait_seconds": ("Time spent acquiring a pooled database connection", None),
+        "postgres_controller_failover_recovery_seconds": (
+            "Time from detecting a lost or demoted primary to the first validated connection to its successor", None),
+    }
+    
     def __init__(self):
         self.reconciliation_count = 0
         self.last_reconciliation_timestamp = 0
@@ -149,6 +984,34 @@ class Metrics:
         self.roles_managed = 0
         self.last_error_timestamp = 0
         self.error_count = 0
+        self.cycles_short_circuited_count = 0
+        self.watch_events_count = 0
+        self.watch_relists_count = 0
+        self.drift_notifications_count = 0
+        self.last_event_to_applied_seconds = 0.0
+        self.secrets_cached = 0
+        self.ddl_batches_count = 0
+        self.ddl_batch_fallbacks_count = 0
+        self.ddl_batch_seconds_total = 0.0
+        self.last_ddl_batch_seconds_max = 0.0
+        self.executor_workers = 0
+        self.executor_queue_depth = 0
+        self.workqueue_depth = 0
+        self.workqueue_retries_count = 0
+        self.users_deferred_count = 0
+        self.passwords_updated_count = 0
+        self.privileges_updated_count = 0
+        self.status_patches_count = 0
+        self.retries_count = 0
+        self.circuit_rejections_count = 0
+        self.circuit_states: Dict[str, int] = {}
+        self.pool_invalidations_count = 0
+        self.replica_active = 0
+        self.shard_members = 0
+        self.worker_batches: Dict[str, int] = {}
+        self.worker_busy_seconds: Dict[str, float] = {}
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
         
     def record_reconciliation(self, stats: ReconciliationStats):
         """Record metrics from a reconciliation cycle"""
@@ -156,11 +1019,103 @@ class Metrics:
         self.last_reconciliation_timestamp = time.time()
         self.drift_count += stats.drift_detected
         self.error_count += stats.errors
+        self.users_deferred_count += stats.users_deferred
+        self.passwords_updated_count += stats.passwords_updated
+        self.privileges_updated_count += stats.privileges_updated
+        if stats.short_circuited:
+            self.cycles_short_circuited_count += 1
         if stats.errors > 0:
             self.last_error_timestamp = time.time()
     
+    def record_batches(self, results: List[BatchResult]):
+        """Record timings of executed DDL batches"""
+        self.ddl_batches_count += len(results)
+        self.ddl_batch_fallbacks_count += sum(1 for r in results if r.fallback)
+        self.ddl_batch_seconds_total += sum(r.duration_seconds for r in results)
+        self.last_ddl_batch_seconds_max = max((r.duration_seconds for r in results), default=0.0)
+    
+    def record_worker_batch(self, worker: str, duration_seconds: float):
+        """Record a batch completed by an executor worker (thread-safe)"""
+        with self._lock:
+            self.worker_batches[worker] = self.worker_batches.get(worker, 0) + 1
+            self.worker_busy_seconds[worker] = self.worker_busy_seconds.get(worker, 0.0) + duration_seconds
+    
+    def record_circuit(self, endpoint: str, state: str):
+        """Record the current state of an endpoint's circuit breaker"""
+        with self._lock:
+            self.circuit_states[endpoint] = CircuitBreaker.STATE_VALUES[state]
+    
+    def adjust_queue_depth(self, delta: int):
+        """Track batches waiting for a free worker (thread-safe)"""
+        with self._lock:
+            self.executor_queue_depth += delta
+    
+    def observe(self, family: str, seconds: float, label: str = ""):
+        """Record a duration in a histogram family (thread-safe)"""
+        with self._lock:
+            histogram = self.histograms.get((family, label))
+            if histogram is None:
+                histogram = self.histograms[(family, label)] = Histogram()
+            histogram.observe(seconds)
+    
+    def mean(self, family: str, label: str = "") -> Optional[float]:
+        """Mean of a histogram's observations, None before the first one"""
+        with self._lock:
+            histogram = self.histograms.get((family, label))
+            return histogram.sum / histogram.count if histogram and histogram.count else None
+    
+    @contextmanager
+    def timer(self, family: str, label: str = ""):
+        """Time the enclosed block into a histogram family"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(family, time.perf_counter() - started, label)
+    
+    def time_phase(self, phase: str):
+        """Time a reconcile cycle phase"""
+        return self.timer("postgres_controller_phase_duration_seconds", phase)
+    
+    def _export_histograms(self, families: Optional[Iterable[str]] = None) -> str:
+        blocks = []
+        with self._lock:
+            for name, (help_text, label_name) in self.HISTOGRAMS.items():
+                if families is not None and name not in families:
+                    continue
+                lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (family, label), histogram in sorted(self.histograms.items()):
+                    if family == name:
+                        lines += histogram.render(name, f'{label_name}="{label}"' if label_name else "")
+                blocks.append("\n".join(lines) + "\n")
+        return "\n".join(blocks)
+    
+    @staticmethod
+    def _labeled(name: str, help_text: str, metric_type: str, label: str, values: Dict[str, float]) -> str:
+        """Render a labeled metric family"""
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+        return "\n".join(lines) + "\n"
+    
     def export_prometheus(self) -> str:
         """Export metrics in Prometheus text format"""
+        with self._lock:
+            worker_batches = dict(self.worker_batches)
+            worker_busy_seconds = dict(self.worker_busy_seconds)
+            circuit_states = dict(self.circuit_states)
+        return self._export_scalars() + "\n" + "\n".join([
+            self._labeled("postgres_controller_worker_batches_total",
+                          "DDL batches completed per executor worker", "counter", "worker", worker_batches),
+            self._labeled("postgres_controller_worker_busy_seconds_total",
+                          "Time spent executing DDL batches per executor worker", "counter", "worker",
+                          worker_busy_seconds),
+            self._labeled("postgres_controller_circuit_state",
+                          "Circuit breaker state per endpoint (0 closed, 1 open, 2 half-open)", "gauge", "endpoint",
+                          circuit_states),
+            self._export_histograms(),
+        ])
+    
+    def _export_scalars(self) -> str:
         return f"""# HELP postgres_controller_reconciliations_total Total number of reconciliation cycles
 # TYPE postgres_controller_reconciliations_total counter
 postgres_controller_reconciliations_total {self.reconciliation_count}
@@ -188,628 +1143,5650 @@ postgres_controller_errors_total {self.error_count}
 # HELP postgres_controller_last_error_timestamp Timestamp of last error
 # TYPE postgres_controller_last_error_timestamp gauge
 postgres_controller_last_error_timestamp {self.last_error_timestamp}
+
+# HELP postgres_controller_cycles_short_circuited_total Cycles skipped because desired state and catalog were unchanged
+# TYPE postgres_controller_cycles_short_circuited_total counter
+postgres_controller_cycles_short_circuited_total {self.cycles_short_circuited_count}
+
+# HELP postgres_controller_watch_events_total Total relevant watch events received
+# TYPE postgres_controller_watch_events_total counter
+postgres_controller_watch_events_total {self.watch_events_count}
+
+# HELP postgres_controller_watch_relists_total Total full relists performed by watchers
+# TYPE postgres_controller_watch_relists_total counter
+postgres_controller_watch_relists_total {self.watch_relists_count}
+
+# HELP postgres_controller_drift_notifications_total Drift notifications received from the database
+# TYPE postgres_controller_drift_notifications_total counter
+postgres_controller_drift_notifications_total {self.drift_notifications_count}
+
+# HELP postgres_controller_last_event_to_applied_seconds Latency from first watch event to end of the triggered cycle
+# TYPE postgres_controller_last_event_to_applied_seconds gauge
+postgres_controller_last_event_to_applied_seconds {self.last_event_to_applied_seconds}
+
+# HELP postgres_controller_secrets_cached Number of user Secrets held in the password cache
+# TYPE postgres_controller_secrets_cached gauge
+postgres_controller_secrets_cached {self.secrets_cached}
+
+# HELP postgres_controller_ddl_batches_total Total DDL batch transactions executed
+# TYPE postgres_controller_ddl_batches_total counter
+postgres_controller_ddl_batches_total {self.ddl_batches_count}
+
+# HELP postgres_controller_ddl_batch_fallbacks_total Total DDL batches retried per user after a failure
+# TYPE postgres_controller_ddl_batch_fallbacks_total counter
+postgres_controller_ddl_batch_fallbacks_total {self.ddl_batch_fallbacks_count}
+
+# HELP postgres_controller_ddl_batch_seconds_total Total time spent in DDL batches
+# TYPE postgres_controller_ddl_batch_seconds_total counter
+postgres_controller_ddl_batch_seconds_total {self.ddl_batch_seconds_total}
+
+# HELP postgres_controller_last_ddl_batch_seconds_max Slowest DDL batch of the most recently applied operations
+# TYPE postgres_controller_last_ddl_batch_seconds_max gauge
+postgres_controller_last_ddl_batch_seconds_max {self.last_ddl_batch_seconds_max}
+
+# HELP postgres_controller_executor_workers Parallel DDL workers configured
+# TYPE postgres_controller_executor_workers gauge
+postgres_controller_executor_workers {self.executor_workers}
+
+# HELP postgres_controller_executor_queue_depth DDL batches waiting for a free worker
+# TYPE postgres_controller_executor_queue_depth gauge
+postgres_controller_executor_queue_depth {self.executor_queue_depth}
+
+# HELP postgres_controller_replica_active Whether this replica holds its Lease and reconciles (1) or stands by (0)
+# TYPE postgres_controller_replica_active gauge
+postgres_controller_replica_active {self.replica_active}
+
+# HELP postgres_controller_shard_members Live controller replicas sharing the usernames
+# TYPE postgres_controller_shard_members gauge
+postgres_controller_shard_members {self.shard_members}
+
+# HELP postgres_controller_workqueue_depth Users queued for a retry, ready or backing off
+# TYPE postgres_controller_workqueue_depth gauge
+postgres_controller_workqueue_depth {self.workqueue_depth}
+
+# HELP postgres_controller_workqueue_retries_total Total failed users re-queued with backoff
+# TYPE postgres_controller_workqueue_retries_total counter
+postgres_controller_workqueue_retries_total {self.workqueue_retries_count}
+
+# HELP postgres_controller_users_deferred_total Total user changes held back while the user was backing off
+# TYPE postgres_controller_users_deferred_total counter
+postgres_controller_users_deferred_total {self.users_deferred_count}
+
+# HELP postgres_controller_passwords_updated_total Total users whose stored password no longer matched their Secret
+# TYPE postgres_controller_passwords_updated_total counter
+postgres_controller_passwords_updated_total {self.passwords_updated_count}
+
+# HELP postgres_controller_privileges_updated_total Total users whose direct object privileges were corrected
+# TYPE postgres_controller_privileges_updated_total counter
+postgres_controller_privileges_updated_total {self.privileges_updated_count}
+
+# HELP postgres_controller_status_patches_total Total PostgreSQLUser status updates written
+# TYPE postgres_controller_status_patches_total counter
+postgres_controller_status_patches_total {self.status_patches_count}
+
+# HELP postgres_controller_call_retries_total Total Kubernetes and database calls retried after a transient failure
+# TYPE postgres_controller_call_retries_total counter
+postgres_controller_call_retries_total {self.retries_count}
+
+# HELP postgres_controller_circuit_rejections_total Total calls failed fast because their endpoint's circuit was open
+# TYPE postgres_controller_circuit_rejections_total counter
+postgres_controller_circuit_rejections_total {self.circuit_rejections_count}
+
+# HELP postgres_controller_db_pool_invalidations_total Connection pools discarded after a lost or demoted primary
+# TYPE postgres_controller_db_pool_invalidations_total counter
+postgres_controller_db_pool_invalidations_total {self.pool_invalidations_count}
 """
 
 
 # ============================================================================
-# KUBERNETES CLIENT
+# METRICS SERVER
 # ============================================================================
 
-class KubernetesClient:
-    """Handles all Kubernetes API interactions"""
+@contextmanager
+def observe_duration(metrics: Optional[Metrics], family: str, label: str = ""):
+    """Time the enclosed block if a Metrics instance is attached"""
+    if metrics is None:
+        yield
+        return
+    with metrics.timer(family, label):
+        yield
+
+
+class MetricsServer:
+    """
+    Embedded HTTP server for Prometheus scraping and Kubernetes probes
     
-    def __init__(self):
-        try:
-            config.load_incluster_config()
-        except config.ConfigException:
-            logger.warning("Failed to load in-cluster config, trying local kubeconfig")
-            config.load_kube_config()
+    Serves /metrics from the controller's export_prometheus(), /healthz
+    (process alive) and /readyz (at least one cycle completed).
+    """
+    
+    def __init__(self, controller, port: Optional[int] = None, host: str = ""):
+        self.controller = controller
+        self.port = Config.METRICS_PORT if port is None else port
+        self.host = host
+        self.httpd: Optional[ThreadingHTTPServer] = None
+    
+    def _handler(self):
+        controller = self.controller
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    status, body = 200, controller.export_prometheus()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/healthz":
+                    status, body, content_type = 200, "ok\n", "text/plain"
+                elif self.path == "/readyz":
+                    ready = controller.is_ready()
+                    status = 200 if ready else 503
+                    body, content_type = ("ready\n" if ready else "not ready\n"), "text/plain"
+                else:
+                    status, body, content_type = 404, "not found\n", "text/plain"
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self) -> int:
+        """
+        Start serving in a daemon thread
+        
+        Returns:
+            Bound port (useful when port 0 was requested)
+        """
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True).start()
+        self.port = self.httpd.server_address[1]
+        logger.info(f"Metrics server listening on :{self.port} (/metrics, /healthz, /readyz)")
+        return self.port
+    
+    def stop(self):
+        """Stop serving"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+# ============================================================================
+# KUBERNETES CLIENT
+# ============================================================================
+
+def secret_name_for_user(username: str) -> str:
+    """Name of the Secret holding a user's password"""
+    return f"user-{username.replace('_', '-')}-secret"
+
+
+# PostgreSQLUser custom resource (UserManifests/postgresql-user-crd.yaml)
+USER_CRD_GROUP = "acid.zalan.do"
+USER_CRD_VERSION = "v1"
+USER_CRD_PLURAL = "postgresqlusers"
+
+
+def object_meta(obj) -> Tuple[str, Optional[str]]:
+    """Name and resourceVersion of an API model object or a custom object dict"""
+    if isinstance(obj, dict):
+        metadata = obj.get("metadata") or {}
+        return metadata.get("name"), metadata.get("resourceVersion")
+    return obj.metadata.name, obj.metadata.resource_version
+
+
+def is_user_secret_name(name: str) -> bool:
+    """Check whether a Secret name follows the user-<name>-secret convention"""
+    return name.startswith("user-") and name.endswith("-secret")
+
+
+class KubernetesClient:
+    """Handles all Kubernetes API interactions"""
+    
+    # Attached by the controller to record API call latency
+    metrics: Optional[Metrics] = None
+    
+    def __init__(self, api_client: Optional[client.ApiClient] = None):
+        if api_client is None:
+            try:
+                config.load_incluster_config()
+            except config.ConfigException:
+                logger.warning("Failed to load in-cluster config, trying local kubeconfig")
+                config.load_kube_config()
         
-        self.v1 = client.CoreV1Api()
+        self.v1 = client.CoreV1Api(api_client)
+        self.coordination = client.CoordinationV1Api(api_client)
+        self.custom = client.CustomObjectsApi(api_client)
+        self.retrier = Retrier(owner=self)
+    
+    def _call(self, call: str, func, *args, **kwargs):
+        """Make an API call through the retrier, timing each attempt"""
+        def attempt():
+            with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", call):
+                return func(*args, **kwargs)
+        return self.retrier.call("kubernetes", attempt)
     
-    def fetch_configmap(self, name: str, namespace: str, retry_count: int = 0) -> Optional[str]:
+    def fetch_configmap(self, name: str, namespace: str) -> Optional[Union[str, bytes]]:
         """
-        Fetch ConfigMap with exponential backoff retry logic
+        Fetch ConfigMap, retrying transient errors
         
         Args:
             name: ConfigMap name
             namespace: Kubernetes namespace
-            retry_count: Current retry attempt
             
         Returns:
-            ConfigMap data as string or None if not found
+            users.yaml (or a current sidecar of it) or None if not found
         """
         try:
-            cm = self.v1.read_namespaced_config_map(name, namespace)
-            return cm.data.get("users.yaml", "")
+            cm = self._call("read_configmap", self.v1.read_namespaced_config_map, name, namespace)
         except ApiException as e:
             if e.status == 404:
                 logger.warning(f"ConfigMap {name} not found in namespace {namespace}")
                 return None
-            elif retry_count < Config.MAX_RETRIES:
-                sleep_time = Config.RETRY_BACKOFF_BASE ** retry_count
-                logger.warning(f"Error fetching ConfigMap (attempt {retry_count + 1}/{Config.MAX_RETRIES}), "
-                             f"retrying in {sleep_time}s: {e}")
-                time.sleep(sleep_time)
-                return self.fetch_configmap(name, namespace, retry_count + 1)
-            else:
-                logger.error(f"Failed to fetch ConfigMap after {Config.MAX_RETRIES} retries: {e}")
-                raise
+            logger.error(f"Failed to fetch ConfigMap: {e}")
+            raise
+        return select_desired_document(cm.data, cm.binary_data)
     
-    def get_user_password(self, username: str, namespace: str, retry_count: int = 0) -> Optional[str]:
+    def get_user_password(self, username: str, namespace: str) -> Optional[str]:
         """
-        Retrieve user password from Kubernetes Secret with retry logic
+        Retrieve user password from Kubernetes Secret, retrying transient errors
         
         Args:
             username: Username for which to fetch password
             namespace: Kubernetes namespace
-            retry_count: Current retry attempt
             
         Returns:
             Decoded password string or None if not found
         """
-        secret_name = f"user-{username.replace('_', '-')}-secret"
+        secret_name = secret_name_for_user(username)
         
         try:
-            secret = self.v1.read_namespaced_secret(secret_name, namespace)
-            encoded_pw = secret.data.get("password")
-            if not encoded_pw:
-                logger.error(f"Secret {secret_name} exists but has no 'password' field")
-                return None
-            return base64.b64decode(encoded_pw).decode()
+            secret = self._call("read_secret", self.v1.read_namespaced_secret, secret_name, namespace)
         except ApiException as e:
             if e.status == 404:
                 logger.warning(f"Secret {secret_name} not found in namespace {namespace}")
                 return None
-            elif retry_count < Config.MAX_RETRIES:
-                sleep_time = Config.RETRY_BACKOFF_BASE ** retry_count
-                logger.warning(f"Error fetching Secret (attempt {retry_count + 1}/{Config.MAX_RETRIES}), "
-                             f"retrying in {sleep_time}s: {e}")
-                time.sleep(sleep_time)
-                return self.get_user_password(username, namespace, retry_count + 1)
-            else:
-                logger.error(f"Failed to fetch Secret after {Config.MAX_RETRIES} retries: {e}")
-                raise
-
-
-# ============================================================================
-# DATABASE CLIENT
-# ============================================================================
-
-class DatabaseClient:
-    """Handles all PostgreSQL database interactions"""
-    
-    def __init__(self):
-        self.connection_pool = None
-        self._initialize_pool()
-    
-    def _initialize_pool(self):
-        """Initialize connection pool with retry logic"""
-        for attempt in range(Config.MAX_RETRIES):
-            try:
-                self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                    Config.DB_POOL_MIN_CONN,
-                    Config.DB_POOL_MAX_CONN,
-                    host=Config.DB_HOST,
-                    port=Config.DB_PORT,
-                    dbname=Config.DB_NAME,
-                    user=Config.DB_USER,
-                    password=Config.DB_PASS,
-                    connect_timeout=10
-                )
-                logger.info("Database connection pool initialized successfully")
-                return
-            except psycopg2.Error as e:
-                sleep_time = Config.RETRY_BACKOFF_BASE ** attempt
-                logger.warning(f"Failed to initialize connection pool (attempt {attempt + 1}/{Config.MAX_RETRIES}), "
-                             f"retrying in {sleep_time}s: {e}")
-                time.sleep(sleep_time)
-        
-        raise RuntimeError("Failed to initialize database connection pool")
-    
-    def get_connection(self):
-        """Get a connection from the pool"""
-        if not self.connection_pool:
-            self._initialize_pool()
-        return self.connection_pool.getconn()
+            logger.error(f"Failed to fetch Secret {secret_name}: {e}")
+            raise
+        encoded_pw = secret.data.get("password")
+        if not encoded_pw:
+            logger.error(f"Secret {secret_name} exists but has no 'password' field")
+            return None
+        return base64.b64decode(encoded_pw).decode()
     
-    def return_connection(self, conn):
-        """Return a connection to the pool"""
-        if self.connection_pool:
-            self.connection_pool.putconn(conn)
+    def configmap_watcher(self, name: str, namespace: str, on_event) -> "ResourceWatcher":
+        """Build a watcher for the users ConfigMap (or all shards matching CONFIGMAP_SELECTOR)"""
+        if Config.CONFIGMAP_SELECTOR:
+            selector = {"label_selector": Config.CONFIGMAP_SELECTOR}
+        else:
+            selector = {"field_selector": f"metadata.name={name}"}
+        return ResourceWatcher(
+            "configmap",
+            self.v1.list_namespaced_config_map,
+            namespace,
+            on_event,
+            **selector
+        )
     
-    def fetch_existing_users(self) -> Set[str]:
+    def list_user_configmaps(self, namespace: str, label_selector: str) -> List[ConfigMapShard]:
         """
-        Fetch all non-system users from the database
+        List all desired state shards in a single API call
         
+        Args:
+            namespace: Kubernetes namespace
+            label_selector: Label selector of the shards
+            
         Returns:
-            Set of usernames currently in the database
+            One ConfigMapShard per matching ConfigMap
         """
-        conn = None
-        try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                # Exclude system roles
-                system_roles_list = ",".join([f"'{role}'" for role in Config.SYSTEM_ROLES])
-                cur.execute(f"SELECT rolname FROM pg_roles WHERE rolname NOT IN ({system_roles_list});")
-                return {r[0] for r in cur.fetchall()}
-        except psycopg2.Error as e:
-            logger.error(f"Error fetching existing users: {e}")
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+        result = self._call("list_configmaps", self.v1.list_namespaced_config_map, namespace,
+                            label_selector=label_selector)
+        return [configmap_shard(item) for item in result.items or []]
     
-    def fetch_existing_roles(self) -> Set[str]:
+    def list_user_secrets(self, namespace: str) -> Tuple[list, str]:
         """
-        Fetch all custom roles from the database (excluding system roles and users)
+        List all user-*-secret Secrets in a single API call
         
+        Args:
+            namespace: Kubernetes namespace
+            
         Returns:
-            Set of role names
+            Tuple of (matching Secrets, list resourceVersion)
         """
-        conn = None
-        try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                system_roles_list = ",".join([f"'{role}'" for role in Config.SYSTEM_ROLES])
-                # Get roles that can't login (roles vs users)
-                cur.execute(f"""
-                    SELECT rolname FROM pg_roles 
-                    WHERE rolname NOT IN ({system_roles_list})
-                    AND NOT rolcanlogin;
-                """)
-                return {r[0] for r in cur.fetchall()}
-        except psycopg2.Error as e:
-            logger.error(f"Error fetching existing roles: {e}")
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+        kwargs = {"label_selector": Config.SECRET_LABEL_SELECTOR} if Config.SECRET_LABEL_SELECTOR else {}
+        result = self._call("list_secrets", self.v1.list_namespaced_secret, namespace, **kwargs)
+        items = [item for item in result.items or [] if is_user_secret_name(item.metadata.name)]
+        return items, result.metadata.resource_version
     
-    def fetch_user_roles(self, username: str) -> Set[str]:
+    def discover_clusters(self, namespace: Optional[str] = None) -> List[ClusterTarget]:
         """
-        Fetch all roles granted to a specific user
+        Discover Spilo clusters through their master Services
+        
+        The operator labels each cluster's master Service with the common
+        cluster labels (application=spilo) plus cluster-name and spilo-role.
         
         Args:
-            username: The username to query
+            namespace: Namespace to search (all namespaces if empty)
             
         Returns:
-            Set of role names granted to the user
+            List of ClusterTarget, with credentials from the operator's Secret when readable
         """
-        conn = None
+        with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", "list_services"):
+            if namespace:
+                services = self.v1.list_namespaced_service(namespace, label_selector=Config.CLUSTER_LABEL_SELECTOR)
+            else:
+                services = self.v1.list_service_for_all_namespaces(label_selector=Config.CLUSTER_LABEL_SELECTOR)
+        
+        targets = []
+        for svc in services.items or []:
+            labels = svc.metadata.labels or {}
+            name = labels.get(Config.CLUSTER_NAME_LABEL, svc.metadata.name)
+            target = ClusterTarget(
+                name=name,
+                host=f"{svc.metadata.name}.{svc.metadata.namespace}.svc.cluster.local"
+            )
+            secret_name = Config.CLUSTER_CREDENTIALS_SECRET.format(cluster=name)
+            try:
+                secret = self.v1.read_namespaced_secret(secret_name, svc.metadata.namespace)
+                data = secret.data or {}
+                if data.get("username"):
+                    target.user = base64.b64decode(data["username"]).decode()
+                if data.get("password"):
+                    target.password = base64.b64decode(data["password"]).decode()
+            except ApiException as e:
+                logger.warning(f"Could not read credentials {secret_name} for cluster {name}: {e.status}")
+            targets.append(target)
+        return targets
+    
+    def read_lease(self, name: str, namespace: str):
+        """Read a Lease, None if it does not exist"""
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                # Query role membership
-                cur.execute("""
-                    SELECT r.rolname
-                    FROM pg_roles r
-                    JOIN pg_auth_members m ON r.oid = m.roleid
-                    JOIN pg_roles u ON u.oid = m.member
-                    WHERE u.rolname = %s;
-                """, (username,))
-                return {r[0] for r in cur.fetchall()}
-        except psycopg2.Error as e:
-            logger.error(f"Error fetching roles for user {username}: {e}")
+            with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", "read_lease"):
+                return self.coordination.read_namespaced_lease(name, namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
             raise
-        finally:
-            if conn:
-                self.return_connection(conn)
     
-    def create_role(self, role_name: str, dry_run: bool = False):
+    def create_lease(self, namespace: str, lease):
+        """Create a Lease (409 if another replica created it first)"""
+        with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", "write_lease"):
+            return self.coordination.create_namespaced_lease(namespace, lease)
+    
+    def replace_lease(self, name: str, namespace: str, lease):
+        """Replace a Lease; its resourceVersion makes this a compare-and-swap"""
+        with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", "write_lease"):
+            return self.coordination.replace_namespaced_lease(name, namespace, lease)
+    
+    def list_leases(self, namespace: str, label_selector: str) -> list:
+        """List Leases matching a label selector"""
+        with observe_duration(self.metrics, "postgres_controller_kube_api_duration_seconds", "list_leases"):
+            return self.coordination.list_namespaced_lease(namespace, label_selector=label_selector).items or []
+    
+    def delete_lease(self, name: str, namespace: str):
+        """Delete a Lease, ignoring one that is already gone"""
+        try:
+            self.coordination.delete_namespaced_lease(name, namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+    
+    def list_postgresql_users(self, namespace: str, **kwargs) -> object:
         """
-        Create a new PostgreSQL role
+        List PostgreSQLUser objects (or stream their changes with watch=True)
         
+        Annotated as returning object so that watch.Watch decodes events into
+        plain dicts, as it does for the CustomObjectsApi itself.
+        """
+        if kwargs.get("watch"):
+            # Watch streams are retried by the ResourceWatcher
+            return self.custom.list_namespaced_custom_object(
+                USER_CRD_GROUP, USER_CRD_VERSION, namespace, USER_CRD_PLURAL, **kwargs
+            )
+        return self._call("list_postgresqlusers", self.custom.list_namespaced_custom_object,
+                          USER_CRD_GROUP, USER_CRD_VERSION, namespace, USER_CRD_PLURAL, **kwargs)
+    
+    def patch_user_status(self, name: str, namespace: str, status: dict):
+        """Merge-patch the status subresource of a PostgreSQLUser"""
+        self._call("patch_status", self.custom.patch_namespaced_custom_object_status,
+                   USER_CRD_GROUP, USER_CRD_VERSION, namespace, USER_CRD_PLURAL, name, {"status": status})
+    
+    def user_watcher(self, namespace: str, on_event, on_list=None, on_object=None) -> "ResourceWatcher":
+        """Build a watcher for PostgreSQLUser objects"""
+        return ResourceWatcher(
+            "postgresqluser",
+            self.list_postgresql_users,
+            namespace,
+            on_event,
+            on_list=on_list,
+            on_object=on_object
+        )
+    
+    def secret_watcher(self, namespace: str, on_event, on_list=None, on_object=None) -> "ResourceWatcher":
+        """Build a watcher for user-*-secret Secrets"""
+        return ResourceWatcher(
+            "secret",
+            self.v1.list_namespaced_secret,
+            namespace,
+            on_event,
+            name_filter=is_user_secret_name,
+            label_selector=Config.SECRET_LABEL_SELECTOR or None,
+            on_list=on_list,
+            on_object=on_object
+        )
+
+
+# ============================================================================
+# WATCHERS AND CACHES
+# ============================================================================
+
+class ResourceWatcher:
+    """
+    Watches a namespaced resource list in a background thread
+    
+    Tracks the last seen resourceVersion (including bookmarks) so that
+    reconnects resume where the previous watch stopped, and relists when
+    the server reports the version as expired (410 Gone).
+    """
+    
+    def __init__(self, kind: str, list_func, namespace: str, on_event,
+                 field_selector: Optional[str] = None, name_filter=None,
+                 label_selector: Optional[str] = None, on_list=None, on_object=None):
+        """
         Args:
-            role_name: Name of the role to create
-            dry_run: If True, only log the action without executing
+            kind: Short resource kind used in logs and callbacks
+            list_func: CoreV1Api list function for the resource
+            namespace: Kubernetes namespace
+            on_event: Callback invoked as on_event(kind, event_type, name)
+            field_selector: Optional server-side field selector
+            name_filter: Optional predicate applied to object names
+            label_selector: Optional server-side label selector
+            on_list: Optional callback receiving all matching objects after a relist
+            on_object: Optional callback invoked as on_object(event_type, obj);
+                returning False drops the event before on_event
         """
-        if dry_run:
-            logger.info(f"[DRY-RUN] Would create role: {role_name}")
-            return
+        self.kind = kind
+        self.list_func = list_func
+        self.namespace = namespace
+        self.on_event = on_event
+        self.field_selector = field_selector
+        self.name_filter = name_filter
+        self.label_selector = label_selector
+        self.on_list = on_list
+        self.on_object = on_object
+        self.resource_version: Optional[str] = None
+        self.relists = 0
+        self.bookmarks = 0
+        self._watch = watch.Watch()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _selector_kwargs(self) -> dict:
+        kwargs = {}
+        if self.field_selector:
+            kwargs["field_selector"] = self.field_selector
+        if self.label_selector:
+            kwargs["label_selector"] = self.label_selector
+        return kwargs
+    
+    def relist(self):
+        """List the resource to obtain a fresh resourceVersion"""
+        result = self.list_func(self.namespace, **self._selector_kwargs())
+        # Custom objects are listed as plain dicts
+        custom = isinstance(result, dict)
+        self.resource_version = result["metadata"]["resourceVersion"] if custom else result.metadata.resource_version
+        self.relists += 1
+        if self.on_list:
+            self.on_list([
+                item for item in (result.get("items") if custom else result.items) or []
+                if not self.name_filter or self.name_filter(object_meta(item)[0])
+            ])
+        logger.info(f"Listed {self.kind}s at resourceVersion {self.resource_version}")
+        # Anything may have changed while we were not watching
+        self.on_event(self.kind, "RELIST", None)
+    
+    def watch_once(self):
+        """Run a single watch request until it times out or is stopped"""
+        if self.resource_version is None:
+            self.relist()
         
-        conn = None
-        try:
-            conn = self.get_connection()
-            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            with conn.cursor() as cur:
-                # Use sql.Identifier to prevent SQL injection
-                cur.execute(sql.SQL("CREATE ROLE {} NOLOGIN;").format(
-                    sql.Identifier(role_name)
-                ))
-                logger.info(f"{WHITE}Created role: {role_name}{RESET}")
-        except psycopg2.Error as e:
-            logger.error(f"Error creating role {role_name}: {e}")
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+        for event in self._watch.stream(
+            self.list_func,
+            self.namespace,
+            resource_version=self.resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=Config.WATCH_TIMEOUT_SECONDS,
+            **self._selector_kwargs()
+        ):
+            if self._stop_event.is_set():
+                return
+            
+            event_type = event["type"]
+            if event_type == "BOOKMARK":
+                self.resource_version = self._watch.resource_version
+                self.bookmarks += 1
+                continue
+            
+            obj = event["object"]
+            name, self.resource_version = object_meta(obj)
+            if self.name_filter and not self.name_filter(name):
+                continue
+            
+            if self.on_object and self.on_object(event_type, obj) is False:
+                continue
+            self.on_event(self.kind, event_type, name)
     
-    def drop_role(self, role_name: str, dry_run: bool = False):
+    def _run(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            try:
+                self.watch_once()
+                failures = 0
+            except ApiException as e:
+                if e.status == 410:
+                    logger.info(f"{self.kind} watch expired at {self.resource_version}, relisting")
+                    self.resource_version = None
+                    continue
+                failures += 1
+                self._wait_before_retry(failures, e)
+            except Exception as e:
+                failures += 1
+                self._wait_before_retry(failures, e)
+    
+    def _wait_before_retry(self, failures: int, error: Exception):
+        sleep_time = full_jitter(expo(failures, Config.RETRY_BACKOFF_BASE, max_value=30))
+        logger.warning(f"{self.kind} watch failed (attempt {failures}), retrying in {sleep_time:.1f}s: {error}")
+        self._stop_event.wait(sleep_time)
+    
+    def start(self):
+        """Start watching in a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name=f"watch-{self.kind}", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the watch loop"""
+        self._stop_event.set()
+        self._watch.stop()
+
+
+class SecretCache:
+    """
+    In-memory index of user passwords
+    
+    Filled from a single list of user Secrets and kept fresh by watch events.
+    Passwords are stored base64-encoded and decoded on first use.
+    """
+    
+    def __init__(self):
+        self._encoded: Dict[str, Optional[str]] = {}
+        self._decoded: Dict[str, str] = {}
+        self._versions: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self.resource_version: Optional[str] = None
+        self.synced = False
+        # Set while a Secret watcher keeps the cache fresh
+        self.watched = False
+    
+    def __len__(self) -> int:
+        return len(self._encoded)
+    
+    def load(self, secrets: list, resource_version: Optional[str] = None):
+        """Replace the cache contents with a full list of Secrets"""
+        encoded = {s.metadata.name: (s.data or {}).get("password") for s in secrets}
+        versions = {s.metadata.name: getattr(s.metadata, "resource_version", None) for s in secrets}
+        with self._lock:
+            self._encoded = encoded
+            self._decoded = {}
+            self._versions = versions
+            self.resource_version = resource_version
+            self.synced = True
+    
+    def apply_event(self, event_type: str, secret):
+        """Apply a single watch event"""
+        name = secret.metadata.name
+        with self._lock:
+            self._decoded.pop(name, None)
+            if event_type == "DELETED":
+                self._encoded.pop(name, None)
+                self._versions.pop(name, None)
+            else:
+                self._encoded[name] = (secret.data or {}).get("password")
+                self._versions[name] = secret.metadata.resource_version
+            self.resource_version = secret.metadata.resource_version
+    
+    def version_of(self, username: str) -> Optional[str]:
+        """resourceVersion of a user's Secret, None if not cached"""
+        with self._lock:
+            return self._versions.get(secret_name_for_user(username))
+    
+    def digest(self) -> Optional[str]:
         """
-        Drop a PostgreSQL role
+        Digest of the per-Secret versions, None before the first list
         
-        Args:
-            role_name: Name of the role to drop
-            dry_run: If True, only log the action without executing
+        Unlike the list's resourceVersion it only changes when a user Secret
+        does, so it can take part in the cycle fingerprint in poll mode.
         """
-        if dry_run:
-            logger.info(f"[DRY-RUN] Would drop role: {role_name}")
-            return
-        
-        conn = None
-        try:
-            conn = self.get_connection()
-            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            with conn.cursor() as cur:
-                # Revoke from all users first
-                cur.execute(sql.SQL("DROP ROLE IF EXISTS {};").format(
-                    sql.Identifier(role_name)
-                ))
-                logger.info(f"{WHITE}Dropped role: {role_name}{RESET}")
-        except psycopg2.Error as e:
-            logger.error(f"Error dropping role {role_name}: {e}")
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+        if not self.synced:
+            return None
+        with self._lock:
+            versions = sorted(self._versions.items())
+        return hashlib.sha256(repr(versions).encode()).hexdigest()
     
-    def create_user(self, user_spec: UserSpec, password: str, dry_run: bool = False):
+    def get_password(self, username: str) -> Optional[str]:
         """
-        Create a new PostgreSQL user with specified roles and privileges
+        Look up a user's password
         
         Args:
-            user_spec: User specification
-            password: User password (will be masked in logs)
-            dry_run: If True, only log the action without executing
+            username: Username for which to fetch password
+            
+        Returns:
+            Decoded password string or None if not cached
         """
-        if dry_run:
-            logger.info(f"[DRY-RUN] Would create user: {user_spec.username} with roles {user_spec.roles}")
-            return
-        
-        conn = None
-        try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                # Create user
-                cur.execute(
-                    sql.SQL("CREATE USER {} WITH PASSWORD %s;").format(
-                        sql.Identifier(user_spec.username)
-                    ),
-                    (password,)
-                )
-                logger.info(f"{WHITE}Created user: {user_spec.username}{RESET}")
-                
-                # Grant database access
-                cur.execute(
-                    sql.SQL("GRANT CONNECT ON DATABASE {} TO {};").format(
-                        sql.Identifier(user_spec.database),
-                        sql.Identifier(user_spec.username)
-                    )
-                )
-                
-                # Grant roles
-                for role in user_spec.roles:
-                    cur.execute(
+        secret_name = secret_name_for_user(username)
+        with self._lock:
+            if secret_name in self._decoded:
+                return self._decoded[secret_name]
+            encoded_pw = self._encoded.get(secret_name)
+            if secret_name in self._encoded and not encoded_pw:
+                logger.error(f"Secret {secret_name} exists but has no 'password' field")
+            if not encoded_pw:
+                return None
+            password = base64.b64decode(encoded_pw).decode()
+            self._decoded[secret_name] = password
+            return password
+
+
+class UserResourceCache:
+    """
+    Informer cache of PostgreSQLUser objects
+    
+    Filled from a single list and kept fresh by watch events. An object
+    only counts as changed when its uid or metadata.generation does, so
+    status updates (including the controller's own) cause no work.
+    """
+    
+    def __init__(self):
+        self._resources: Dict[str, UserResource] = {}
+        # username -> names of the objects defining it (normally exactly one)
+        self._names: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.synced = False
+        # Set while a PostgreSQLUser watcher keeps the cache fresh
+        self.watched = False
+    
+    def __len__(self) -> int:
+        return len(self._resources)
+    
+    def _index(self, resource: UserResource, add: bool):
+        names = self._names.setdefault(resource.spec.username, set())
+        if add:
+            names.add(resource.name)
+        else:
+            names.discard(resource.name)
+            if not names:
+                del self._names[resource.spec.username]
+    
+    def load(self, objects: list) -> Set[str]:
+        """
+        Replace the cache contents with a full list of objects
+        
+        Returns:
+            Usernames whose objects were added, changed or removed
+        """
+        resources = {resource.name: resource for resource in map(user_resource, objects)}
+        with self._lock:
+            previous, self._resources = self._resources, resources
+            self._names = {}
+            for resource in resources.values():
+                self._index(resource, True)
+            self.synced = True
+        changed = set()
+        for name in set(previous) | set(resources):
+            before, after = previous.get(name), resources.get(name)
+            if before is None or after is None or before.version != after.version:
+                changed.update(r.spec.username for r in (before, after) if r is not None)
+        return changed
+    
+    def apply_event(self, event_type: str, obj: dict) -> Set[str]:
+        """
+        Apply a single watch event
+        
+        Returns:
+            Usernames whose desired spec may have changed (empty for status-only updates)
+        """
+        resource = user_resource(obj)
+        with self._lock:
+            before = self._resources.get(resource.name)
+            if event_type != "DELETED" and before is not None and before.version == resource.version:
+                self._resources[resource.name] = replace(before, status=resource.status)
+                return set()
+            if before is not None:
+                self._index(before, False)
+            if event_type == "DELETED":
+                self._resources.pop(resource.name, None)
+            else:
+                self._resources[resource.name] = resource
+                self._index(resource, True)
+        return {r.spec.username for r in (before, resource) if r is not None}
+    
+    def resources(self) -> List[UserResource]:
+        """All cached objects, sorted by name"""
+        with self._lock:
+            return sorted(self._resources.values(), key=lambda resource: resource.name)
+    
+    def resources_of(self, usernames: Set[str]) -> List[UserResource]:
+        """Cached objects defining any of the given usernames, sorted by name"""
+        with self._lock:
+            resources = [self._resources[name] for username in usernames for name in self._names.get(username, ())]
+        return sorted(resources, key=lambda resource: resource.name)
+    
+    def record_status(self, name: str, version: str, status: dict):
+        """Remember a written status, unless the object changed in the meantime"""
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is not None and resource.version == version:
+                self._resources[name] = replace(resource, status={**resource.status, **status})
+
+
+# ============================================================================
+# WORK QUEUE
+# ============================================================================
+
+def expo(n: int, base: float = 2, factor: float = 1, max_value: Optional[float] = None) -> float:
+    """Exponential backoff value factor * base ** n, capped at max_value"""
+    value = factor * base ** n
+    if max_value is None or value < max_value:
+        return value
+    return max_value
+
+
+def full_jitter(value: float) -> float:
+    """Jitter a backoff value across the full range (0 to value)"""
+    return random.uniform(0, value)
+
+
+class WorkQueue:
+    """
+    Rate-limited, deduplicating queue of usernames
+    
+    Modeled on client-go's rate-limited workqueue: a key is queued at most
+    once, failing keys are re-added with their own jittered exponential
+    backoff, and ready keys are served in the order they became ready.
+    Operations of retried users still run in PlanExecutor.ORDER.
+    """
+    
+    def __init__(self, base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                 clock=time.monotonic):
+        self.base_delay = Config.WORKQUEUE_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = Config.WORKQUEUE_MAX_DELAY if max_delay is None else max_delay
+        self.clock = clock
+        # key -> (ready_at, sequence of its live heap entry)
+        self._items: Dict[str, Tuple[float, int]] = {}
+        self._failures: Dict[str, int] = {}
+        self._waiting: List[Tuple[float, int, str]] = []
+        self._ready: List[Tuple[int, str]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._items
+    
+    def _push(self, key: str, ready_at: float, now: float):
+        sequence = next(self._sequence)
+        self._items[key] = (ready_at, sequence)
+        if ready_at <= now:
+            heapq.heappush(self._ready, (sequence, key))
+        else:
+            heapq.heappush(self._waiting, (ready_at, sequence, key))
+    
+    def _promote(self, now: float):
+        """Move keys whose backoff expired to the ready heap"""
+        while self._waiting and self._waiting[0][0] <= now:
+            _, sequence, key = heapq.heappop(self._waiting)
+            item = self._items.get(key)
+            if item and item[1] == sequence:
+                heapq.heappush(self._ready, (sequence, key))
+    
+    def add(self, key: str):
+        """Queue a key for immediate processing (a waiting key skips its remaining backoff)"""
+        self.add_after(key, 0.0)
+    
+    def add_after(self, key: str, delay: float):
+        """
+        Queue a key once delay seconds have passed
+        
+        A key that is already queued keeps a single entry with the earlier
+        ready time.
+        """
+        with self._lock:
+            now = self.clock()
+            ready_at = now + max(0.0, delay)
+            item = self._items.get(key)
+            if item and item[0] <= ready_at:
+                return
+            self._push(key, ready_at, now)
+    
+    def add_rate_limited(self, key: str) -> float:
+        """
+        Re-queue a failed key after its own backoff
+        
+        Returns:
+            Delay in seconds before the key is ready again
+        """
+        with self._lock:
+            failures = self._failures.get(key, 0)
+            self._failures[key] = failures + 1
+        delay = full_jitter(expo(failures, Config.RETRY_BACKOFF_BASE, self.base_delay, self.max_delay))
+        self.add_after(key, delay)
+        return delay
+    
+    def forget(self, key: str):
+        """Reset the backoff of a key after it was processed successfully"""
+        with self._lock:
+            self._failures.pop(key, None)
+    
+    def num_requeues(self, key: str) -> int:
+        """Number of consecutive failures recorded for a key"""
+        with self._lock:
+            return self._failures.get(key, 0)
+    
+    def is_waiting(self, key: str) -> bool:
+        """Check whether a key is queued but still backing off"""
+        with self._lock:
+            item = self._items.get(key)
+            return item is not None and item[0] > self.clock()
+    
+    def keys(self) -> List[str]:
+        """All queued keys, ready or waiting"""
+        with self._lock:
+            return list(self._items)
+    
+    def pop_ready(self) -> List[str]:
+        """
+        Remove and return every ready key
+        
+        Returns:
+            Keys in the order they became ready
+        """
+        with self._lock:
+            self._promote(self.clock())
+            keys = []
+            while self._ready:
+                sequence, key = heapq.heappop(self._ready)
+                item = self._items.get(key)
+                if item and item[1] == sequence:
+                    del self._items[key]
+                    keys.append(key)
+            return keys
+    
+    def ready_in(self) -> Optional[float]:
+        """Seconds until the next key is ready (0 if one is ready, None if empty)"""
+        with self._lock:
+            if not self._items:
+                return None
+            return max(0.0, min(ready_at for ready_at, _ in self._items.values()) - self.clock())
+
+
+# ============================================================================
+# RETRIES AND CIRCUIT BREAKERS
+# ============================================================================
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+    
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit for {endpoint} is open, next trial call in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+# Transport failures of the Kubernetes API client (urllib3 underneath) and of sockets
+TRANSIENT_TRANSPORT_ERRORS = (
+    urllib3.exceptions.MaxRetryError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.NewConnectionError,
+    urllib3.exceptions.TimeoutError,
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+)
+# SQLSTATE classes of errors that persist across retries: invalid
+# authorization (bad password) and invalid catalog name (missing database)
+PERMANENT_SQLSTATE_CLASSES = ("28", "3D")
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed call is worth retrying: server errors, throttling, timeouts and connection errors"""
+    if isinstance(error, ApiException):
+        return not error.status or error.status in (408, 429) or error.status >= 500
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return (error.pgcode or "")[:2] not in PERMANENT_SQLSTATE_CLASSES
+    # Anything else (an exhausted pool, a bug, a rejected statement) says nothing about the server
+    return isinstance(error, TRANSIENT_TRANSPORT_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker of one endpoint
+    
+    Opens after failure_threshold consecutive failures, so that callers fail
+    fast; after reset_timeout seconds a single trial call is let through
+    (half-open), which closes the circuit again or re-opens it.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # Values of postgres_controller_circuit_state
+    STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+    
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 clock=time.monotonic):
+        self.failure_threshold = Config.BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.reset_timeout = Config.BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def retry_in(self) -> float:
+        """Seconds until the next trial call"""
+        return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+    
+    def allow(self) -> bool:
+        """Whether a call may be made now (half-opening the circuit claims the trial call)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.retry_in() <= 0:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+    
+    def record_failure(self) -> bool:
+        """Count a failure; True if it opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                return True
+            return False
+
+
+class Retrier:
+    """
+    Retry layer shared by the Kubernetes and PostgreSQL clients
+    
+    Transient failures are retried with full-jitter exponential backoff,
+    within the deadline budget of the cycle running in the calling thread,
+    behind one circuit breaker per endpoint. Once a circuit is open calls
+    fail immediately instead of sleeping, and the controller carries on
+    from its caches.
+    """
+    
+    # Retry deadline of the reconcile cycle running in each thread
+    _cycle = threading.local()
+    
+    def __init__(self, owner=None, max_retries: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            owner: Client whose metrics record retries and circuit states
+            max_retries: Retries after the first attempt
+            base_delay: Backoff of the first retry, before jitter
+            max_delay: Cap of a single backoff, before jitter
+            clock: Monotonic clock (tests)
+            sleep: Sleep function (tests)
+        """
+        self.owner = owner
+        self.max_retries = Config.MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = Config.RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = Config.RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def start_cycle(cls, budget: Optional[float] = None, clock=time.monotonic):
+        """Limit retries in the calling thread to budget seconds from now (0 for no limit)"""
+        budget = Config.RETRY_BUDGET_SECONDS if budget is None else budget
+        cls._cycle.deadline = clock() + budget if budget > 0 else None
+    
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Circuit breaker of an endpoint"""
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(clock=self.clock)
+            return self.breakers[endpoint]
+    
+    def call(self, endpoint: str, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs), retrying transient failures
+        
+        Args:
+            endpoint: Breaker key, e.g. "kubernetes" or "postgres/host:port"
+            func: Callable to invoke
+            
+        Returns:
+            Result of func
+            
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            Exception: The last error, once it is not transient or retries, budget or circuit are exhausted
+        """
+        breaker = self.breaker(endpoint)
+        metrics = getattr(self.owner, "metrics", None)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                if metrics:
+                    metrics.circuit_rejections_count += 1
+                raise CircuitOpenError(endpoint, breaker.retry_in())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # The endpoint answered
+                    self._record(endpoint, breaker, metrics, True)
+                    raise
+                self._record(endpoint, breaker, metrics, False)
+                delay = full_jitter(expo(attempt, Config.RETRY_BACKOFF_BASE, self.base_delay, self.max_delay))
+                deadline = getattr(self._cycle, "deadline", None)
+                if (attempt >= self.max_retries or breaker.state != CircuitBreaker.CLOSED
+                        or (deadline is not None and self.clock() + delay > deadline)):
+                    raise
+                logger.warning(f"Call to {endpoint} failed (attempt {attempt + 1}/{self.max_retries + 1}), "
+                               f"retrying in {delay:.2f}s: {e}")
+                if metrics:
+                    metrics.retries_count += 1
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self._record(endpoint, breaker, metrics, True)
+            return result
+    
+    def _record(self, endpoint: str, breaker: CircuitBreaker, metrics: Optional[Metrics], success: bool):
+        if success:
+            breaker.record_success()
+        elif breaker.record_failure():
+            logger.error(f"{RED}Circuit for {endpoint} opened after {breaker.failures} consecutive failures, "
+                         f"failing fast for {breaker.reset_timeout:.0f}s{RESET}")
+        if metrics:
+            metrics.record_circuit(endpoint, breaker.state)
+
+
+# ============================================================================
+# REPLICA COORDINATION
+# ============================================================================
+
+class HashRing:
+    """
+    Consistent-hash ring of controller replicas
+    
+    Each member owns SHARD_VNODES points on the ring; a username belongs to the
+    member owning the next point clockwise, so adding or removing a replica
+    only moves the usernames of the ring segments it gains or loses.
+    """
+    
+    def __init__(self, members, vnodes: Optional[int] = None):
+        self.members = sorted(set(members))
+        vnodes = max(1, vnodes or Config.SHARD_VNODES)
+        points = sorted((self._hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+    
+    def owner(self, key: str) -> Optional[str]:
+        """Member responsible for a key (None for an empty ring)"""
+        if not self._owners:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._owners)
+        return self._owners[index]
+
+
+class ReplicaCoordinator:
+    """
+    Lease-based coordination of controller replicas
+    
+    In leader mode all replicas compete for one Lease and only the holder
+    reconciles. In sharded mode every replica renews a Lease of its own; the
+    live Leases of the group form a HashRing that splits the usernames, and
+    each replica reconciles the users it owns.
+    
+    Like client-go's leader election, expiry is judged by when this replica
+    last saw a Lease change, not by the renewTime written by another clock.
+    A replica stops acting as soon as its own renewals are older than the
+    Lease duration.
+    """
+    
+    GROUP_LABEL = "user-controller/lease-group"
+    
+    def __init__(self, k8s_client: KubernetesClient, identity: Optional[str] = None,
+                 sharded: Optional[bool] = None, namespace: Optional[str] = None,
+                 on_change=None, clock=time.monotonic):
+        self.k8s_client = k8s_client
+        self.identity = identity or Config.POD_NAME
+        self.sharded = Config.SHARDING if sharded is None else sharded
+        self.namespace = namespace or Config.NAMESPACE
+        self.duration = Config.LEASE_DURATION_SECONDS
+        self.on_change = on_change
+        self.clock = clock
+        self.ring = HashRing([])
+        self.leading = False
+        self._renewed_at: Optional[float] = None
+        # Lease name -> (resourceVersion, local time it was first seen)
+        self._observed: Dict[str, Tuple[str, float]] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def lease_name(self) -> str:
+        """Name of the Lease this replica holds or competes for"""
+        return f"{Config.LEASE_NAME}-{self.identity}" if self.sharded else Config.LEASE_NAME
+    
+    def is_active(self) -> bool:
+        """Whether this replica may reconcile right now"""
+        if not self.leading or self._renewed_at is None:
+            return False
+        return self.clock() - self._renewed_at < self.duration
+    
+    def owns(self, username: str) -> bool:
+        """Whether this replica reconciles a user (always true in leader mode)"""
+        return not self.sharded or self.ring.owner(username) == self.identity
+    
+    def status(self) -> str:
+        """Short description for logs"""
+        if self.sharded:
+            return f"shard {self.identity} of {len(self.ring.members)} ({', '.join(self.ring.members)})"
+        return f"{'leader' if self.is_active() else 'standby'} {self.identity} on Lease {self.lease_name}"
+    
+    def _expired(self, lease) -> bool:
+        """Whether a Lease held by someone else has not been renewed for its duration"""
+        name, version = lease.metadata.name, lease.metadata.resource_version
+        now = self.clock()
+        observed = self._observed.get(name)
+        if observed is None or observed[0] != version:
+            self._observed[name] = (version, now)
+            return False
+        return now - observed[1] > (lease.spec.lease_duration_seconds or self.duration)
+    
+    def _lease(self, lease=None, transitions: int = 0):
+        """Build a Lease body held by this replica"""
+        now = datetime.now(timezone.utc)
+        metadata = lease.metadata if lease is not None else client.V1ObjectMeta(
+            name=self.lease_name,
+            namespace=self.namespace,
+            labels={self.GROUP_LABEL: Config.LEASE_NAME} if self.sharded else None
+        )
+        held = lease is not None and lease.spec.holder_identity == self.identity
+        return client.V1Lease(metadata=metadata, spec=client.V1LeaseSpec(
+            holder_identity=self.identity,
+            lease_duration_seconds=self.duration,
+            acquire_time=lease.spec.acquire_time if held else now,
+            renew_time=now,
+            lease_transitions=transitions
+        ))
+    
+    def _acquire_or_renew(self) -> bool:
+        """
+        Create, renew or take over this replica's Lease
+        
+        Returns:
+            True if this replica holds the Lease
+        """
+        lease = self.k8s_client.read_lease(self.lease_name, self.namespace)
+        try:
+            if lease is None:
+                self.k8s_client.create_lease(self.namespace, self._lease())
+            else:
+                holder = lease.spec.holder_identity
+                transitions = lease.spec.lease_transitions or 0
+                if holder != self.identity:
+                    if holder and not self._expired(lease):
+                        return False
+                    logger.info(f"{YELLOW}Taking over Lease {self.lease_name} from {holder or 'nobody'}{RESET}")
+                    transitions += 1
+                self.k8s_client.replace_lease(self.lease_name, self.namespace, self._lease(lease, transitions))
+        except ApiException as e:
+            if e.status == 409:
+                # Another replica wrote the Lease first
+                return False
+            raise
+        self._renewed_at = self.clock()
+        return True
+    
+    def _live_members(self) -> List[str]:
+        """Holders of the group's Leases that are still being renewed"""
+        members = {self.identity}
+        for lease in self.k8s_client.list_leases(self.namespace, f"{self.GROUP_LABEL}={Config.LEASE_NAME}"):
+            holder = lease.spec.holder_identity
+            if not holder or holder == self.identity:
+                continue
+            if self._expired(lease):
+                logger.info(f"{YELLOW}Shard {holder} stopped renewing its Lease, removing it{RESET}")
+                self.k8s_client.delete_lease(lease.metadata.name, self.namespace)
+                self._observed.pop(lease.metadata.name, None)
+                continue
+            members.add(holder)
+        return sorted(members)
+    
+    def step(self) -> bool:
+        """
+        Run one renewal round
+        
+        Returns:
+            True if leadership or shard membership changed
+        """
+        was_active, members = self.is_active(), self.ring.members
+        try:
+            self.leading = self._acquire_or_renew()
+            if self.sharded and self.leading:
+                live = self._live_members()
+                if live != self.ring.members:
+                    self.ring = HashRing(live)
+        except Exception as e:
+            logger.warning(f"Lease renewal failed: {e}")
+        
+        changed = self.is_active() != was_active or self.ring.members != members
+        if changed:
+            logger.info(f"{GREEN}Replica coordination changed: {self.status()}{RESET}")
+            if self.on_change:
+                self.on_change()
+        return changed
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.step()
+            self._stop_event.wait(Config.LEASE_RENEW_SECONDS)
+    
+    def start(self):
+        """Acquire once, then keep renewing in a daemon thread"""
+        self.step()
+        self._thread = threading.Thread(target=self._run, name="lease-renewer", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop renewing and give the Lease up so another replica can take over at once"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=Config.LEASE_RENEW_SECONDS + 5)
+        if not self.leading:
+            return
+        self.leading = False
+        try:
+            if self.sharded:
+                self.k8s_client.delete_lease(self.lease_name, self.namespace)
+            else:
+                lease = self.k8s_client.read_lease(self.lease_name, self.namespace)
+                if lease is not None and lease.spec.holder_identity == self.identity:
+                    lease.spec.holder_identity = None
+                    self.k8s_client.replace_lease(self.lease_name, self.namespace, lease)
+            logger.info(f"Released Lease {self.lease_name}")
+        except Exception as e:
+            logger.warning(f"Failed to release Lease {self.lease_name}: {e}")
+
+
+# ============================================================================
+# DATABASE CLIENT
+# ============================================================================
+
+# application_name of pooled connections: the drift trigger ignores their own DDL
+APPLICATION_NAME = "postgres-user-controller"
+
+# Comment set on the users the controller creates: whichever replica owns a
+# user can tell it from a hand-made role without its own previous state
+MANAGED_ROLE_COMMENT = "managed by postgres-user-controller"
+
+# Commands reported by the drift trigger. Roles and databases are shared
+# objects, for which PostgreSQL fires no event triggers: CREATE/ALTER/DROP
+# ROLE and role membership grants are only noticed by the next cycle.
+DRIFT_TRIGGER_TAGS = ("GRANT", "REVOKE", "CREATE TABLE", "CREATE TABLE AS", "SELECT INTO", "CREATE SCHEMA")
+DRIFT_TRIGGER_NAME = "postgres_controller_drift"
+# Statements longer than this are reported as truncated (NOTIFY payloads are limited to 8000 bytes)
+DRIFT_QUERY_CHARS = 1900
+DRIFT_TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION public.postgres_controller_notify_drift() RETURNS event_trigger
+    LANGUAGE plpgsql AS $body$
+    DECLARE
+        command record;
+    BEGIN
+        IF current_setting('application_name') = {application} THEN
+            RETURN;
+        END IF;
+        FOR command IN SELECT * FROM pg_event_trigger_ddl_commands() LOOP
+            -- GRANT and REVOKE have no object identity: report the statement instead
+            PERFORM pg_notify({channel}, json_build_object(
+                'tag', command.command_tag,
+                'object', command.object_identity,
+                'query', CASE WHEN command.object_identity IS NULL THEN left(current_query(), {chars}) END,
+                'truncated', command.object_identity IS NULL AND length(current_query()) > {chars}
+            )::text);
+        END LOOP;
+    END
+    $body$;
+"""
+DRIFT_TRIGGER = """
+    DO $do$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = {name}) THEN
+            CREATE EVENT TRIGGER {trigger} ON ddl_command_end WHEN TAG IN ({tags})
+                EXECUTE FUNCTION public.postgres_controller_notify_drift();
+        END IF;
+    END
+    $do$;
+"""
+
+
+def group_by_role_set(by_user: Dict[str, Set[str]]) -> Dict[frozenset, List[str]]:
+    """Group usernames by identical, non-empty role sets"""
+    groups: Dict[frozenset, List[str]] = {}
+    for username, roles in by_user.items():
+        if roles:
+            groups.setdefault(frozenset(roles), []).append(username)
+    return groups
+
+
+class StatementBuilder:
+    """
+    DDL of user operations as psycopg2 sql.Composed statements
+    
+    Shared by the threaded and the asyncio database clients, which provide
+    the database and admin user the statements refer to.
+    """
+    
+    dbname: str
+    admin_user: str
+    
+    def _privilege_statements(self, user_spec: UserSpec) -> List[sql.Composed]:
+        """Build GRANT statements for a user's additional privileges"""
+        return [
+            sql.SQL("GRANT {} ON {} TO {};").format(
+                self._privilege_list(bits), self._privilege_target(target), sql.Identifier(user_spec.username))
+            for target, bits in desired_privileges(user_spec, include_connect=False).items()
+            if bits
+        ]
+    
+    @staticmethod
+    def _privilege_list(bits: int) -> sql.Composed:
+        """Comma-separated privilege keywords of a bitmap"""
+        return sql.SQL(", ").join(sql.SQL(name) for name in privilege_names(bits))
+    
+    @staticmethod
+    def _privilege_target(target: PrivilegeTarget) -> sql.Composed:
+        """Object clause of a GRANT or REVOKE, e.g. TABLE "public"."orders" """
+        return sql.SQL(target[0].upper() + " {}").format(sql.Identifier(*privilege_target_parts(target)))
+    
+    def _coalesced_privilege_statements(self, operations: List[UserOperation]) -> List[sql.Composed]:
+        """
+        Coalesce per-user privilege changes into multi-privilege, multi-user statements
+        
+        Users needing the same privileges on the same object share one
+        statement; revocations come first.
+        
+        Args:
+            operations: privileges operations
+        """
+        revokes: Dict[Tuple[PrivilegeTarget, int], List[str]] = {}
+        grants: Dict[Tuple[PrivilegeTarget, int], List[str]] = {}
+        for op in operations:
+            for target, (grant_bits, revoke_bits) in op.privilege_changes.items():
+                if revoke_bits:
+                    revokes.setdefault((target, revoke_bits), []).append(op.username)
+                if grant_bits:
+                    grants.setdefault((target, grant_bits), []).append(op.username)
+        return [
+            sql.SQL(template).format(self._privilege_list(bits), self._privilege_target(target),
+                                     self._identifiers(usernames))
+            for template, changes in (("REVOKE {} ON {} FROM {};", revokes), ("GRANT {} ON {} TO {};", grants))
+            for (target, bits), usernames in changes.items()
+        ]
+    
+    @staticmethod
+    def _identifiers(names) -> sql.Composed:
+        """Comma-separated, sorted identifier list"""
+        return sql.SQL(", ").join(sql.Identifier(name) for name in sorted(names))
+    
+    def _coalesced_role_statements(self, template: str, by_user: Dict[str, Set[str]]) -> List[sql.Composed]:
+        """
+        Coalesce per-user role changes into multi-role, multi-user statements
+        
+        Users sharing the exact same role set are combined, e.g.
+        GRANT a, b TO u1, u2 instead of four single GRANTs.
+        
+        Args:
+            template: Statement with two placeholders (roles, users)
+            by_user: Mapping of username to roles to grant or revoke
+        """
+        return [
+            sql.SQL(template).format(self._identifiers(roles), self._identifiers(usernames))
+            for roles, usernames in group_by_role_set(by_user).items()
+        ]
+    
+    @staticmethod
+    def _managed_comment_statement(username: str) -> sql.Composed:
+        """COMMENT ON ROLE marking a user as created by the controller (one %s parameter)"""
+        return sql.SQL("COMMENT ON ROLE {} IS %s;").format(sql.Identifier(username))
+    
+    def _drop_owned_statements(self, usernames: List[str]) -> List[sql.Composed]:
+        """REASSIGN OWNED to the admin user and DROP OWNED, for the current database"""
+        users = self._identifiers(usernames)
+        return [
+            sql.SQL("REASSIGN OWNED BY {} TO {};").format(users, sql.Identifier(self.admin_user)),
+            sql.SQL("DROP OWNED BY {};").format(users),
+        ]
+    
+    def _create_role_statement(self, role_name: str, member_of: Optional[Set[str]]) -> sql.Composed:
+        """CREATE ROLE for a group role, joining its parent roles in the same statement"""
+        if member_of:
+            return sql.SQL("CREATE ROLE {} NOLOGIN IN ROLE {};").format(
+                sql.Identifier(role_name), self._identifiers(member_of))
+        return sql.SQL("CREATE ROLE {} NOLOGIN;").format(sql.Identifier(role_name))
+    
+    def _batch_statements(self, kind: str, operations: List[UserOperation]) -> List[Tuple[sql.Composed, Optional[tuple]]]:
+        """
+        Build the statements for a batch of operations of the same kind
+        
+        Args:
+            kind: Operation kind shared by all operations
+            operations: Operations in the batch
+            
+        Returns:
+            List of (statement, parameters) tuples
+        """
+        usernames = [op.username for op in operations]
+        statements: List[Tuple[sql.Composed, Optional[tuple]]] = []
+        
+        if kind == "create_role":
+            # Operations come parents first, so every IN ROLE target already exists
+            for op in operations:
+                statements.append((self._create_role_statement(op.username, op.grant), None))
+        
+        elif kind in ("drop", "drop_role"):
+            users = self._identifiers(usernames)
+            statements.append((sql.SQL("REVOKE ALL PRIVILEGES ON DATABASE {} FROM {};").format(
+                sql.Identifier(self.dbname), users), None))
+            statements.extend((statement, None) for statement in self._drop_owned_statements(usernames))
+            statements.append((sql.SQL("DROP ROLE IF EXISTS {};" if kind == "drop_role"
+                                       else "DROP USER IF EXISTS {};").format(users), None))
+        
+        elif kind == "create":
+            by_database: Dict[str, List[str]] = {}
+            for op in operations:
+                statements.append((sql.SQL("CREATE USER {} WITH PASSWORD %s;").format(
+                    sql.Identifier(op.username)), (op.password,)))
+                statements.append((self._managed_comment_statement(op.username), (MANAGED_ROLE_COMMENT,)))
+                by_database.setdefault(op.spec.database, []).append(op.username)
+            for database, members in by_database.items():
+                statements.append((sql.SQL("GRANT CONNECT ON DATABASE {} TO {};").format(
+                    sql.Identifier(database), self._identifiers(members)), None))
+            for statement in self._coalesced_role_statements(
+                    "GRANT {} TO {};", {op.username: set(op.spec.roles) for op in operations}):
+                statements.append((statement, None))
+            for op in operations:
+                statements.extend((statement, None) for statement in self._privilege_statements(op.spec))
+        
+        elif kind == "password":
+            for op in operations:
+                statements.append((sql.SQL("ALTER ROLE {} WITH PASSWORD %s;").format(
+                    sql.Identifier(op.username)), (op.password,)))
+        
+        elif kind in ("update", "role_update"):
+            for statement in self._coalesced_role_statements(
+                    "REVOKE {} FROM {};", {op.username: op.revoke for op in operations}):
+                statements.append((statement, None))
+            for statement in self._coalesced_role_statements(
+                    "GRANT {} TO {};", {op.username: op.grant for op in operations}):
+                statements.append((statement, None))
+        
+        elif kind == "privileges":
+            statements.extend((statement, None) for statement in self._coalesced_privilege_statements(operations))
+        
+        else:
+            raise ValueError(f"Unknown operation kind: {kind}")
+        
+        return statements
+
+
+class DatabaseClient(StatementBuilder):
+    """Handles all PostgreSQL database interactions"""
+    
+    target: Optional[ClusterTarget] = None
+    # Client of the maintenance database, on clients of the users' other databases
+    parent: Optional["DatabaseClient"] = None
+    # Attached by the controller to record DDL and pool wait latency
+    metrics: Optional[Metrics] = None
+    # Set when several replicas may apply DDL (leader election or sharding)
+    advisory_locks = False
+    # First key of the two-key advisory locks taken per user or role name
+    ADVISORY_LOCK_NAMESPACE = 0x75736572
+    # Checkout probe: a replica is in recovery, and a promoted member is
+    # another address or a restarted postmaster
+    PRIMARY_PROBE = "SELECT pg_is_in_recovery(), inet_server_addr()::text, pg_postmaster_start_time()::text;"
+    
+    def __init__(self, target: Optional[ClusterTarget] = None, parent: Optional["DatabaseClient"] = None):
+        """
+        Args:
+            target: Cluster to connect to (default: the global DB_* settings)
+            parent: Client of the maintenance database, for a client of another database
+        """
+        self.target = target
+        self.parent = parent
+        self.connection_pool = None
+        if parent is not None:
+            # Same server: share its breaker, metrics and locking mode
+            self.retrier = parent.retrier
+            self.metrics = parent.metrics
+            self.advisory_locks = parent.advisory_locks
+        else:
+            self.retrier = Retrier(owner=self)
+        # Clients of the other databases, by name
+        self.databases: Dict[str, "DatabaseClient"] = {}
+        self._databases_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        # The small pools of other databases are shared by parallel batches:
+        # callers wait for a free connection instead of failing with PoolError
+        self._slots = threading.BoundedSemaphore(Config.DATABASE_POOL_MAX_CONN) if parent is not None else None
+        # Identity of the primary seen by the last validated checkout
+        self._primary: Optional[Tuple[str, str]] = None
+        # Monotonic time the current failover was detected, until recovery
+        self._failover_started: Optional[float] = None
+        self._initialize_pool()
+    
+    def connection_params(self) -> dict:
+        """Connection parameters of the target cluster"""
+        return (self.target or ClusterTarget("default", Config.DB_HOST)).connection_params()
+    
+    @property
+    def endpoint(self) -> str:
+        """Circuit breaker key of the target cluster"""
+        params = self.connection_params()
+        return f"postgres/{params['host']}:{params['port']}"
+    
+    @property
+    def dbname(self) -> str:
+        """Maintenance database of the target cluster"""
+        return self.connection_params()["dbname"]
+    
+    @property
+    def admin_user(self) -> str:
+        """Admin role that receives reassigned objects"""
+        return self.connection_params()["user"]
+    
+    def _initialize_pool(self):
+        """Initialize connection pool, retrying transient errors"""
+        try:
+            self.retrier.call(self.endpoint, self._ensure_pool)
+        except (psycopg2.Error, CircuitOpenError) as e:
+            raise RuntimeError(f"Failed to initialize database connection pool: {e}") from e
+        logger.info("Database connection pool initialized successfully")
+    
+    def _ensure_pool(self):
+        """Create the pool unless there is one, and return it"""
+        with self._pool_lock:
+            if self.connection_pool is None:
+                params = self.connection_params()
+                if Config.DB_TARGET_SESSION_ATTRS:
+                    # libpq skips hosts that are not the primary when connecting
+                    params["target_session_attrs"] = Config.DB_TARGET_SESSION_ATTRS
+                # Thread-safe pool: batches may run on parallel workers
+                self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                    0 if self.parent else Config.DB_POOL_MIN_CONN,
+                    Config.DATABASE_POOL_MAX_CONN if self.parent else Config.DB_POOL_MAX_CONN,
+                    connect_timeout=10,
+                    application_name=APPLICATION_NAME,
+                    **params
+                )
+            return self.connection_pool
+    
+    def for_database(self, dbname: str) -> "DatabaseClient":
+        """
+        Client of another database on the same server, with its own small pool
+        
+        Clients are created on first use and kept for the controller's
+        lifetime; the maintenance database returns this client.
+        
+        Args:
+            dbname: Database name
+        """
+        if dbname == self.dbname:
+            return self
+        with self._databases_lock:
+            client = self.databases.get(dbname)
+            if client is None:
+                target = replace(self.target or ClusterTarget("default", Config.DB_HOST), dbname=dbname)
+                client = self.databases[dbname] = DatabaseClient(target, parent=self)
+            return client
+    
+    def map_databases(self, func, items: Dict[str, object]) -> Dict[str, object]:
+        """
+        Run func(client, item) against the client of each database, concurrently
+        
+        Args:
+            func: Function of a DatabaseClient and the database's item
+            items: Item per database name
+            
+        Returns:
+            Result per database name; the first failure is raised once all finished
+        """
+        if len(items) <= 1 or Config.DATABASE_WORKERS <= 1:
+            return {dbname: func(self.for_database(dbname), item) for dbname, item in items.items()}
+        with ThreadPoolExecutor(max_workers=min(Config.DATABASE_WORKERS, len(items)),
+                                thread_name_prefix="database") as executor:
+            futures = {
+                dbname: executor.submit(lambda dbname, item: func(self.for_database(dbname), item), dbname, item)
+                for dbname, item in items.items()
+            }
+            return {dbname: future.result() for dbname, future in futures.items()}
+    
+    def invalidate_pool(self, reason: str, stale=None):
+        """
+        Close every connection of the pool and rebuild it
+        
+        Called when a checkout finds the primary gone, demoted or replaced, so
+        that no other pooled connection to the old primary is handed out.
+        Connections checked out by other threads are closed as well; they
+        are discarded when returned.
+        
+        Args:
+            reason: Why the pool is discarded (logged)
+            stale: Pool found to be bad; nothing is done if it was already replaced
+        """
+        with self._pool_lock:
+            if stale is not None and self.connection_pool is not stale:
+                return
+            old, self.connection_pool = self.connection_pool, None
+            self._primary = None
+            if self._failover_started is None:
+                self._failover_started = time.monotonic()
+            if self.metrics:
+                self.metrics.pool_invalidations_count += 1
+        logger.warning(f"Invalidating connection pool of {self.endpoint}: {reason}")
+        if old is not None:
+            old.closeall()
+        try:
+            self._ensure_pool()
+        except psycopg2.Error as e:
+            # No primary yet: the next checkout retries with backoff
+            logger.warning(f"Connection pool of {self.endpoint} not rebuilt yet: {e}")
+    
+    def _probe_primary(self, conn) -> Tuple[bool, Tuple[str, str]]:
+        """Run the primary probe outside of a transaction; returns (in recovery, server identity)"""
+        autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(self.PRIMARY_PROBE)
+                in_recovery, address, started = cur.fetchone()
+        finally:
+            conn.autocommit = autocommit
+        return in_recovery, (address, started)
+    
+    def _checkout(self):
+        """
+        Take a connection from the pool and check that it reaches the primary
+        
+        A broken connection, a server in recovery or another primary than the
+        last checkout saw means Patroni failed over: the pool is invalidated
+        and the error raised for the retrier, or, when the connection already
+        reaches the new primary, a connection of the rebuilt pool is returned.
+        """
+        connection_pool = self._ensure_pool()
+        conn = connection_pool.getconn()
+        if not Config.DB_VALIDATE_ON_CHECKOUT:
+            return conn
+        try:
+            in_recovery, primary = self._probe_primary(conn)
+        except psycopg2.Error as e:
+            self.invalidate_pool(f"connection check failed: {e}".strip(), stale=connection_pool)
+            raise
+        if in_recovery:
+            self.invalidate_pool("server is in recovery", stale=connection_pool)
+            raise psycopg2.OperationalError(f"{self.endpoint} is in recovery, waiting for a new primary")
+        
+        with self._pool_lock:
+            previous = self._primary
+            if previous is None or previous == primary:
+                self._primary = primary
+                started, self._failover_started = self._failover_started, None
+        if previous is not None and previous != primary:
+            self.invalidate_pool(f"primary changed from {previous[0]} to {primary[0]}", stale=connection_pool)
+            return self._checkout()
+        
+        if started is not None:
+            recovered = time.monotonic() - started
+            if self.metrics:
+                self.metrics.observe("postgres_controller_failover_recovery_seconds", recovered)
+            logger.info(f"Reconnected to the primary of {self.endpoint} at {primary[0]} after {recovered:.2f}s")
+        return conn
+    
+    def get_connection(self):
+        """Get a connection to the primary from the pool (retried and circuit-broken)"""
+        with observe_duration(self.metrics, "postgres_controller_db_pool_wait_seconds"):
+            if self._slots is not None:
+                self._slots.acquire()
+            try:
+                return self.retrier.call(self.endpoint, self._checkout)
+            except BaseException:
+                if self._slots is not None:
+                    self._slots.release()
+                raise
+    
+    def return_connection(self, conn):
+        """
+        Return a connection to the pool (connections of an invalidated pool are closed)
+        
+        Role operations run in autocommit mode; the pool keeps connections as
+        they are returned, so the next borrower would otherwise get one that
+        commits every statement of its batch on its own.
+        """
+        try:
+            if conn.autocommit and not conn.closed:
+                conn.autocommit = False
+            connection_pool = self.connection_pool
+            if connection_pool:
+                try:
+                    connection_pool.putconn(conn)
+                    return
+                except pool.PoolError:
+                    pass
+            conn.close()
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+    
+    def fetch_existing_users(self) -> Set[str]:
+        """
+        Fetch all non-system users from the database
+        
+        Returns:
+            Set of usernames currently in the database
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                # Exclude system roles
+                system_roles_list = ",".join([f"'{role}'" for role in Config.SYSTEM_ROLES])
+                cur.execute(f"SELECT rolname FROM pg_roles WHERE rolname NOT IN ({system_roles_list});")
+                return {r[0] for r in cur.fetchall()}
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching existing users: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_existing_roles(self) -> Set[str]:
+        """
+        Fetch all custom roles from the database (excluding system roles and users)
+        
+        Returns:
+            Set of role names
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                system_roles_list = ",".join([f"'{role}'" for role in Config.SYSTEM_ROLES])
+                # Get roles that can't login (roles vs users)
+                cur.execute(f"""
+                    SELECT rolname FROM pg_roles 
+                    WHERE rolname NOT IN ({system_roles_list})
+                    AND NOT rolcanlogin;
+                """)
+                return {r[0] for r in cur.fetchall()}
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching existing roles: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_catalog_snapshot(self, usernames: Optional[Set[str]] = None) -> CatalogSnapshot:
+        """
+        Load roles, login flags, memberships, CONNECT grants and verifiers in one round trip
+        
+        Args:
+            usernames: If given, only these login roles are loaded (group roles always are)
+            
+        Returns:
+            CatalogSnapshot of all non-system roles
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT r.rolname,
+                           r.rolcanlogin,
+                           ARRAY(
+                               SELECT g.rolname
+                               FROM pg_auth_members m
+                               JOIN pg_roles g ON g.oid = m.roleid
+                               WHERE m.member = r.oid
+                           ),
+                           ARRAY(
+                               SELECT d.datname
+                               FROM pg_database d, aclexplode(d.datacl) a
+                               WHERE a.grantee = r.oid AND a.privilege_type = 'CONNECT'
+                           ),
+                           r.rolpassword,
+                           coalesce(shobj_description(r.oid, 'pg_authid') = %s, false)
+                    FROM pg_authid r
+                    WHERE r.rolname NOT IN %s
+                      AND (%s OR NOT r.rolcanlogin OR r.rolname = ANY(%s));
+                """, (MANAGED_ROLE_COMMENT, tuple(Config.SYSTEM_ROLES), usernames is None, sorted(usernames or ())))
+                rows = cur.fetchall()
+            
+            roles, memberships, connect_grants, verifiers, managed = {}, {}, {}, {}, set()
+            for rolname, can_login, member_of, databases, verifier, is_managed in rows:
+                roles[rolname] = can_login
+                if member_of:
+                    memberships[rolname] = set(member_of)
+                if databases:
+                    connect_grants[rolname] = set(databases)
+                if verifier:
+                    verifiers[rolname] = verifier
+                if is_managed:
+                    managed.add(rolname)
+            return CatalogSnapshot(roles, memberships, connect_grants, taken_at=datetime.now(), verifiers=verifiers,
+                                   managed=managed)
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching catalog snapshot: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_catalog_digest(self, databases: Iterable[str] = ()) -> str:
+        """
+        Compute a server-side digest of roles, memberships and object ACLs
+        
+        Cheap compared to a full snapshot: only a single md5 string crosses
+        the wire per database. Schemas and tables live in each database's own
+        catalog, so the other databases are digested through their own pools.
+        
+        Args:
+            databases: Databases of the desired users; the maintenance database is always digested
+            
+        Returns:
+            Hex digest that changes whenever role state changes
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT md5(concat_ws('|',
+                        (SELECT string_agg(oid::text || ':' || rolname || ':' || rolcanlogin::text
+                                           || ':' || coalesce(rolpassword, ''), ',' ORDER BY oid)
+                         FROM pg_authid),
+                        (SELECT string_agg(roleid::text || '>' || member::text, ',' ORDER BY roleid, member)
+                         FROM pg_auth_members),
+                        (SELECT string_agg(oid::text || '=' || coalesce(datacl::text, ''), ',' ORDER BY oid)
+                         FROM pg_database),
+                    """ + self.OBJECT_ACL_DIGEST + """
+                    ));
+                """)
+                digest = cur.fetchone()[0]
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching catalog digest: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+        
+        others = sorted(set(databases) - {self.dbname})
+        if not others:
+            return digest
+        acl_digests = self.map_databases(lambda client, _: client.fetch_object_acl_digest(),
+                                         {dbname: None for dbname in others})
+        per_database = ",".join(f"{dbname}={acl_digests[dbname]}" for dbname in others)
+        return hashlib.md5(f"{digest}|{per_database}".encode()).hexdigest()
+    
+    # Schema and table ACLs of the connected database
+    OBJECT_ACL_DIGEST = """
+                        (SELECT string_agg(oid::text || '=' || coalesce(nspacl::text, ''), ',' ORDER BY oid)
+                         FROM pg_namespace),
+                        (SELECT string_agg(oid::text || '=' || coalesce(relacl::text, ''), ',' ORDER BY oid)
+                         FROM pg_class
+                         WHERE relkind IN ('r', 'p', 'v', 'm', 'f') AND relpersistence <> 't')"""
+    
+    def fetch_object_acl_digest(self) -> str:
+        """
+        Digest the schema and table ACLs of this client's database
+        
+        Returns:
+            Hex digest that changes whenever a schema or table ACL changes
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("SELECT md5(concat_ws('|'," + self.OBJECT_ACL_DIGEST + "));")
+                return cur.fetchone()[0]
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching object ACL digest of {self.dbname}: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_privilege_index(self, targets: Set[PrivilegeTarget]) -> PrivilegeIndex:
+        """
+        Load the ACLs of the managed tables, schemas and databases in one round trip
+        
+        The aclitem arrays are parsed client-side, instead of asking
+        has_table_privilege() once per object and user.
+        
+        Args:
+            targets: Objects referenced by the desired privileges
+            
+        Returns:
+            PrivilegeIndex of the objects that exist
+        """
+        tables = sorted(name for kind, name in targets if kind == "table")
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT 'table', ref.name, c.relacl::text[]
+                    FROM unnest(%(tables)s::text[], %(regclasses)s::text[]) AS ref(name, regclass)
+                    JOIN pg_class c ON c.oid = to_regclass(ref.regclass)
+                    UNION ALL
+                    SELECT 'schema', n.nspname::text, n.nspacl::text[]
+                    FROM pg_namespace n
+                    WHERE n.nspname = ANY(%(schemas)s::text[])
+                    UNION ALL
+                    SELECT 'database', d.datname::text, d.datacl::text[]
+                    FROM pg_database d
+                    WHERE d.datname = ANY(%(databases)s::text[]);
+                """, {
+                    "tables": tables,
+                    "regclasses": [".".join(quote_ident(part) for part in privilege_target_parts(("table", name)))
+                                   for name in tables],
+                    "schemas": sorted(name for kind, name in targets if kind == "schema"),
+                    "databases": sorted(name for kind, name in targets if kind == "database"),
+                })
+                rows = cur.fetchall()
+            return PrivilegeIndex({(kind, name): acl for kind, name, acl in rows})
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching object privileges: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_user_roles(self, username: str) -> Set[str]:
+        """
+        Fetch all roles granted to a specific user
+        
+        Args:
+            username: The username to query
+            
+        Returns:
+            Set of role names granted to the user
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                # Query role membership
+                cur.execute("""
+                    SELECT r.rolname
+                    FROM pg_roles r
+                    JOIN pg_auth_members m ON r.oid = m.roleid
+                    JOIN pg_roles u ON u.oid = m.member
+                    WHERE u.rolname = %s;
+                """, (username,))
+                return {r[0] for r in cur.fetchall()}
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching roles for user {username}: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def create_role(self, role_name: str, member_of: Optional[Set[str]] = None, dry_run: bool = False):
+        """
+        Create a new PostgreSQL role
+        
+        Args:
+            role_name: Name of the role to create
+            member_of: Roles the new role is made a member of (IN ROLE)
+            dry_run: If True, only log the action without executing
+        """
+        if dry_run:
+            in_roles = f" in {', '.join(sorted(member_of))}" if member_of else ""
+            logger.info(f"[DRY-RUN] Would create role: {role_name}{in_roles}")
+            return
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                # Use sql.Identifier to prevent SQL injection
+                cur.execute(self._create_role_statement(role_name, member_of))
+                logger.info(f"{WHITE}Created role: {role_name}{RESET}")
+        except psycopg2.Error as e:
+            logger.error(f"Error creating role {role_name}: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def install_drift_trigger(self, channel: str) -> bool:
+        """
+        Install the event trigger reporting privilege DDL of this database on a NOTIFY channel
+        
+        Idempotent; the trigger function is replaced so that a changed
+        channel takes effect. Needs superuser.
+        
+        Args:
+            channel: Channel to notify
+            
+        Returns:
+            True if the trigger is installed
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL(DRIFT_TRIGGER_FUNCTION).format(
+                    application=sql.Literal(APPLICATION_NAME),
+                    channel=sql.Literal(channel),
+                    chars=sql.Literal(DRIFT_QUERY_CHARS)
+                ))
+                cur.execute(sql.SQL(DRIFT_TRIGGER).format(
+                    name=sql.Literal(DRIFT_TRIGGER_NAME),
+                    trigger=sql.Identifier(DRIFT_TRIGGER_NAME),
+                    tags=sql.SQL(", ").join(sql.Literal(tag) for tag in DRIFT_TRIGGER_TAGS)
+                ))
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Could not install the drift trigger in {self.dbname}: {e}")
+            return False
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def listen(self, channel: str):
+        """
+        Open a dedicated, unpooled connection listening on a NOTIFY channel
+        
+        Args:
+            channel: Channel to listen on
+            
+        Returns:
+            psycopg2 connection in autocommit mode
+        """
+        params = self.connection_params()
+        if Config.DB_TARGET_SESSION_ATTRS:
+            # NOTIFY is not replicated: listen on the primary
+            params["target_session_attrs"] = Config.DB_TARGET_SESSION_ATTRS
+        conn = psycopg2.connect(connect_timeout=10, application_name=APPLICATION_NAME, **params)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("LISTEN {};").format(sql.Identifier(channel)))
+        return conn
+    
+    def drop_role(self, role_name: str, dry_run: bool = False):
+        """
+        Drop a PostgreSQL role
+        
+        Args:
+            role_name: Name of the role to drop
+            dry_run: If True, only log the action without executing
+        """
+        if dry_run:
+            logger.info(f"[DRY-RUN] Would drop role: {role_name}")
+            return
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                # Revoke from all users first
+                cur.execute(sql.SQL("DROP ROLE IF EXISTS {};").format(
+                    sql.Identifier(role_name)
+                ))
+                logger.info(f"{WHITE}Dropped role: {role_name}{RESET}")
+        except psycopg2.Error as e:
+            logger.error(f"Error dropping role {role_name}: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def create_user(self, user_spec: UserSpec, password: str, dry_run: bool = False):
+        """
+        Create a new PostgreSQL user with specified roles and privileges
+        
+        Used as the fallback of a failed create batch, which may have
+        committed its users before their grants in another database failed:
+        an existing user only gets those grants.
+        
+        Args:
+            user_spec: User specification
+            password: User password (will be masked in logs)
+            dry_run: If True, only log the action without executing
+        """
+        if dry_run:
+            logger.info(f"[DRY-RUN] Would create user: {user_spec.username} with roles {user_spec.roles}")
+            return
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                # The user exists if only its grants in another database failed in a batch
+                cur.execute("SELECT 1 FROM pg_roles WHERE rolname = %s;", (user_spec.username,))
+                if cur.fetchone() is not None:
+                    logger.info(f"User {user_spec.username} already exists, granting its remaining privileges")
+                else:
+                    # Create user
+                    cur.execute(
+                        sql.SQL("CREATE USER {} WITH PASSWORD %s;").format(
+                            sql.Identifier(user_spec.username)
+                        ),
+                        (password,)
+                    )
+                    cur.execute(self._managed_comment_statement(user_spec.username), (MANAGED_ROLE_COMMENT,))
+                    logger.info(f"{WHITE}Created user: {user_spec.username}{RESET}")
+                    
+                    # Grant database access
+                    cur.execute(
+                        sql.SQL("GRANT CONNECT ON DATABASE {} TO {};").format(
+                            sql.Identifier(user_spec.database),
+                            sql.Identifier(user_spec.username)
+                        )
+                    )
+                    
+                    # Grant roles
+                    for role in user_spec.roles:
+                        cur.execute(
+                            sql.SQL("GRANT {} TO {};").format(
+                                sql.Identifier(role),
+                                sql.Identifier(user_spec.username)
+                            )
+                        )
+                        logger.info(f"  ↳ Granted role {role} to {user_spec.username}")
+                    
+                    # Grant additional privileges if specified
+                    if user_spec.privileges and user_spec.database == self.dbname:
+                        self._grant_privileges(cur, user_spec)
+                
+                conn.commit()
+        except psycopg2.Error as e:
+            logger.error(f"Error creating user {user_spec.username}: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+        
+        # Objects of another database are only reachable through its own connection
+        operation = self._privileges_operation(user_spec)
+        if operation and user_spec.database != self.dbname:
+            self.for_database(user_spec.database).apply_batch("privileges", [operation])
+    
+    def update_user_roles(self, username: str, old_roles: Set[str], new_roles: Set[str], dry_run: bool = False):
+        """
+        Update user role memberships
+        
+        Args:
+            username: Username to update
+            old_roles: Current roles
+            new_roles: Desired roles
+            dry_run: If True, only log the action without executing
+        """
+        to_revoke = old_roles - new_roles
+        to_grant = new_roles - old_roles
+        
+        if not to_revoke and not to_grant:
+            return
+        
+        if dry_run:
+            if to_revoke:
+                logger.info(f"[DRY-RUN] Would revoke roles from {username}: {to_revoke}")
+            if to_grant:
+                logger.info(f"[DRY-RUN] Would grant roles to {username}: {to_grant}")
+            return
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                for role in to_revoke:
+                    cur.execute(
+                        sql.SQL("REVOKE {} FROM {};").format(
+                            sql.Identifier(role),
+                            sql.Identifier(username)
+                        )
+                    )
+                    logger.info(f"  ↳ Revoked role {role} from {username}")
+                
+                for role in to_grant:
+                    cur.execute(
                         sql.SQL("GRANT {} TO {};").format(
                             sql.Identifier(role),
-                            sql.Identifier(user_spec.username)
+                            sql.Identifier(username)
                         )
                     )
-                    logger.info(f"  ↳ Granted role {role} to {user_spec.username}")
+                    logger.info(f"  ↳ Granted role {role} to {username}")
+                
+                conn.commit()
+                logger.info(f"{WHITE}Updated roles for user: {username}{RESET}")
+        except psycopg2.Error as e:
+            logger.error(f"Error updating roles for user {username}: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def drop_user(self, username: str, dry_run: bool = False):
+        """
+        Drop a PostgreSQL user and clean up all dependencies
+        
+        Args:
+            username: Username to drop
+            dry_run: If True, only log the action without executing
+        """
+        if dry_run:
+            logger.info(f"[DRY-RUN] Would drop user: {username}")
+            return
+        
+        self.release_dependencies([username])
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                # Revoke all privileges
+                cur.execute(
+                    sql.SQL("REVOKE ALL PRIVILEGES ON DATABASE {} FROM {};").format(
+                        sql.Identifier(self.dbname),
+                        sql.Identifier(username)
+                    )
+                )
+                
+                # Reassign owned objects
+                cur.execute(
+                    sql.SQL("REASSIGN OWNED BY {} TO {};").format(
+                        sql.Identifier(username),
+                        sql.Identifier(self.admin_user)
+                    )
+                )
+                
+                # Drop owned objects
+                cur.execute(
+                    sql.SQL("DROP OWNED BY {};").format(
+                        sql.Identifier(username)
+                    )
+                )
+                
+                # Drop the user
+                cur.execute(
+                    sql.SQL("DROP USER IF EXISTS {};").format(
+                        sql.Identifier(username)
+                    )
+                )
+                
+                conn.commit()
+                logger.info(f"{WHITE}Dropped user: {username}{RESET}")
+        except psycopg2.Error as e:
+            logger.error(f"Error dropping user {username}: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_dependent_databases(self, usernames: List[str]) -> Dict[str, List[str]]:
+        """
+        Find the databases holding objects or privileges of roles, in one pg_shdepend query
+        
+        Dependencies on shared objects (databases, tablespaces) are left out:
+        REASSIGN OWNED and DROP OWNED in any database cover those.
+        
+        Args:
+            usernames: Role names
+            
+        Returns:
+            Sorted names of the dependent roles per database (databases that accept connections)
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT d.datname::text, array_agg(DISTINCT r.rolname::text ORDER BY r.rolname::text)
+                    FROM pg_shdepend s
+                    JOIN pg_database d ON d.oid = s.dbid
+                    JOIN pg_roles r ON r.oid = s.refobjid
+                    WHERE s.refclassid = 'pg_authid'::regclass
+                      AND r.rolname = ANY(%s)
+                      AND d.datallowconn
+                    GROUP BY d.datname;
+                """, (sorted(usernames),))
+                return {dbname: list(names) for dbname, names in cur.fetchall()}
+        except psycopg2.Error as e:
+            logger.error(f"Error fetching dependent databases: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def fetch_dependency_counts(self, usernames: List[str]) -> Dict[str, Dict[Optional[str], Tuple[int, int]]]:
+        """
+        Count the objects roles own and the privileges they hold, in one pg_shdepend query
+        
+        Args:
+            usernames: Role names
+            
+        Returns:
+            Per role and database (None for shared objects): (owned objects, privilege entries)
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT r.rolname::text, d.datname::text,
+                           count(*) FILTER (WHERE s.deptype = 'o'),
+                           count(*) FILTER (WHERE s.deptype <> 'o')
+                    FROM pg_shdepend s
+                    JOIN pg_roles r ON r.oid = s.refobjid
+                    LEFT JOIN pg_database d ON d.oid = s.dbid
+                    WHERE s.refclassid = 'pg_authid'::regclass
+                      AND r.rolname = ANY(%s)
+                    GROUP BY r.rolname, d.datname;
+                """, (sorted(usernames),))
+                counts: Dict[str, Dict[Optional[str], Tuple[int, int]]] = {}
+                for username, dbname, owned, privileges in cur.fetchall():
+                    counts.setdefault(username, {})[dbname] = (owned, privileges)
+                return counts
+        except psycopg2.Error as e:
+            logger.error(f"Error counting role dependencies: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def release_dependencies(self, usernames: List[str]) -> int:
+        """
+        Reassign and drop what roles own in the other databases, concurrently
+        
+        REASSIGN OWNED and DROP OWNED only act on the current database, so
+        DROP USER fails while a role owns objects or holds privileges in
+        another one. Those databases are worked on in parallel, each in one
+        transaction on its own pool.
+        
+        Args:
+            usernames: Roles about to be dropped
+            
+        Returns:
+            Number of statements executed
+        """
+        by_database = self.fetch_dependent_databases(usernames)
+        by_database.pop(self.dbname, None)
+        if not by_database:
+            return 0
+        logger.info(f"Dropping objects of {len(usernames)} roles in {len(by_database)} other databases")
+        return sum(self.map_databases(lambda client, names: client.drop_owned(names), by_database).values())
+    
+    def mark_managed(self, usernames: List[str]) -> int:
+        """
+        Mark existing users as created by the controller, in one transaction
+        
+        Users created before MANAGED_ROLE_COMMENT was set are otherwise only
+        known to the previous state of the replica that created them.
+        
+        Args:
+            usernames: Role names
+            
+        Returns:
+            Number of statements executed
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                for username in usernames:
+                    cur.execute(self._managed_comment_statement(username), (MANAGED_ROLE_COMMENT,))
+            conn.commit()
+            return len(usernames)
+        except psycopg2.Error as e:
+            logger.error(f"Error marking {len(usernames)} users as managed: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def drop_owned(self, usernames: List[str]) -> int:
+        """
+        Reassign the objects of roles to the admin user and drop their privileges, in this database
+        
+        Args:
+            usernames: Role names
+            
+        Returns:
+            Number of statements executed
+        """
+        statements = self._drop_owned_statements(usernames)
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                for statement in statements:
+                    with observe_duration(self.metrics, "postgres_controller_ddl_statement_duration_seconds",
+                                          "drop_owned"):
+                        cur.execute(statement)
+            conn.commit()
+            return len(statements)
+        except psycopg2.Error as e:
+            logger.error(f"Error dropping objects of {len(usernames)} roles in database {self.dbname}: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def _grant_privileges(self, cursor, user_spec: UserSpec):
+        """
+        Grant additional privileges to a user
+        
+        Args:
+            cursor: Database cursor
+            user_spec: User specification with privileges
+        """
+        for statement in self._privilege_statements(user_spec):
+            cursor.execute(statement)
+    
+    @staticmethod
+    def _privileges_operation(user_spec: UserSpec) -> Optional[UserOperation]:
+        """privileges operation granting a new user's additional privileges, if it has any"""
+        changes = {target: (bits, 0) for target, bits in desired_privileges(user_spec, include_connect=False).items()
+                   if bits}
+        return UserOperation("privileges", user_spec.username, spec=user_spec, privilege_changes=changes) \
+            if changes else None
+    
+    def _split_by_database(self, kind: str, operations: List[UserOperation]
+                           ) -> Tuple[List[UserOperation], Dict[str, List[UserOperation]]]:
+        """
+        Separate the object privileges that belong in other databases from a create or privileges batch
+        
+        Tables and schemas live in each user's own database, so their grants
+        go through that database's client. A creation keeps its CREATE USER,
+        CONNECT and role grants here and grants the rest there afterwards.
+        
+        Args:
+            kind: create or privileges
+            operations: Operations in the batch
+            
+        Returns:
+            (operations to apply here, privileges operations per other database)
+        """
+        local: List[UserOperation] = []
+        elsewhere: Dict[str, List[UserOperation]] = {}
+        for op in operations:
+            if op.spec is None or op.spec.database == self.dbname:
+                local.append(op)
+            elif kind == "privileges":
+                elsewhere.setdefault(op.spec.database, []).append(op)
+            else:
+                grants = self._privileges_operation(op.spec)
+                if grants:
+                    elsewhere.setdefault(op.spec.database, []).append(grants)
+                    op = replace(op, spec=op.spec.replace(privileges=None))
+                local.append(op)
+        return local, elsewhere
+    
+    def _lock_and_filter(self, cur, kind: str, operations: List[UserOperation]) -> List[UserOperation]:
+        """
+        Serialize with other replicas on the batch's names and skip work they already did
+        
+        Transaction-level advisory locks are taken in name order, so two
+        replicas applying overlapping batches cannot deadlock; once they are
+        held, creations of existing roles and drops of missing ones are removed.
+        
+        Args:
+            cur: Cursor of the batch transaction
+            kind: Operation kind shared by all operations
+            operations: Operations in the batch
+            
+        Returns:
+            Operations that still need to be applied
+        """
+        names = sorted({op.username for op in operations})
+        cur.execute("""
+            SELECT pg_advisory_xact_lock(%s, hashtext(name))
+            FROM (SELECT name FROM unnest(%s::text[]) AS name ORDER BY name) AS names;
+        """, (self.ADVISORY_LOCK_NAMESPACE, names))
+        if kind in ("password", "update", "role_update", "privileges"):
+            # ALTER ROLE, GRANT and REVOKE are idempotent
+            return operations
+        cur.execute("SELECT rolname FROM pg_roles WHERE rolname = ANY(%s);", (names,))
+        existing = {row[0] for row in cur.fetchall()}
+        remaining = [op for op in operations if (op.username in existing) == (kind in ("drop", "drop_role"))]
+        if len(remaining) < len(operations):
+            logger.info(f"Skipping {len(operations) - len(remaining)} {kind} operations already applied by another replica")
+        return remaining
+    
+    def apply_batch(self, kind: str, operations: List[UserOperation]) -> int:
+        """
+        Apply a batch of operations of the same kind in a single transaction
+        
+        Drops first release the roles' dependencies in other databases; object
+        privileges of users in other databases are applied there afterwards,
+        one transaction per database.
+        
+        Args:
+            kind: Operation kind shared by all operations
+            operations: Operations in the batch
+            
+        Returns:
+            Number of statements executed
+        """
+        executed = 0
+        elsewhere: Dict[str, List[UserOperation]] = {}
+        if kind in ("drop", "drop_role"):
+            executed += self.release_dependencies([op.username for op in operations])
+        elif kind in ("create", "privileges") and self.parent is None:
+            operations, elsewhere = self._split_by_database(kind, operations)
+        if operations:
+            executed += self._apply_transaction(kind, operations)
+        if elsewhere:
+            executed += sum(self.map_databases(
+                lambda client, ops: client.apply_batch("privileges", ops), elsewhere).values())
+        return executed
+    
+    def _apply_transaction(self, kind: str, operations: List[UserOperation]) -> int:
+        """Apply a batch of operations of the same kind in this database, in one transaction"""
+        statements = self._batch_statements(kind, operations)
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                if self.advisory_locks:
+                    remaining = self._lock_and_filter(cur, kind, operations)
+                    if len(remaining) < len(operations):
+                        statements = self._batch_statements(kind, remaining) if remaining else []
+                for statement, params in statements:
+                    with observe_duration(self.metrics, "postgres_controller_ddl_statement_duration_seconds", kind):
+                        cur.execute(statement, params)
+            conn.commit()
+            return len(statements)
+        except psycopg2.Error as e:
+            logger.error(f"Error applying {kind} batch of {len(operations)}: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def apply_operation(self, operation: UserOperation, dry_run: bool = False):
+        """
+        Apply a single operation in its own transaction
+        
+        Args:
+            operation: Operation to apply
+            dry_run: If True, only log the action without executing
+        """
+        if self.advisory_locks and not dry_run:
+            # Single-operation batch, so the fallback path is guarded too
+            self.apply_batch(operation.kind, [operation])
+            return
+        
+        if operation.kind == "create_role":
+            self.create_role(operation.username, member_of=operation.grant, dry_run=dry_run)
+        elif operation.kind == "drop":
+            self.drop_user(operation.username, dry_run=dry_run)
+        elif operation.kind == "drop_role":
+            if dry_run:
+                self.drop_role(operation.username, dry_run=True)
+            else:
+                # Owned objects and grants in other databases must go first, as for a user
+                self.apply_batch("drop_role", [operation])
+        elif operation.kind == "create":
+            self.create_user(operation.spec, operation.password, dry_run=dry_run)
+        elif operation.kind in ("update", "role_update"):
+            # Grant and revoke sets are disjoint, so they map directly onto old/new roles
+            self.update_user_roles(
+                operation.username,
+                set(operation.revoke),
+                set(operation.grant),
+                dry_run=dry_run
+            )
+        elif operation.kind == "password":
+            if dry_run:
+                logger.info(f"[DRY-RUN] Would rotate password of {operation.username}")
+            else:
+                self.apply_batch("password", [operation])
+        elif operation.kind == "privileges":
+            if dry_run:
+                for (kind, name), (grant_bits, revoke_bits) in sorted(operation.privilege_changes.items()):
+                    logger.info(f"[DRY-RUN] Would change privileges of {operation.username} on {kind} {name}: "
+                                f"grant {privilege_names(grant_bits)}, revoke {privilege_names(revoke_bits)}")
+            else:
+                self.apply_batch("privileges", [operation])
+        else:
+            raise ValueError(f"Unknown operation kind: {operation.kind}")
+    
+    def close(self):
+        """Close the connection pool and those of the other databases"""
+        for client in list(self.databases.values()):
+            client.close()
+        if self.connection_pool:
+            self.connection_pool.closeall()
+            logger.info(f"Database connection pool of {self.dbname} closed")
+
+
+# ============================================================================
+# DRIFT NOTIFICATIONS
+# ============================================================================
+
+# Identifiers of a statement: double-quoted (case kept) or bare (folded to lower case)
+SQL_IDENTIFIER = re.compile(r'"((?:[^"]|"")+)"|([A-Za-z_][A-Za-z0-9_$]*)')
+
+
+class DriftIndex:
+    """
+    Managed users a drift notification may concern
+    
+    Notifications name users (GRANT ... TO alice) or objects (CREATE TABLE
+    public.orders); both are matched by identifier against the desired state
+    of the last full cycle. Matching is loose on purpose: reconciling a user
+    needlessly only costs a few targeted catalog rows.
+    """
+    
+    def __init__(self, desired_users: Dict[str, UserSpec]):
+        self.users = desired_users
+        # Object name (last identifier part) -> users holding privileges on it
+        self.objects: Dict[str, Set[str]] = {}
+        self.databases: Set[str] = set()
+        for username, spec in desired_users.items():
+            self.databases.add(spec.database)
+            for key in spec.privileges or ():
+                name = privilege_target_parts(parse_privilege_target(key))[-1]
+                self.objects.setdefault(name, set()).add(username)
+    
+    def users_of(self, payload: str) -> Optional[Set[str]]:
+        """
+        Users named by a notification, directly or through an object they hold privileges on
+        
+        Args:
+            payload: JSON payload sent by the drift trigger
+            
+        Returns:
+            Affected managed users, or None if the change cannot be attributed
+            (unparseable or truncated payload)
+        """
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return None
+        if not isinstance(event, dict) or event.get("truncated"):
+            return None
+        text = " ".join(part for part in (event.get("object"), event.get("query")) if part)
+        users: Set[str] = set()
+        for quoted, bare in SQL_IDENTIFIER.findall(text):
+            name = quoted.replace('""', '"') if quoted else bare.lower()
+            if name in self.users:
+                users.add(name)
+            users.update(self.objects.get(name, ()))
+        return users
+
+
+class DriftListener:
+    """
+    Receives drift notifications on dedicated LISTEN connections, one per database
+    
+    The connections live outside the pools, so notifications are read while
+    every pooled connection is busy with DDL. A database listened to before
+    reports on_notify(database, None) when its connection is re-established,
+    since notifications sent in between are lost. A database that cannot be
+    reached backs off on its own; the others keep listening.
+    """
+    
+    def __init__(self, db_client: DatabaseClient, on_notify, channel: Optional[str] = None,
+                 clock=time.monotonic):
+        """
+        Args:
+            db_client: Client of the maintenance database
+            on_notify: Callback invoked as on_notify(database, payload)
+            channel: NOTIFY channel (default DRIFT_CHANNEL)
+            clock: Monotonic clock for reconnect backoff
+        """
+        self.db_client = db_client
+        self.on_notify = on_notify
+        self.channel = channel or Config.DRIFT_CHANNEL
+        self.clock = clock
+        self.databases: Set[str] = {db_client.dbname}
+        self._connections: Dict[str, object] = {}
+        self._listened: Set[str] = set()
+        # Databases whose trigger could not be installed are not listened to
+        self._skipped: Set[str] = set()
+        # Consecutive failures and next connection attempt per database
+        self._failures: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def watch(self, databases: Iterable[str]):
+        """Also listen in these databases, from the next poll on"""
+        with self._lock:
+            self.databases.update(databases)
+    
+    def connect(self, dbname: str) -> bool:
+        """
+        Install the trigger in a database and open its listening connection
+        
+        Returns:
+            False if the trigger could not be installed, so the database is skipped
+        """
+        client = self.db_client.for_database(dbname)
+        if not client.install_drift_trigger(self.channel):
+            logger.warning(f"{YELLOW}Not listening for drift notifications in {dbname}: no drift trigger{RESET}")
+            self._skipped.add(dbname)
+            return False
+        self._connections[dbname] = client.listen(self.channel)
+        logger.info(f"Listening for drift notifications in {dbname}")
+        self._failures.pop(dbname, None)
+        self._retry_at.pop(dbname, None)
+        if dbname in self._listened:
+            self.on_notify(dbname, None)
+        self._listened.add(dbname)
+        return True
+    
+    def _disconnect(self, dbname: str):
+        conn = self._connections.pop(dbname, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+    
+    def _failed(self, dbname: str, error: Exception):
+        """Drop a database's connection and back off before reconnecting it"""
+        self._disconnect(dbname)
+        failures = self._failures.get(dbname, 0) + 1
+        self._failures[dbname] = failures
+        delay = full_jitter(expo(failures, Config.RETRY_BACKOFF_BASE, max_value=30))
+        self._retry_at[dbname] = self.clock() + delay
+        logger.warning(f"Drift listener failed in {dbname} (attempt {failures}), "
+                       f"reconnecting in {delay:.1f}s: {error}")
+    
+    def close(self):
+        """Close all listening connections"""
+        for dbname in list(self._connections):
+            self._disconnect(dbname)
+    
+    def poll(self, timeout: float = 1.0) -> int:
+        """
+        Connect to new databases, wait for notifications and dispatch them
+        
+        Args:
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            Number of notifications dispatched
+        """
+        with self._lock:
+            missing = self.databases - set(self._connections) - self._skipped
+        now = self.clock()
+        for dbname in sorted(missing):
+            if self._retry_at.get(dbname, 0.0) > now:
+                continue
+            try:
+                self.connect(dbname)
+            except Exception as e:
+                self._failed(dbname, e)
+        if not self._connections:
+            self._stop_event.wait(timeout)
+            return 0
+        ready, _, _ = select.select(list(self._connections.values()), [], [], timeout)
+        dispatched = 0
+        for dbname, conn in list(self._connections.items()):
+            if conn not in ready:
+                continue
+            try:
+                conn.poll()
+            except Exception as e:
+                self._failed(dbname, e)
+                continue
+            while conn.notifies:
+                self.on_notify(dbname, conn.notifies.pop(0).payload)
+                dispatched += 1
+        return dispatched
+    
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self.poll()
+                except Exception as e:
+                    # Failures of single databases are handled by poll()
+                    logger.warning(f"Drift listener failed: {e}")
+                    self._stop_event.wait(1.0)
+        finally:
+            self.close()
+    
+    def start(self):
+        """Start listening in a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name="drift-listener", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the listen loop (within a poll timeout)"""
+        self._stop_event.set()
+
+
+# ============================================================================
+# PLAN EXECUTOR
+# ============================================================================
+
+@dataclass
+class OperationCost:
+    """Estimated cost of one planned operation"""
+    statements: int = 1
+    # Role memberships and object privileges granted or revoked
+    grants: int = 0
+    # Objects reassigned and privilege entries dropped before a drop (pg_shdepend)
+    owned_objects: int = 0
+    privilege_entries: int = 0
+    # Databases other than the maintenance database the operation works in
+    databases: List[str] = field(default_factory=list)
+    # Roles and objects locked until the transaction commits
+    locks: int = 1
+    estimated_seconds: float = 0.0
+
+
+class ReconcilePlan:
+    """
+    Ordered, batched operations of a cycle with their estimated costs
+    
+    Built once per cycle by PlanExecutor.plan(): a dry run reports it and a
+    live run executes the very same batches. Iterating yields the operations
+    in execution order.
+    """
+    
+    def __init__(self, batches: List[Tuple[str, List[UserOperation]]],
+                 costs: Optional[Dict[Tuple[str, str], OperationCost]] = None):
+        """
+        Args:
+            batches: (kind, operations) per batch, in execution order
+            costs: Estimated cost per (kind, username)
+        """
+        self.batches = batches
+        self.costs = costs or {}
+    
+    def __iter__(self) -> Iterator[UserOperation]:
+        return (op for _, ops in self.batches for op in ops)
+    
+    def __len__(self) -> int:
+        return sum(len(ops) for _, ops in self.batches)
+    
+    def phases(self) -> List[Tuple[str, List[List[UserOperation]]]]:
+        """Consecutive batches of the same kind"""
+        phases: List[Tuple[str, List[List[UserOperation]]]] = []
+        for kind, ops in self.batches:
+            if not phases or phases[-1][0] != kind:
+                phases.append((kind, []))
+            phases[-1][1].append(ops)
+        return phases
+    
+    def cost_of(self, op: UserOperation) -> OperationCost:
+        """Estimated cost of a planned operation"""
+        return self.costs.get((op.kind, op.username)) or OperationCost()
+    
+    @staticmethod
+    def _details(op: UserOperation) -> dict:
+        """What an operation changes (never its password)"""
+        if op.kind == "create":
+            return {"database": op.spec.database, "roles": sorted(op.spec.roles)}
+        if op.kind in ("update", "role_update"):
+            return {"grant": sorted(op.grant), "revoke": sorted(op.revoke)}
+        if op.kind == "create_role" and op.grant:
+            return {"member_of": sorted(op.grant)}
+        if op.kind == "privileges":
+            return {"changes": [
+                {"object": f"{kind} {name}", "grant": privilege_names(grant_bits),
+                 "revoke": privilege_names(revoke_bits)}
+                for (kind, name), (grant_bits, revoke_bits) in sorted(op.privilege_changes.items())
+            ]}
+        return {}
+    
+    def totals(self) -> dict:
+        """Summed estimates of the whole plan"""
+        costs = [self.cost_of(op) for op in self]
+        return {
+            "operations": len(costs),
+            "batches": len(self.batches),
+            "statements": sum(cost.statements for cost in costs),
+            "grants": sum(cost.grants for cost in costs),
+            "owned_objects": sum(cost.owned_objects for cost in costs),
+            "privilege_entries": sum(cost.privilege_entries for cost in costs),
+            "locks": sum(cost.locks for cost in costs),
+            "estimated_seconds": round(sum(cost.estimated_seconds for cost in costs), 6),
+        }
+    
+    def to_dict(self) -> dict:
+        """Machine-readable plan: every operation in order with its cost, per-batch sums and totals"""
+        operations, batches = [], []
+        for index, (kind, ops) in enumerate(self.batches):
+            costs = [self.cost_of(op) for op in ops]
+            batches.append({
+                "batch": index,
+                "kind": kind,
+                "operations": len(ops),
+                "statements": sum(cost.statements for cost in costs),
+                # Locks are held until the batch commits
+                "locks": sum(cost.locks for cost in costs),
+                "estimated_seconds": round(sum(cost.estimated_seconds for cost in costs), 6),
+            })
+            for op, cost in zip(ops, costs):
+                operations.append({"order": len(operations), "batch": index, "kind": op.kind,
+                                   "username": op.username, **self._details(op), **asdict(cost)})
+        return {"totals": self.totals(), "batches": batches, "operations": operations}
+    
+    def to_json(self, **extra) -> str:
+        """Plan as a JSON document, with extra top-level fields"""
+        return json.dumps({**extra, **self.to_dict()}, indent=2)
+
+
+class PlanExecutor:
+    """
+    Applies a cycle's operations in batched transactions
+    
+    Operations are grouped by kind (role creations, role membership updates,
+    drops, creations, password rotations, role updates, privilege updates,
+    unused role drops, in that order) and applied DDL_BATCH_SIZE at a time. If a batch fails, only
+    that batch is retried operation by operation so one bad user cannot block
+    the rest.
+    
+    With more than one worker, the batches of a phase run concurrently on a
+    bounded thread pool. Phases stay sequential, so every role is created
+    before any grant that depends on it; role creations are planned parents
+    first and never run concurrently.
+    """
+    
+    ORDER = ("create_role", "role_update", "drop", "create", "password", "update", "privileges", "drop_role")
+    # Kinds whose batches must run one after the other, in plan order
+    SEQUENTIAL = ("create_role",)
+    # Cycle phase recorded for each kind
+    PHASES = {"create_role": "role_reconcile", "role_update": "role_reconcile", "drop": "user_delete",
+              "create": "user_create", "password": "password_update", "update": "user_update",
+              "privileges": "privilege_update", "drop_role": "role_delete"}
+    
+    def __init__(self, db_client: DatabaseClient, batch_size: Optional[int] = None,
+                 workers: Optional[int] = None, metrics: Optional["Metrics"] = None):
+        self.db_client = db_client
+        self.batch_size = max(1, batch_size or Config.DDL_BATCH_SIZE)
+        # Each worker holds one pooled connection while applying a batch
+        self.workers = max(1, min(workers or Config.RECONCILE_WORKERS, Config.DB_POOL_MAX_CONN))
+        self.metrics = metrics
+        if self.metrics:
+            self.metrics.executor_workers = self.workers
+    
+    def _chunks(self, ops: List[UserOperation], spread: bool = True) -> List[List[UserOperation]]:
+        """Split a phase into batches, spreading small phases across workers"""
+        size = self.batch_size
+        if self.workers > 1 and spread:
+            size = max(1, min(size, -(-len(ops) // self.workers)))
+        return [ops[start:start + size] for start in range(0, len(ops), size)]
+    
+    def plan(self, operations: List[UserOperation], estimate: bool = True) -> ReconcilePlan:
+        """
+        Order and batch a cycle's operations, and estimate their costs
+        
+        Args:
+            operations: Planned operations
+            estimate: Whether to estimate costs (one pg_shdepend query if users are dropped)
+            
+        Returns:
+            ReconcilePlan to report or execute
+        """
+        batches = [(kind, batch) for kind in self.ORDER
+                   for batch in self._chunks([op for op in operations if op.kind == kind],
+                                             spread=kind not in self.SEQUENTIAL)]
+        return ReconcilePlan(batches, self.estimate_costs(operations) if estimate else None)
+    
+    def statement_seconds(self, kind: str) -> float:
+        """Mean measured DDL statement latency of a kind, or PLAN_STATEMENT_SECONDS"""
+        measured = self.metrics.mean("postgres_controller_ddl_statement_duration_seconds", kind) \
+            if self.metrics else None
+        return Config.PLAN_STATEMENT_SECONDS if measured is None else measured
+    
+    def estimate_costs(self, operations: List[UserOperation]) -> Dict[Tuple[str, str], OperationCost]:
+        """
+        Estimate statements, grants, locks and duration of each operation
+        
+        Statement counts are upper bounds: batches coalesce identical grants.
+        Drops of users and unused roles are costed from what they own and the
+        privileges they hold in every database.
+        
+        Args:
+            operations: Planned operations
+            
+        Returns:
+            OperationCost per (kind, username)
+        """
+        drops = sorted(op.username for op in operations if op.kind in ("drop", "drop_role"))
+        dependencies: Dict[str, Dict[Optional[str], Tuple[int, int]]] = {}
+        if drops:
+            try:
+                dependencies = dict(self.db_client.fetch_dependency_counts(drops))
+            except Exception as e:
+                logger.warning(f"Could not count the objects of users to drop: {e}")
+        maintenance = getattr(self.db_client, "dbname", None)
+        
+        costs = {}
+        for op in operations:
+            cost = OperationCost()
+            if op.kind in ("drop", "drop_role"):
+                owned = dependencies.get(op.username, {})
+                cost.owned_objects = sum(objects for objects, _ in owned.values())
+                cost.privilege_entries = sum(entries for _, entries in owned.values())
+                cost.databases = sorted(db for db in owned if db is not None and db != maintenance)
+                cost.statements = 4 + 2 * len(cost.databases)
+                cost.locks = 1 + cost.owned_objects + cost.privilege_entries
+            elif op.kind == "create":
+                privileges = [bits for bits in desired_privileges(op.spec, include_connect=False).values() if bits]
+                cost.grants = len(op.spec.roles) + len(privileges)
+                cost.statements = 2 + cost.grants
+                cost.locks = 1 + cost.grants
+                if privileges and op.spec.database != maintenance:
+                    cost.databases = [op.spec.database]
+            elif op.kind == "create_role":
+                cost.grants = len(op.grant)
+                cost.locks = 1 + cost.grants
+            elif op.kind in ("update", "role_update"):
+                cost.grants = cost.statements = cost.locks = len(op.grant) + len(op.revoke)
+            elif op.kind == "privileges":
+                cost.grants = cost.statements = sum(
+                    bool(grant_bits) + bool(revoke_bits) for grant_bits, revoke_bits in op.privilege_changes.values())
+                cost.locks = len(op.privilege_changes)
+                if op.spec and op.spec.database != maintenance:
+                    cost.databases = [op.spec.database]
+            cost.estimated_seconds = round(cost.statements * self.statement_seconds(op.kind), 6)
+            costs[(op.kind, op.username)] = cost
+        return costs
+    
+    def execute(self, operations: Union[ReconcilePlan, List[UserOperation]],
+                dry_run: bool = False) -> List[BatchResult]:
+        """
+        Execute operations grouped into batches
+        
+        Args:
+            operations: ReconcilePlan, or operations to plan without cost estimates
+            dry_run: If True, only log the actions without executing
+            
+        Returns:
+            One BatchResult per executed batch
+        """
+        plan = operations if isinstance(operations, ReconcilePlan) else self.plan(operations, estimate=False)
+        results = []
+        for kind, batches in plan.phases():
+            phase = self.PHASES.get(kind)
+            with observe_duration(self.metrics if phase and not dry_run else None,
+                                  "postgres_controller_phase_duration_seconds", phase or ""):
+                results.extend(self._execute_phase(kind, batches, dry_run))
+        return results
+    
+    def _execute_phase(self, kind: str, batches: List[List[UserOperation]], dry_run: bool) -> List[BatchResult]:
+        if self.workers == 1 or len(batches) <= 1 or dry_run or kind in self.SEQUENTIAL:
+            return [self._run_batch(kind, batch, dry_run) for batch in batches]
+        
+        if self.metrics:
+            self.metrics.adjust_queue_depth(len(batches))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ddl-worker") as pool:
+            futures = [pool.submit(self._run_batch, kind, batch, dry_run, True) for batch in batches]
+            return [future.result() for future in futures]
+    
+    def _run_batch(self, kind: str, ops: List[UserOperation], dry_run: bool, queued: bool = False) -> BatchResult:
+        if queued and self.metrics:
+            self.metrics.adjust_queue_depth(-1)
+        result = self._execute_batch(kind, ops, dry_run)
+        if self.metrics and not dry_run:
+            self.metrics.record_worker_batch(threading.current_thread().name, result.duration_seconds)
+        return result
+    
+    def _execute_batch(self, kind: str, ops: List[UserOperation], dry_run: bool) -> BatchResult:
+        result = BatchResult(kind=kind, size=len(ops))
+        started = time.monotonic()
+        
+        if dry_run:
+            for op in ops:
+                self.db_client.apply_operation(op, dry_run=True)
+            result.succeeded = [op.username for op in ops]
+            return result
+        
+        try:
+            result.statements = self.db_client.apply_batch(kind, ops)
+            result.succeeded = [op.username for op in ops]
+        except Exception as e:
+            logger.warning(f"{YELLOW}{kind} batch of {len(ops)} failed, retrying individually: {e}{RESET}")
+            result.fallback = True
+            for op in ops:
+                try:
+                    self.db_client.apply_operation(op)
+                    result.succeeded.append(op.username)
+                except Exception as op_error:
+                    logger.error(f"Failed to apply {kind} for {op.username}: {op_error}")
+                    result.failed.append(op.username)
+        
+        result.duration_seconds = time.monotonic() - started
+        logger.info(f"DDL batch {kind}: {len(result.succeeded)}/{result.size} applied, "
+                    f"{result.statements} statements in {result.duration_seconds:.3f}s"
+                    f"{' (fallback)' if result.fallback else ''}")
+        return result
+
+
+# ============================================================================
+# STATE MANAGER
+# ============================================================================
+
+class StateManager:
+    """Manages persistent state for drift detection"""
+    
+    def __init__(self, state_file: str):
+        self.state_file = Path(state_file)
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+    
+    def load_state(self) -> Dict[str, UserSpec]:
+        """
+        Load last applied state from disk
+        
+        Returns:
+            Dictionary mapping username to UserSpec
+        """
+        if not self.state_file.exists():
+            logger.info("No previous state file found, starting fresh")
+            return {}
+        
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+                return {
+                    sys.intern(username): UserSpec(**spec)
+                    for username, spec in data.items()
+                }
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Error loading state file: {e}, starting fresh")
+            return {}
+    
+    def save_state(self, users: Dict[str, UserSpec]):
+        """
+        Save current state to disk
+        
+        The file is replaced atomically so a crash never leaves it truncated.
+        
+        Args:
+            users: Dictionary mapping username to UserSpec
+        """
+        tmp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+        try:
+            data = {
+                username: spec.to_dict()
+                for username, spec in users.items()
+            }
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.state_file)
+            logger.debug(f"State saved to {self.state_file}")
+        except IOError as e:
+            logger.error(f"Error saving state file: {e}")
+    
+    def save_users(self, users: Dict[str, Optional[UserSpec]]):
+        """
+        Update single users in the saved state
+        
+        Args:
+            users: Dictionary mapping username to UserSpec, or None to forget the user
+        """
+        state = dict(self.load_state())
+        for username, spec in users.items():
+            if spec is None:
+                state.pop(username, None)
+            else:
+                state[username] = spec
+        self.save_state(state)
+    
+    def close(self):
+        """Nothing to release for the JSON backend"""
+
+
+class SQLiteStateManager:
+    """
+    Indexed state store backed by SQLite
+    
+    Rows are keyed by username and read in one query per process; the
+    decoded specs stay in memory, so saving writes only the rows that
+    changed since the last save, in one WAL transaction that also bumps a
+    generation counter.
+    """
+    
+    def __init__(self, db_file: str, legacy_json: Optional[str] = None):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Last saved specs, read on the first load or save of the process
+        self._saved: Optional[Dict[str, UserSpec]] = None
+        # Accessed from executor threads by the asyncio engine
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, spec TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        if legacy_json and self.generation == 0 and Path(legacy_json).exists():
+            self._import_json(legacy_json)
+    
+    def _import_json(self, path: str):
+        """One-time migration from the JSON state file"""
+        users = StateManager(path).load_state()
+        if users:
+            self.save_state(users)
+            logger.info(f"Imported {len(users)} users from {path} into {self.db_file}")
+    
+    @property
+    def generation(self) -> int:
+        """Number of saves that changed the stored state"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def _encode(spec: UserSpec) -> str:
+        return json.dumps(spec.to_dict(), separators=(",", ":"))
+    
+    def _saved_users(self) -> Dict[str, UserSpec]:
+        """Last saved specs, bulk-loaded on first use (call with the lock held)"""
+        if self._saved is None:
+            self._saved = {
+                sys.intern(username): UserSpec(**json.loads(spec))
+                for username, spec in self._conn.execute("SELECT username, spec FROM users")
+            }
+        return self._saved
+    
+    def load_state(self) -> Dict[str, UserSpec]:
+        """
+        Load last applied state
+        
+        The planner looks up every desired user, so all rows are read and
+        decoded at once; later cycles copy the specs kept for save diffs.
+        
+        Returns:
+            Dictionary mapping username to UserSpec
+        """
+        try:
+            with self._lock:
+                return dict(self._saved_users())
+        except sqlite3.Error as e:
+            logger.error(f"Error loading state database: {e}, starting fresh")
+            return {}
+    
+    def save_state(self, users: Dict[str, UserSpec]):
+        """
+        Persist the users that changed since the last save
+        
+        Args:
+            users: Dictionary mapping username to UserSpec
+        """
+        try:
+            with self._lock:
+                saved = self._saved_users()
+                # Unchanged shards hand back the very specs saved last time
+                changed = [username for username, spec in users.items()
+                           if saved.get(username) is not spec and saved.get(username) != spec]
+                deletes = [(username,) for username in saved if username not in users]
+                if not changed and not deletes:
+                    return
+                upserts = [(username, self._encode(users[username])) for username in changed]
                 
-                # Grant additional privileges if specified
-                if user_spec.privileges:
-                    self._grant_privileges(cur, user_spec)
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO users (username, spec) VALUES (?, ?)", upserts)
+                    self._conn.executemany("DELETE FROM users WHERE username = ?", deletes)
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                                       "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                
+                # Specs are immutable, so the saved ones can be shared
+                for username in changed:
+                    saved[username] = users[username]
+                for (username,) in deletes:
+                    del saved[username]
+            logger.debug(f"State saved to {self.db_file}: {len(upserts)} upserted, {len(deletes)} deleted")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving state database: {e}")
+    
+    def save_users(self, users: Dict[str, Optional[UserSpec]]):
+        """
+        Upsert or delete single users without comparing the whole state
+        
+        Args:
+            users: Dictionary mapping username to UserSpec, or None to delete the user
+        """
+        upserts = [(username, self._encode(spec)) for username, spec in users.items() if spec is not None]
+        deletes = [(username,) for username, spec in users.items() if spec is None]
+        if not upserts and not deletes:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO users (username, spec) VALUES (?, ?)", upserts)
+                    self._conn.executemany("DELETE FROM users WHERE username = ?", deletes)
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                                       "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                
+                if self._saved is not None:
+                    for username, spec in users.items():
+                        if spec is None:
+                            self._saved.pop(username, None)
+                        else:
+                            self._saved[username] = spec
+        except sqlite3.Error as e:
+            logger.error(f"Error saving state database: {e}")
+    
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
+
+
+def create_state_manager(state_file: Optional[str] = None):
+    """
+    Build the configured state backend
+    
+    Args:
+        state_file: JSON state file path (the SQLite store lives next to it)
+        
+    Returns:
+        StateManager or SQLiteStateManager
+    """
+    state_file = state_file or Config.STATE_FILE
+    if Config.STATE_BACKEND == "json":
+        return StateManager(state_file)
+    return SQLiteStateManager(os.path.splitext(state_file)[0] + ".db", legacy_json=state_file)
+
+
+# ============================================================================
+# DESIRED STATE
+# ============================================================================
+
+# libyaml's loader is several times faster when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Written by seal_users.py next to users.yaml: sha256 of users.yaml plus the
+# same users pre-compiled to JSON (users.json) or MessagePack (users.msgpack)
+SIDECAR_DIGEST_KEY = "users.sha256"
+
+
+def content_digest(content: Union[str, bytes]) -> str:
+    """sha256 of a desired state document"""
+    return hashlib.sha256(content if isinstance(content, bytes) else content.encode()).hexdigest()
+
+
+def select_desired_document(data: Optional[dict], binary_data: Optional[dict] = None) -> Union[str, bytes]:
+    """
+    Pick the desired state document of a ConfigMap
+    
+    A sidecar is only used while its recorded digest still matches users.yaml,
+    so hand edits to users.yaml are never shadowed by a stale sidecar.
+    
+    Args:
+        data: ConfigMap data
+        binary_data: ConfigMap binaryData (base64-encoded)
+        
+    Returns:
+        users.yaml text, users.json text or users.msgpack bytes
+    """
+    data = data or {}
+    content = data.get("users.yaml", "")
+    digest = data.get(SIDECAR_DIGEST_KEY)
+    if not digest:
+        return content
+    if digest != content_digest(content):
+        logger.warning("Ignoring users.yaml sidecar: users.yaml changed after it was sealed")
+        return content
+    if msgpack is not None and "users.msgpack" in (binary_data or {}):
+        return base64.b64decode(binary_data["users.msgpack"])
+    return data.get("users.json") or content
+
+
+def configmap_shard(configmap) -> ConfigMapShard:
+    """Desired state shard of a ConfigMap object"""
+    return ConfigMapShard(
+        configmap.metadata.name,
+        configmap.metadata.resource_version,
+        select_desired_document(configmap.data, configmap.binary_data)
+    )
+
+
+def user_resource(obj: dict) -> UserResource:
+    """
+    Informer cache entry of a PostgreSQLUser object
+    
+    The username defaults to the object name. spec.password is ignored:
+    passwords always come from the user's Secret.
+    """
+    metadata = obj.get("metadata") or {}
+    user_data = {key: value for key, value in (obj.get("spec") or {}).items() if key != "password"}
+    user_data.setdefault("username", metadata.get("name"))
+    spec = user_spec_from_dict(user_data)
+    version = f"{metadata.get('uid')}/{metadata.get('generation')}"
+    return UserResource(
+        name=metadata.get("name"),
+        version=version,
+        generation=metadata.get("generation") or 0,
+        spec=spec,
+        shard=ConfigMapShard(metadata.get("name"), version, json.dumps({"users": [spec.to_dict()]})),
+        status=dict(obj.get("status") or {})
+    )
+
+
+def user_spec_from_dict(user_data: dict) -> UserSpec:
+    """Build a UserSpec from one entry of the users list"""
+    return UserSpec(
+        username=user_data["username"],
+        database=user_data.get("database", Config.DB_NAME),
+        roles=user_data.get("roles", []),
+        privileges=user_data.get("privileges")
+    )
+
+
+def role_spec_from_dict(role_data: dict) -> RoleSpec:
+    """Build a RoleSpec from one entry of the roles list"""
+    return RoleSpec(name=role_data["name"], member_of=list(role_data.get("member_of") or []))
+
+
+def collect_role_specs(entries: Optional[List[dict]], roles: Optional[Dict[str, RoleSpec]]):
+    """Add the entries of a roles list to roles (the first declaration of a name wins)"""
+    if roles is None:
+        return
+    for role_data in entries or []:
+        spec = role_spec_from_dict(role_data)
+        roles.setdefault(spec.name, spec)
+
+
+def stream_user_specs(content: str, roles: Optional[Dict[str, RoleSpec]] = None) -> Iterator[UserSpec]:
+    """
+    Parse users.yaml event by event, yielding each user as soon as its entry is complete
+    
+    Only one user's node tree exists at a time, so peak memory does not grow
+    with the document. Uses the pure-Python parser, which is the only one
+    that composes single nodes. The roles section, if any, is added to roles.
+    """
+    loader = yaml.SafeLoader(content)
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise yaml.YAMLError("users.yaml must be a mapping")
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(loader.compose_node(None, None))
+            if key == "users" and loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield user_spec_from_dict(loader.construct_document(loader.compose_node(None, None)))
+                loader.get_event()
+            elif key == "roles":
+                collect_role_specs(loader.construct_document(loader.compose_node(None, None)), roles)
+            else:
+                loader.compose_node(None, None)
+    finally:
+        loader.dispose()
+
+
+class DesiredStateLoader:
+    """
+    Parses the desired state, memoized on the content digest
+    
+    An unchanged ConfigMap costs one sha256 instead of a parse. JSON and
+    MessagePack sidecars skip YAML entirely; YAML is read with libyaml when
+    available, or streamed user by user when YAML_STREAMING is set.
+    """
+    
+    def __init__(self, streaming: Optional[bool] = None):
+        self.streaming = Config.YAML_STREAMING if streaming is None else streaming
+        self._digest: Optional[str] = None
+        self._users: Dict[str, UserSpec] = {}
+        self._roles: Dict[str, RoleSpec] = {}
+        self.parses = 0
+    
+    @property
+    def roles(self) -> Dict[str, RoleSpec]:
+        """Group roles declared by the last loaded document"""
+        return dict(self._roles)
+    
+    def iter_users(self, content: Union[str, bytes],
+                   roles: Optional[Dict[str, RoleSpec]] = None) -> Iterator[UserSpec]:
+        """
+        Yield the users of a desired state document
+        
+        Args:
+            content: users.yaml or users.json text, or users.msgpack bytes
+            roles: If given, receives the declared group roles
+        """
+        document = None
+        if isinstance(content, bytes):
+            document = msgpack.unpackb(content, raw=False)
+        elif content.lstrip().startswith("{"):
+            # A users.json sidecar, or flow-style YAML that is not valid JSON
+            try:
+                document = json.loads(content)
+            except json.JSONDecodeError:
+                pass
+        if document is None:
+            if self.streaming:
+                yield from stream_user_specs(content, roles)
+                return
+            document = yaml.load(content, Loader=YAML_LOADER)
+        collect_role_specs((document or {}).get("roles"), roles)
+        for user_data in (document or {}).get("users") or []:
+            yield user_spec_from_dict(user_data)
+    
+    def load(self, content: Union[str, bytes]) -> Dict[str, UserSpec]:
+        """
+        Desired users of a document, parsed only if it changed since the last call
+        
+        Args:
+            content: users.yaml or users.json text, or users.msgpack bytes
+            
+        Returns:
+            Dictionary mapping username to UserSpec (a copy, safe to modify)
+        """
+        digest = content_digest(content)
+        if digest != self._digest:
+            roles: Dict[str, RoleSpec] = {}
+            self._users = {spec.username: spec for spec in self.iter_users(content, roles)}
+            self._roles = roles
+            self._digest = digest
+            self.parses += 1
+        return dict(self._users)
+
+
+class ShardedDesiredState:
+    """
+    Desired state spread over several ConfigMaps
+    
+    Each shard is parsed again only when its resourceVersion changes (or,
+    without one, its content digest). The shards are merged in name order,
+    so a username defined in more than one shard is detected and the first
+    definition wins. Declared group roles are merged the same way.
+    """
+    
+    def __init__(self):
+        self._parsed: Dict[str, Tuple[Optional[str], Dict[str, UserSpec]]] = {}
+        self._loaders: Dict[str, DesiredStateLoader] = {}
+        self.duplicates: Dict[str, List[str]] = {}
+        # Group roles declared by the shards of the last merge
+        self.roles: Dict[str, RoleSpec] = {}
+        self.errors = 0
+    
+    @staticmethod
+    def digest(shards: List[ConfigMapShard]) -> str:
+        """Digest of the shard set, from resourceVersions where available"""
+        versions = sorted((shard.name, shard.resource_version or content_digest(shard.content)) for shard in shards)
+        return hashlib.sha256(repr(versions).encode()).hexdigest()
+    
+    def version_of(self, name: str) -> Optional[str]:
+        """resourceVersion of a shard as last parsed"""
+        parsed = self._parsed.get(name)
+        return parsed[0] if parsed else None
+    
+    def _parse(self, shard: ConfigMapShard) -> Tuple[Dict[str, UserSpec], bool]:
+        """Users of one shard, and whether they were parsed again"""
+        previous = self._parsed.get(shard.name)
+        if previous is not None and shard.resource_version is not None and previous[0] == shard.resource_version:
+            return previous[1], False
+        loader = self._loaders.setdefault(shard.name, DesiredStateLoader())
+        parses = loader.parses
+        try:
+            users = loader.load(shard.content)
+        except (yaml.YAMLError, KeyError, ValueError) as e:
+            if previous is None:
+                raise ValueError(f"ConfigMap {shard.name}: {e}") from e
+            # Dropping its users would delete them from the database
+            logger.error(f"Error parsing ConfigMap {shard.name}, keeping its last valid users: {e}")
+            self.errors += 1
+            return previous[1], False
+        self._parsed[shard.name] = (shard.resource_version, users)
+        return users, loader.parses != parses
+    
+    def merge(self, shards: List[ConfigMapShard]) -> Tuple[Dict[str, UserSpec], Set[str]]:
+        """
+        Merge the users of all shards
+        
+        Args:
+            shards: Current shards
+            
+        Returns:
+            Tuple of (desired users, usernames in shards that changed since the previous merge)
+        """
+        self.duplicates, self.errors = {}, 0
+        users: Dict[str, UserSpec] = {}
+        roles: Dict[str, RoleSpec] = {}
+        owners: Dict[str, str] = {}
+        changed: Set[str] = set()
+        for shard in sorted(shards, key=lambda shard: shard.name):
+            previous = self._parsed.get(shard.name)
+            shard_users, reparsed = self._parse(shard)
+            for name, role in self._loaders[shard.name].roles.items():
+                roles.setdefault(name, role)
+            if reparsed:
+                changed.update(shard_users)
+                if previous is not None:
+                    changed.update(previous[1])
+            for username, spec in shard_users.items():
+                owner = owners.get(username)
+                if owner is not None:
+                    self.duplicates.setdefault(username, [owner]).append(shard.name)
+                    continue
+                owners[username] = shard.name
+                users[username] = spec
+        
+        # Users of deleted shards need a diff too
+        for name in set(self._parsed) - {shard.name for shard in shards}:
+            changed.update(self._parsed.pop(name)[1])
+            self._loaders.pop(name, None)
+        self.roles = roles
+        return users, changed
+
+
+# ============================================================================
+# RECONCILIATION CONTROLLER
+# ============================================================================
+
+class ReconcilerBase:
+    """
+    Driver-independent reconciliation logic
+    
+    Parsing, drift detection and planning are pure functions of the desired
+    state, the previous state and a CatalogSnapshot, shared by the threaded
+    and the asyncio controllers.
+    """
+    
+    def parse_desired_users(self, yaml_content: Union[str, bytes]) -> Dict[str, UserSpec]:
+        """
+        Parse users.yaml content (or one of its sidecars) into UserSpec objects
+        
+        Args:
+            yaml_content: Desired state document from the ConfigMap
+            
+        Returns:
+            Dictionary mapping username to UserSpec
+        """
+        if not yaml_content:
+            logger.warning("Empty ConfigMap content, no users to manage")
+            return {}
+        
+        try:
+            return self.desired_loader.load(yaml_content)
+        except (yaml.YAMLError, KeyError, ValueError) as e:
+            logger.error(f"Error parsing users.yaml: {e}")
+            return {}
+    
+    def load_desired_users(self, shards: List[ConfigMapShard],
+                           stats: ReconciliationStats) -> Tuple[Optional[Dict[str, UserSpec]], Set[str]]:
+        """
+        Merge the desired users of all ConfigMap shards
+        
+        Args:
+            shards: Current shards
+            stats: Statistics object to update
+            
+        Returns:
+            Tuple of (desired users or None if a shard could not be parsed,
+            usernames in shards that changed since the previous call)
+        """
+        try:
+            users, changed = self.desired_state.merge(shards)
+        except (yaml.YAMLError, KeyError, ValueError) as e:
+            logger.error(f"Error parsing desired state, skipping reconciliation: {e}")
+            stats.errors += 1
+            return None, set()
+        for username, names in sorted(self.desired_state.duplicates.items()):
+            logger.error(f"User {username} is defined in several ConfigMaps ({', '.join(names)}), "
+                         f"using {names[0]}")
+        stats.errors += self.desired_state.errors + len(self.desired_state.duplicates)
+        if not users and not any(shard.content for shard in shards):
+            logger.warning("Empty ConfigMap content, no users to manage")
+        return users, changed
+    
+    def detect_drift(self, desired: Dict[str, UserSpec], actual_users: Set[str]) -> Tuple[Set[str], Set[str], Set[str]]:
+        """
+        Detect drift between desired and actual state
+        
+        Args:
+            desired: Desired user specifications
+            actual_users: Actual users in database
+            
+        Returns:
+            Tuple of (users_to_create, users_to_delete, users_to_update)
+        """
+        desired_usernames = set(desired.keys())
+        
+        users_to_create = desired_usernames - actual_users
+        users_to_delete = actual_users - desired_usernames
+        users_to_update = desired_usernames & actual_users
+        
+        return users_to_create, users_to_delete, users_to_update
+    
+    @property
+    def desired_roles(self) -> Dict[str, RoleSpec]:
+        """Group roles declared by the desired state of the last merge"""
+        return self.desired_state.roles
+    
+    def plan_role_operations(self, desired_users: Dict[str, UserSpec], snapshot: CatalogSnapshot,
+                             graph: Optional[RoleGraph] = None,
+                             stats: Optional[ReconciliationStats] = None) -> List[UserOperation]:
+        """
+        Plan creation of missing roles and membership changes of declared roles
+        
+        Missing roles are created parents first, each joining its declared
+        parent roles in its CREATE ROLE, so a whole hierarchy is built in one
+        plan. Declared roles that exist are diffed against pg_auth_members.
+        
+        Args:
+            desired_users: Desired user specifications
+            snapshot: Catalog snapshot of the current cycle
+            graph: Role graph of the desired state (built from desired_users and desired_roles if omitted)
+            stats: Statistics object to update
+            
+        Returns:
+            create_role and role_update operations
+        """
+        if graph is None:
+            graph = RoleGraph()
+            graph.update(desired_users, self.desired_roles)
+        
+        try:
+            order = graph.topological_order()
+        except RoleCycleError as e:
+            # PostgreSQL rejects the closing grant anyway: create the roles, leave memberships alone
+            logger.error(f"{e}, creating roles without their declared memberships")
+            if stats is not None:
+                stats.errors += 1
+            missing = graph.roles - set(snapshot.roles) - set(desired_users)
+            return [UserOperation("create_role", role) for role in sorted(missing)]
+        
+        operations = [
+            UserOperation("create_role", role, grant=set(graph.parents_of(role)))
+            for role in order if role not in snapshot.roles and role not in desired_users
+        ]
+        members = sorted(role for role in graph.declared if role in snapshot.roles)
+        for role, (grant, revoke) in sorted(graph.diff(RoleGraph.from_catalog(snapshot, members), members).items()):
+            operations.append(UserOperation("role_update", role, grant=grant, revoke=revoke))
+        return operations
+    
+    def plan_user_operations(self, desired_users: Dict[str, UserSpec], previous_state: Mapping,
+                             snapshot: CatalogSnapshot, drift: Tuple[Set[str], Set[str], Set[str]],
+                             get_password, stats: ReconciliationStats,
+                             skipped: Optional[Set[str]] = None,
+                             role_graph: Optional[RoleGraph] = None) -> List[UserOperation]:
+        """
+        Plan user drops, creations and role updates
+        
+        Args:
+            desired_users: Desired user specifications
+            previous_state: Last applied user specifications
+            snapshot: Catalog snapshot of the current cycle
+            drift: Tuple of (users_to_create, users_to_delete, users_to_update)
+            get_password: Callable returning a user's password or None
+            stats: Statistics object to update
+            skipped: Optional set receiving users whose creation could not be planned
+            role_graph: Role graph of the whole desired state, whose roles count as managed
+            
+        Returns:
+            Planned operations
+        """
+        users_to_create, users_to_delete, users_to_update = drift
+        operations: List[UserOperation] = []
+        
+        # Plan deletions
+        for username in users_to_delete:
+            # Only delete users we manage: created by the controller (any replica) or in our previous state
+            if username in snapshot.managed or username in previous_state:
+                operations.append(UserOperation("drop", username))
+        
+        # Plan creations
+        for username in users_to_create:
+            user_spec = desired_users[username]
+            try:
+                password = get_password(username)
+                if not password:
+                    logger.error(f"No password found for user {username}, skipping creation")
+                    stats.errors += 1
+                    if skipped is not None:
+                        skipped.add(username)
+                    continue
                 
-                conn.commit()
-        except psycopg2.Error as e:
-            logger.error(f"Error creating user {user_spec.username}: {e}")
-            if conn:
-                conn.rollback()
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+                operations.append(UserOperation("create", username, spec=user_spec, password=password))
+            except Exception as e:
+                logger.error(f"Failed to create user {username}: {e}")
+                stats.errors += 1
+                if skipped is not None:
+                    skipped.add(username)
+        
+        # Plan updates: memberships are diffed against the catalog, not the
+        # previous spec, so hand-made GRANT/REVOKE of roles is repaired too.
+        # Only roles the controller grants are revoked: memberships granted
+        # by a DBA or the operator, and system roles, are left alone.
+        managed_roles = self.managed_roles(desired_users, role_graph)
+        for username in users_to_update:
+            user_spec = desired_users[username]
+            actual_roles = snapshot.roles_of(username)
+            desired_roles = set(user_spec.roles)
+            prev_spec = previous_state.get(username)
+            revocable = managed_roles | set(prev_spec.roles if prev_spec else ())
+            grant = desired_roles - actual_roles
+            revoke = {role for role in actual_roles - desired_roles
+                      if role in revocable and role not in Config.SYSTEM_ROLES}
+            
+            if grant or revoke:
+                operations.append(UserOperation(
+                    "update",
+                    username,
+                    spec=user_spec,
+                    grant=grant,
+                    revoke=revoke
+                ))
+        
+        return operations
+    
+    def managed_roles(self, desired_users: Dict[str, UserSpec], role_graph: Optional[RoleGraph] = None) -> Set[str]:
+        """Group roles the controller grants: declared, or granted to a desired user"""
+        bits = 0
+        for user_spec in desired_users.values():
+            bits |= user_spec.role_bits
+        roles = set(ROLE_NAMES.decode(bits)) | set(self.desired_roles)
+        if role_graph is not None:
+            roles |= role_graph.roles
+        return roles
+    
+    def plan_password_operations(self, desired_users: Dict[str, UserSpec], snapshot: CatalogSnapshot,
+                                 usernames: Set[str], get_password, get_version,
+                                 prune: bool = True) -> List[UserOperation]:
+        """
+        Plan password rotations for users whose stored verifier does not match their Secret
+        
+        Verifiers are checked locally against the snapshot, so only true
+        mismatches cost an ALTER ROLE. Users without a password in their
+        Secret are left alone.
+        
+        Args:
+            desired_users: Desired user specifications
+            snapshot: Catalog snapshot of the current cycle
+            usernames: Existing users to check
+            get_password: Callable returning a user's password or None
+            get_version: Callable returning the resourceVersion of a user's Secret
+            prune: Forget cached checks of users not in usernames (False when checking a subset)
+            
+        Returns:
+            password operations
+        """
+        operations = []
+        for username in sorted(usernames):
+            password = get_password(username)
+            if not password:
+                continue
+            if not self.verifiers.matches(username, get_version(username), password,
+                                          snapshot.verifiers.get(username)):
+                operations.append(UserOperation("password", username, spec=desired_users[username],
+                                                password=password))
+        if prune:
+            self.verifiers.retain(usernames)
+        if operations:
+            logger.info(f"{YELLOW}Password drift detected for {len(operations)} users{RESET}")
+        return operations
+    
+    def privilege_targets(self, desired_users: Dict[str, UserSpec]) -> Set[PrivilegeTarget]:
+        """Objects whose ACLs are managed: everything named in a desired privilege, plus the users' databases"""
+        targets: Set[PrivilegeTarget] = set()
+        for user_spec in desired_users.values():
+            targets.update(desired_privileges(user_spec))
+        return targets
+    
+    def plan_privilege_operations(self, desired_users: Dict[str, UserSpec], index: PrivilegeIndex,
+                                  usernames: Set[str]) -> List[UserOperation]:
+        """
+        Plan the minimal GRANT/REVOKE sets that bring direct privileges in line
+        
+        Only managed objects are compared, and only the managed users' own
+        entries in their ACLs; privileges inherited through roles are not
+        touched. Objects that do not exist yet are skipped.
+        
+        Args:
+            desired_users: Desired user specifications
+            index: PrivilegeIndex of the managed objects
+            usernames: Existing users to compare (users created in this cycle get their grants on creation)
+            
+        Returns:
+            privileges operations
+        """
+        operations = []
+        missing: Set[PrivilegeTarget] = set()
+        for username in sorted(usernames):
+            user_spec = desired_users[username]
+            wanted = desired_privileges(user_spec)
+            changes = {}
+            for target in set(wanted) | index.targets_of.get(username, set()):
+                if target not in index:
+                    missing.add(target)
+                    continue
+                held = index.bits(target, username)
+                want = wanted.get(target, 0)
+                if held != want:
+                    changes[target] = (want & ~held, held & ~want)
+            if changes:
+                operations.append(UserOperation("privileges", username, spec=user_spec, privilege_changes=changes))
+        if missing:
+            logger.warning(f"Skipping privileges on {len(missing)} missing objects: "
+                           f"{', '.join(f'{kind} {name}' for kind, name in sorted(missing))}")
+        return operations
+    
+    def admit_operations(self, operations: List[UserOperation],
+                         stats: ReconciliationStats) -> Tuple[List[UserOperation], List[str]]:
+        """
+        Hold back operations of users that are still backing off after a failure
+        
+        Users whose backoff expired are taken off the queue and retried in
+        this cycle; operations on group roles are never held back.
+        
+        Args:
+            operations: Planned operations
+            stats: Statistics object to update
+            
+        Returns:
+            Tuple of (operations to apply, users retried in this cycle)
+        """
+        retries = self.queue.pop_ready()
+        admitted = []
+        for op in operations:
+            if op.kind not in ROLE_KINDS and self.queue.is_waiting(op.username):
+                stats.users_deferred += 1
+                continue
+            admitted.append(op)
+        if stats.users_deferred:
+            logger.info(f"{YELLOW}Holding back {stats.users_deferred} users that are backing off{RESET}")
+        return admitted, retries
+    
+    def record_outcomes(self, results: List[BatchResult], skipped: Set[str], retries: List[str]):
+        """
+        Re-queue failed users with backoff and reset the backoff of the others
+        
+        Args:
+            results: Executed batches
+            skipped: Users whose creation could not be planned
+            retries: Users taken off the queue for this cycle
+        """
+        # Users still backing off keep their current delay
+        failed = {username: "create" for username in skipped if not self.queue.is_waiting(username)}
+        succeeded = set(retries)
+        for result in results:
+            if result.kind in ROLE_KINDS:
+                continue
+            for username in result.failed:
+                failed.setdefault(username, result.kind)
+            succeeded.update(result.succeeded)
+        for username in succeeded - set(failed):
+            self.queue.forget(username)
+        for username, kind in failed.items():
+            delay = self.queue.add_rate_limited(username)
+            logger.warning(f"Retrying {kind} for {username} in {delay:.1f}s "
+                           f"(failure {self.queue.num_requeues(username)})")
+        self.metrics.workqueue_retries_count += len(failed)
+        self.metrics.workqueue_depth = len(self.queue)
+    
+    def state_to_save(self, desired_users: Dict[str, UserSpec], previous_state: Mapping) -> Dict[str, UserSpec]:
+        """
+        Desired state, except that users queued for a retry keep their last applied spec
+        
+        Args:
+            desired_users: Desired user specifications
+            previous_state: Last applied user specifications
+            
+        Returns:
+            State to persist
+        """
+        state = dict(desired_users)
+        for username in self.queue.keys():
+            previous = previous_state.get(username)
+            if previous is None:
+                state.pop(username, None)
+            else:
+                state[username] = previous
+        return state
+    
+    def next_wakeup(self, timeout: float) -> float:
+        """
+        Seconds to wait before the next cycle
+        
+        Shortened when a queued retry is due earlier, but never below the base
+        retry delay so a cycle that fails early cannot spin.
+        """
+        ready_in = self.queue.ready_in()
+        if ready_in is None:
+            return timeout
+        return min(timeout, max(ready_in, self.queue.base_delay))
+    
+    def count_results(self, results: List[BatchResult], stats: ReconciliationStats,
+                      snapshot: Optional[CatalogSnapshot] = None) -> int:
+        """
+        Add applied operations to the cycle statistics
+        
+        Args:
+            results: Executed batches
+            stats: Statistics object to update
+            snapshot: If given, created and dropped roles are recorded in it
+            
+        Returns:
+            Number of applied changes
+        """
+        counters = {
+            "create_role": "roles_created",
+            "role_update": "roles_updated",
+            "drop": "users_deleted",
+            "create": "users_created",
+            "password": "passwords_updated",
+            "update": "users_updated",
+            "privileges": "privileges_updated",
+            "drop_role": "roles_deleted",
+        }
+        applied = 0
+        for result in results:
+            attribute = counters[result.kind]
+            setattr(stats, attribute, getattr(stats, attribute) + len(result.succeeded))
+            applied += len(result.succeeded)
+            if snapshot is not None and result.kind == "create_role":
+                for role in result.succeeded:
+                    snapshot.record_role_created(role)
+            elif snapshot is not None and result.kind == "drop_role":
+                for role in result.succeeded:
+                    snapshot.record_role_dropped(role)
+        return applied
+    
+    def log_summary(self, stats: ReconciliationStats):
+        """Print the summary of a reconciliation cycle"""
+        logger.info("=" * 60)
+        cluster = f" [{self.name}]" if getattr(self, "name", None) else ""
+        logger.info(f"{WHITE}Reconciliation Summary{cluster}:{RESET}")
+        logger.info(f"  • Users created: {stats.users_created}")
+        logger.info(f"  • Users updated: {stats.users_updated}")
+        logger.info(f"  • Users deleted: {stats.users_deleted}")
+        logger.info(f"  • Passwords updated: {stats.passwords_updated}")
+        logger.info(f"  • Privileges updated: {stats.privileges_updated}")
+        logger.info(f"  • Roles created: {stats.roles_created}")
+        logger.info(f"  • Roles updated: {stats.roles_updated}")
+        logger.info(f"  • Roles deleted: {stats.roles_deleted}")
+        logger.info(f"  • Drift detected: {stats.drift_detected}")
+        logger.info(f"  • DDL batches: {stats.ddl_batches} (fallbacks: {stats.ddl_fallbacks})")
+        logger.info(f"  • Errors: {stats.errors}")
+        if stats.users_deferred:
+            logger.info(f"  • Users deferred (backing off): {stats.users_deferred}")
+        logger.info(f"  • Duration: {stats.duration_seconds():.2f}s")
+        logger.info("=" * 60)
+
+
+class PostgresUserController(ReconcilerBase):
+    """
+    Main controller for reconciling PostgreSQL users and roles
+    """
+    
+    def __init__(self, k8s_client: Optional[KubernetesClient] = None,
+                 db_client: Optional[DatabaseClient] = None,
+                 state_manager: Optional[StateManager] = None,
+                 name: Optional[str] = None,
+                 coordinator: Optional[ReplicaCoordinator] = None):
+        self.name = name
+        self.coordinator = coordinator
+        self.k8s_client = k8s_client or KubernetesClient()
+        self.db_client = db_client or DatabaseClient()
+        self.state_manager = state_manager or create_state_manager()
+        self.secret_cache = SecretCache()
+        self.metrics = Metrics()
+        self.db_client.metrics = self.metrics
+        if coordinator is not None:
+            self.db_client.advisory_locks = True
+        if getattr(self.k8s_client, "metrics", None) is None:
+            self.k8s_client.metrics = self.metrics
+        self.executor = PlanExecutor(self.db_client, metrics=self.metrics)
+        # Plan of the last cycle
+        self.last_plan: Optional[ReconcilePlan] = None
+        self.queue = WorkQueue()
+        self.verifiers = VerifierCache()
+        self.desired_loader = DesiredStateLoader()
+        self.desired_state = ShardedDesiredState()
+        # Desired memberships of every user and declared role, updated by changed users only
+        self.role_graph = RoleGraph()
+        self._role_graph_synced = False
+        # Users and objects of the last full cycle, for attributing drift notifications
+        self.drift_index: Optional[DriftIndex] = None
+        self.drift_listener: Optional[DriftListener] = None
+        self.user_cache = UserResourceCache()
+        self._trigger = threading.Event()
+        self._pending_since: Optional[float] = None
+        # Watch-triggered work: PostgreSQLUser usernames, or a full cycle
+        self._dirty_users: Set[str] = set()
+        self._full_pending = True
+        self._dirty_lock = threading.Lock()
+        self._watchers: List[ResourceWatcher] = []
+        self._last_fingerprint: Optional[Tuple[str, Optional[str], str]] = None
+        self._last_shards: Optional[List[ConfigMapShard]] = None
+        # Databases of the last loaded desired state, whose ACLs the catalog digest covers
+        self._user_databases: Set[str] = set()
+        logger.info("PostgreSQL User Controller initialized")
+    
+    def reconcile_roles(self, desired_users: Dict[str, UserSpec], stats: ReconciliationStats, dry_run: bool = False,
+                        snapshot: Optional[CatalogSnapshot] = None):
+        """
+        Ensure all required roles exist in the database
+        
+        Args:
+            desired_users: Desired user specifications
+            stats: Statistics object to update
+            dry_run: If True, only simulate actions
+            snapshot: Catalog snapshot of the current cycle (taken if omitted)
+        """
+        if snapshot is None:
+            snapshot = self.db_client.fetch_catalog_snapshot()
+        
+        # Create missing roles and bring declared memberships in line
+        operations = self.plan_role_operations(desired_users, snapshot, stats=stats)
+        results = self.apply_operations(operations, stats, dry_run=dry_run)
+        self.count_results(results, stats, snapshot=None if dry_run else snapshot)
+        
+        # Unused roles are only dropped by a full cycle, where they are noticed (DROP_UNUSED_ROLES)
+    
+    def compute_fingerprint(self, desired_digest: str,
+                            secret_version: Optional[str] = None) -> Optional[Tuple[str, Optional[str], str]]:
+        """
+        Fingerprint the inputs of a cycle
+        
+        The catalog digest covers the ACLs of every database the last loaded
+        desired state uses; a changed set of databases changes the desired
+        state digest as well.
+        
+        Args:
+            desired_digest: Digest of the desired state shards
+            secret_version: Secret set version to use (digest of the cached Secret versions if omitted)
+            
+        Returns:
+            Tuple of (desired state digest, Secret set version, catalog digest),
+            or None if the catalog digest could not be computed
+        """
+        try:
+            catalog_digest = self.db_client.fetch_catalog_digest(self._user_databases)
+        except Exception as e:
+            logger.warning(f"Failed to compute catalog digest, running full cycle: {e}")
+            return None
+        if secret_version is None:
+            secret_version = self.secret_cache.digest()
+        return desired_digest, secret_version, catalog_digest
+    
+    def fetch_desired_shards(self) -> Optional[List[ConfigMapShard]]:
+        """
+        Fetch the desired state: every shard matching CONFIGMAP_SELECTOR, or the single users ConfigMap
+        
+        With USERS_SOURCE=crd every PostgreSQLUser object is a shard of its
+        own, served from the informer cache (listed here unless watched).
+        
+        Returns:
+            List of shards, or None if the ConfigMap does not exist
+        """
+        if Config.USERS_SOURCE == "crd":
+            if not (self.user_cache.watched and self.user_cache.synced):
+                result = self.k8s_client.list_postgresql_users(Config.NAMESPACE)
+                self.user_cache.load(result.get("items") or [])
+            return [resource.shard for resource in self.user_cache.resources()]
+        if Config.CONFIGMAP_SELECTOR:
+            return self.k8s_client.list_user_configmaps(Config.NAMESPACE, Config.CONFIGMAP_SELECTOR)
+        content = self.k8s_client.fetch_configmap(Config.CONFIGMAP_NAME, Config.NAMESPACE)
+        if content is None:
+            return None
+        return [ConfigMapShard(Config.CONFIGMAP_NAME, None, content)]
+    
+    def refresh_secret_cache(self) -> bool:
+        """
+        Make sure the password cache is usable for this cycle
+        
+        In watch mode the cache is kept fresh by the Secret watcher; otherwise
+        all user Secrets are listed in a single call. If that fails, a
+        previously listed copy is used rather than per-user reads.
+        
+        Returns:
+            True if the cache can be used, False to fall back to per-user reads
+        """
+        if self.secret_cache.watched and self.secret_cache.synced:
+            return True
+        try:
+            items, resource_version = self.k8s_client.list_user_secrets(Config.NAMESPACE)
+            self.secret_cache.load(items, resource_version)
+            self.metrics.secrets_cached = len(self.secret_cache)
+            return True
+        except Exception as e:
+            if self.secret_cache.synced:
+                logger.warning(f"Failed to list user Secrets, using the last listed copy: {e}")
+                return True
+            logger.warning(f"Failed to list user Secrets, falling back to per-user reads: {e}")
+            return False
+    
+    def apply_operations(self, operations: List[UserOperation], stats: ReconciliationStats,
+                         dry_run: bool = False) -> List[BatchResult]:
+        """
+        Execute planned operations through the batch executor
+        
+        Args:
+            operations: Planned operations
+            stats: Statistics object to update
+            dry_run: If True, only simulate actions
+            
+        Returns:
+            Results of the executed batches
+        """
+        results = self.executor.execute(operations, dry_run=dry_run)
+        for result in results:
+            stats.errors += len(result.failed)
+            stats.ddl_fallbacks += int(result.fallback)
+        stats.ddl_batches += len(results)
+        if results and not dry_run:
+            self.metrics.record_batches(results)
+        return results
+    
+    def reconcile_users(self, stats: ReconciliationStats, dry_run: bool = False,
+                        usernames: Optional[Set[str]] = None):
+        """
+        Main reconciliation logic
+        
+        Args:
+            stats: Statistics object to update
+            dry_run: If True, only simulate actions
+            usernames: If given, reconcile only these PostgreSQLUser users
+        """
+        # Only the leader (or every live shard) reconciles
+        if self.coordinator is not None:
+            self.metrics.replica_active = int(self.coordinator.is_active())
+            self.metrics.shard_members = len(self.coordinator.ring.members)
+            if not self.coordinator.is_active():
+                logger.info(f"{BLUE}Standing by: {self.coordinator.status()}{RESET}")
+                stats.standby = True
+                return
+        
+        if usernames is not None:
+            self.reconcile_selected_users(usernames, stats, dry_run=dry_run)
+            return
+        
+        # Fetch desired state from the ConfigMap (or its shards)
+        try:
+            with self.metrics.time_phase("configmap_fetch"):
+                shards = self.fetch_desired_shards()
+            self._last_shards = shards
+        except Exception as e:
+            if self._last_shards is None:
+                raise
+            # Keep converging towards the last known desired state while the API server is degraded
+            logger.warning(f"Failed to fetch desired state, using the last fetched copy: {e}")
+            stats.errors += 1
+            shards = self._last_shards
+        
+        if shards is None:
+            logger.error("Failed to fetch ConfigMap, skipping reconciliation")
+            stats.errors += 1
+            return
+        
+        # Passwords are checked every full cycle, so a rotated Secret must change the fingerprint
+        secrets_cached = Config.RECONCILE_PASSWORDS and self.refresh_secret_cache()
+        
+        # Skip the cycle entirely if nothing changed since the last clean one
+        # (the catalog digest is only worth its query when a cycle may be skipped)
+        fingerprint = None
+        if Config.SHORT_CIRCUIT_UNCHANGED and not dry_run:
+            desired_digest = ShardedDesiredState.digest(shards)
+            with self.metrics.time_phase("fingerprint"):
+                fingerprint = self.compute_fingerprint(desired_digest)
+        if (not self.queue and fingerprint is not None and fingerprint == self._last_fingerprint):
+            logger.info(f"{GREEN}Desired state and catalog unchanged, skipping cycle{RESET}")
+            stats.short_circuited = True
+            return
+        
+        with self.metrics.time_phase("yaml_parse"):
+            desired_users, changed_users = self.load_desired_users(shards, stats)
+        if desired_users is None:
+            self._last_fingerprint = None
+            self._role_graph_synced = False
+            return
+        
+        # The fingerprint taken before the users were known may miss a database's ACLs
+        user_databases = {spec.database for spec in desired_users.values()}
+        databases_changed = user_databases != self._user_databases
+        self._user_databases = user_databases
+        
+        # Before the replica filter, so every replica sees which roles lost their last member
+        self.role_graph.update(desired_users, self.desired_roles,
+                               changed_users if self._role_graph_synced else None)
+        self._role_graph_synced = True
+        if Config.DRIFT_NOTIFY:
+            self.drift_index = DriftIndex(desired_users)
+            if self.drift_listener is not None:
+                self.drift_listener.watch(self.drift_index.databases)
+        
+        # With Secrets and catalog as left by the last clean cycle, only users of changed shards can drift
+        scope: Optional[Set[str]] = None
+        if (fingerprint is not None and self._last_fingerprint is not None
+                and fingerprint[1:] == self._last_fingerprint[1:]):
+            scope = changed_users | set(self.queue.keys())
+            logger.info(f"Only desired state changed, diffing {len(scope)} users of changed ConfigMaps")
+        
+        if self.coordinator is not None and self.coordinator.sharded:
+            desired_users = {name: spec for name, spec in desired_users.items() if self.coordinator.owns(name)}
+            logger.info(f"Reconciling {len(desired_users)} users as {self.coordinator.status()}")
+        
+        # Load previous state
+        with self.metrics.time_phase("state_load"):
+            previous_state = self.state_manager.load_state()
+        
+        # Fetch actual database state in a single round trip
+        try:
+            with self.metrics.time_phase("catalog_snapshot"):
+                snapshot = self.db_client.fetch_catalog_snapshot()
+        except Exception as e:
+            logger.error(f"Failed to fetch catalog snapshot: {e}")
+            stats.errors += 1
+            return
+        actual_users = snapshot.users
+        if self.coordinator is not None and self.coordinator.sharded:
+            actual_users = {name for name in actual_users if self.coordinator.owns(name)}
+        
+        sharded = self.coordinator is not None and self.coordinator.sharded
+        operations = self.apply_drift(desired_users, actual_users, previous_state, snapshot, stats,
+                                      dry_run=dry_run, secrets_cached=secrets_cached, scope=scope,
+                                      role_graph=None if sharded else self.role_graph)
+        
+        # Save new state
+        if not dry_run:
+            with self.metrics.time_phase("state_save"):
+                self.state_manager.save_state(self.state_to_save(desired_users, previous_state))
+        
+        # Users created before they were marked get their comment once, so any replica may drop them later
+        if not dry_run and scope is None:
+            unmarked = sorted(name for name in desired_users if name in snapshot.roles and name not in snapshot.managed)
+            if unmarked:
+                try:
+                    self.db_client.mark_managed(unmarked)
+                    logger.info(f"Marked {len(unmarked)} existing users as managed")
+                except Exception as e:
+                    logger.warning(f"{YELLOW}Could not mark {len(unmarked)} users as managed: {e}{RESET}")
+        
+        # Remember what was applied; the catalog digest must reflect our own changes
+        if fingerprint is not None and stats.errors == 0 and not stats.users_deferred and not dry_run:
+            if operations or stats.roles_created or databases_changed:
+                fingerprint = self.compute_fingerprint(desired_digest, fingerprint[1])
+            self._last_fingerprint = fingerprint
+        else:
+            self._last_fingerprint = None
+        
+        if Config.USERS_SOURCE == "crd" and not dry_run:
+            # Only objects whose current generation took part in this cycle
+            self.publish_user_status([
+                resource for resource in self.user_cache.resources()
+                if self.desired_state.version_of(resource.name) == resource.version
+            ])
+        
+        # Update metrics
+        self.metrics.users_managed = len(desired_users)
+        self.metrics.roles_managed = len(snapshot.group_roles)
+    
+    def reconcile_selected_users(self, usernames: Set[str], stats: ReconciliationStats, dry_run: bool = False):
+        """
+        Reconcile single users from the PostgreSQLUser cache (or, for drift
+        notifications, the desired state of the last full cycle)
+        
+        The cost does not depend on the number of managed users: only these
+        users' objects, catalog rows and state rows are read.
+        
+        Args:
+            usernames: Users whose objects changed
+            stats: Statistics object to update
+            dry_run: If True, only simulate actions
+        """
+        if self.coordinator is not None and self.coordinator.sharded:
+            usernames = {username for username in usernames if self.coordinator.owns(username)}
+        if not usernames:
+            return
+        logger.info(f"Reconciling {len(usernames)} changed users: {', '.join(sorted(usernames)[:10])}")
+        
+        resources: List[UserResource] = []
+        desired_users: Dict[str, UserSpec] = {}
+        if Config.USERS_SOURCE == "crd":
+            # The object sorting first by name wins, as in a full cycle
+            resources = self.user_cache.resources_of(usernames)
+            for resource in resources:
+                desired_users.setdefault(resource.spec.username, resource.spec)
+        else:
+            # Only users managed by the last full cycle, so none of them is dropped
+            known = self.drift_index.users if self.drift_index is not None else {}
+            desired_users = {username: known[username] for username in usernames if username in known}
+            usernames = set(desired_users)
+            if not usernames:
+                return
+        
+        sharded = self.coordinator is not None and self.coordinator.sharded
+        if self._role_graph_synced and not sharded:
+            self.role_graph.update(desired_users, self.desired_roles, usernames)
+        
+        secrets_cached = Config.RECONCILE_PASSWORDS and self.refresh_secret_cache()
+        previous_state = self.state_manager.load_state()
+        try:
+            with self.metrics.time_phase("catalog_snapshot"):
+                snapshot = self.db_client.fetch_catalog_snapshot(usernames)
+        except Exception as e:
+            logger.error(f"Failed to fetch catalog snapshot: {e}")
+            stats.errors += 1
+            return
+        
+        self.apply_drift(desired_users, snapshot.users & usernames, previous_state, snapshot, stats,
+                         dry_run=dry_run, secrets_cached=secrets_cached, prune=False,
+                         role_graph=self.role_graph if self._role_graph_synced and not sharded else None)
+        if dry_run:
+            return
+        
+        # Users queued for a retry keep their last applied spec
+        updates = {username: desired_users.get(username) for username in usernames}
+        for username in usernames & set(self.queue.keys()):
+            updates[username] = previous_state.get(username)
+        with self.metrics.time_phase("state_save"):
+            self.state_manager.save_users(updates)
+        # The next full cycle must not be short-circuited against the old catalog
+        self._last_fingerprint = None
+        self.publish_user_status(resources)
+    
+    def fetch_privilege_indexes(self, desired_users: Dict[str, UserSpec],
+                                usernames: Set[str]) -> Dict[str, Tuple[PrivilegeIndex, Set[str]]]:
+        """
+        Load the ACLs of the managed objects in each user's own database, concurrently
+        
+        Tables and schemas are resolved in the database a user connects to,
+        so every database is read through its own client, in one round trip.
+        
+        Args:
+            desired_users: Desired user specifications
+            usernames: Existing users to compare
+            
+        Returns:
+            (PrivilegeIndex, users to compare against it) per database
+        """
+        by_database: Dict[str, Set[str]] = {}
+        for username in usernames:
+            by_database.setdefault(desired_users[username].database, set()).add(username)
+        indexes = self.db_client.map_databases(
+            lambda client, names: client.fetch_privilege_index(
+                self.privilege_targets({name: desired_users[name] for name in names})),
+            by_database
+        )
+        return {database: (indexes[database], names) for database, names in by_database.items()}
     
-    def update_user_roles(self, username: str, old_roles: Set[str], new_roles: Set[str], dry_run: bool = False):
+    def apply_drift(self, desired_users: Dict[str, UserSpec], actual_users: Set[str], previous_state: Mapping,
+                    snapshot: CatalogSnapshot, stats: ReconciliationStats, dry_run: bool = False,
+                    secrets_cached: bool = False, scope: Optional[Set[str]] = None,
+                    prune: bool = True, role_graph: Optional[RoleGraph] = None) -> List[UserOperation]:
         """
-        Update user role memberships
+        Plan and apply role, user, password and privilege changes
         
         Args:
-            username: Username to update
-            old_roles: Current roles
-            new_roles: Desired roles
-            dry_run: If True, only log the action without executing
+            desired_users: Desired user specifications
+            actual_users: Existing roles that may be managed
+            previous_state: Last applied user specifications
+            snapshot: Catalog snapshot of the current cycle
+            stats: Statistics object to update
+            dry_run: If True, only simulate actions
+            secrets_cached: Whether the Secret cache is usable for this cycle
+            scope: If given, only these users are diffed
+            prune: Whether the password checks cover every existing user
+            role_graph: Role graph of the whole desired state (built from desired_users if omitted)
+            
+        Returns:
+            Applied operations
         """
-        to_revoke = old_roles - new_roles
-        to_grant = new_roles - old_roles
+        # Missing roles are created first, in the same plan
+        operations = self.plan_role_operations(desired_users, snapshot, graph=role_graph, stats=stats)
         
-        if not to_revoke and not to_grant:
-            return
+        # Detect drift
+        users_to_create, users_to_delete, users_to_update = self.detect_drift(
+            desired_users, actual_users
+        )
+        if scope is not None:
+            users_to_create, users_to_delete, users_to_update = (
+                users_to_create & scope, users_to_delete & scope, users_to_update & scope
+            )
         
-        if dry_run:
-            if to_revoke:
-                logger.info(f"[DRY-RUN] Would revoke roles from {username}: {to_revoke}")
-            if to_grant:
-                logger.info(f"[DRY-RUN] Would grant roles to {username}: {to_grant}")
+        use_cache = secrets_cached or (bool(users_to_create) and self.refresh_secret_cache())
+        
+        def get_password(username: str) -> Optional[str]:
+            if use_cache:
+                return self.secret_cache.get_password(username)
+            return self.k8s_client.get_user_password(username, Config.NAMESPACE)
+        
+        skipped: Set[str] = set()
+        operations += self.plan_user_operations(
+            desired_users, previous_state, snapshot,
+            (users_to_create, users_to_delete, users_to_update),
+            get_password, stats, skipped, role_graph=role_graph
+        )
+        
+        # Only a full cycle sees every member of a role
+        if Config.DROP_UNUSED_ROLES and prune and role_graph is not None:
+            dropped = {op.username for op in operations if op.kind == "drop"}
+            operations += self.plan_role_cleanup(desired_users, snapshot, role_graph, dropped)
+        
+        # Per-user Secret reads would cost one API call per user, so passwords need the cache
+        if secrets_cached and users_to_update:
+            with self.metrics.time_phase("password_check"):
+                operations += self.plan_password_operations(
+                    desired_users, snapshot, users_to_update,
+                    self.secret_cache.get_password, self.secret_cache.version_of,
+                    prune=prune and scope is None
+                )
+        
+        # Compare direct privileges of the existing users against their ACL entries
+        if Config.RECONCILE_PRIVILEGES and users_to_update:
+            try:
+                with self.metrics.time_phase("privilege_snapshot"):
+                    indexes = self.fetch_privilege_indexes(desired_users, users_to_update)
+                for index, usernames in indexes.values():
+                    operations += self.plan_privilege_operations(desired_users, index, usernames)
+            except Exception as e:
+                logger.error(f"Failed to fetch object privileges: {e}")
+                stats.errors += 1
+        
+        # Users backing off after a failure wait for their own retry
+        retries: List[str] = []
+        if not dry_run:
+            operations, retries = self.admit_operations(operations, stats)
+        
+        # One plan per cycle: a dry run reports it, a live run executes it
+        with self.metrics.time_phase("plan"):
+            plan = self.executor.plan(operations)
+        self.report_plan(plan, dry_run)
+        results = self.apply_operations(plan, stats, dry_run=dry_run)
+        actual_drift_count = self.count_results(results, stats, snapshot=None if dry_run else snapshot)
+        if not dry_run:
+            self.record_outcomes(results, skipped, retries)
+            if role_graph is not None:
+                for result in results:
+                    if result.kind == "drop_role":
+                        for role in result.succeeded:
+                            role_graph.forget(role)
+        
+        # Log drift only if actual changes were needed
+        if actual_drift_count > 0:
+            logger.info(f"{YELLOW}Drift detected: {actual_drift_count} changes needed{RESET}")
+        else:
+            logger.info(f"{GREEN}No drift detected - system in desired state{RESET}")
+        
+        stats.drift_detected = actual_drift_count
+        return operations
+    
+    def plan_role_cleanup(self, desired_users: Dict[str, UserSpec], snapshot: CatalogSnapshot,
+                          graph: RoleGraph, dropped: Set[str]) -> List[UserOperation]:
+        """
+        Plan drops of group roles that lost their last reference in the desired state
+        
+        Only the graph's orphans are considered, so the cost does not depend
+        on the number of roles. A role that still has members the controller
+        does not manage is kept, and checked again next cycle.
+        
+        Args:
+            desired_users: Desired user specifications
+            snapshot: Catalog snapshot of the current cycle
+            graph: Role graph of the whole desired state
+            dropped: Users dropped in this cycle
+            
+        Returns:
+            drop_role operations
+        """
+        operations = []
+        for role in sorted(graph.orphans):
+            if snapshot.roles.get(role, True) or role in desired_users:
+                # Already gone, or a login role that is not ours to drop
+                graph.forget(role)
+                continue
+            unmanaged = [member for member in snapshot.members_of.get(role, ())
+                         if member not in dropped and member not in desired_users and member not in graph.declared]
+            if unmanaged:
+                logger.debug(f"Keeping unused role {role}: still granted to {', '.join(sorted(unmanaged)[:5])}")
+                continue
+            operations.append(UserOperation("drop_role", role))
+        return operations
+    
+    def report_plan(self, plan: ReconcilePlan, dry_run: bool):
+        """
+        Publish a cycle's plan: summarized in the log of a dry run, in full to PLAN_OUTPUT
+        
+        Args:
+            plan: Plan of the cycle
+            dry_run: Whether the plan is only reported
+        """
+        self.last_plan = plan
+        totals = plan.totals()
+        if dry_run and totals["operations"]:
+            logger.info(f"[DRY-RUN] Plan: {totals['operations']} operations in {totals['batches']} batches, "
+                        f"~{totals['statements']} statements, {totals['locks']} locks, "
+                        f"{totals['owned_objects']} owned objects, ~{totals['estimated_seconds']:.2f}s")
+        if not Config.PLAN_OUTPUT:
             return
+        name = getattr(self, "name", None)
+        path = Path(cluster_state_file(name, Config.PLAN_OUTPUT) if name else Config.PLAN_OUTPUT)
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            tmp_path.write_text(plan.to_json(
+                cluster=name, dry_run=dry_run, generated_at=datetime.now(timezone.utc).isoformat()))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing plan to {path}: {e}")
+    
+    def user_status(self, resource: UserResource, owner: str) -> dict:
+        """
+        Status of a PostgreSQLUser after its user was reconciled
+        
+        Args:
+            resource: Cached object
+            owner: Name of the object whose definition of the username is applied
+            
+        Returns:
+            Status subresource content
+        """
+        username = resource.spec.username
+        if owner != resource.name:
+            phase, message = "Conflict", f"User {username} is already defined by {owner}"
+        elif username in self.queue:
+            phase = "Retrying"
+            message = f"Reconciliation failed {self.queue.num_requeues(username)} times, retrying with backoff"
+        else:
+            phase, message = "Ready", ""
+        return {"observedGeneration": resource.generation, "phase": phase, "message": message}
+    
+    def publish_user_status(self, resources: List[UserResource]):
+        """
+        Write back the status of reconciled PostgreSQLUser objects
+        
+        The API has no multi-object patch, so the batch is one merge patch per
+        object whose status actually changes; unchanged objects cost nothing.
+        
+        Args:
+            resources: Reconciled objects, sorted by name
+        """
+        owners: Dict[str, str] = {}
+        for resource in resources:
+            owners.setdefault(resource.spec.username, resource.name)
+        for resource in resources:
+            username = resource.spec.username
+            if self.coordinator is not None and self.coordinator.sharded and not self.coordinator.owns(username):
+                continue
+            status = self.user_status(resource, owners[username])
+            if all(resource.status.get(key) == value for key, value in status.items()):
+                continue
+            try:
+                self.k8s_client.patch_user_status(resource.name, Config.NAMESPACE, status)
+            except ApiException as e:
+                logger.warning(f"Failed to update status of PostgreSQLUser {resource.name}: {e.status}")
+                continue
+            self.user_cache.record_status(resource.name, resource.version, status)
+            self.metrics.status_patches_count += 1
+    
+    def run_cycle(self, reason: str = "periodic sync", usernames: Optional[Set[str]] = None) -> ReconciliationStats:
+        """
+        Run a single reconciliation cycle and record its metrics
+        
+        Args:
+            reason: What triggered the cycle (for logging)
+            usernames: If given, reconcile only these PostgreSQLUser users
+            
+        Returns:
+            Statistics of the cycle
+        """
+        stats = ReconciliationStats(start_time=datetime.now())
+        Retrier.start_cycle()
         
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                for role in to_revoke:
-                    cur.execute(
-                        sql.SQL("REVOKE {} FROM {};").format(
-                            sql.Identifier(role),
-                            sql.Identifier(username)
-                        )
-                    )
-                    logger.info(f"  ↳ Revoked role {role} from {username}")
-                
-                for role in to_grant:
-                    cur.execute(
-                        sql.SQL("GRANT {} TO {};").format(
-                            sql.Identifier(role),
-                            sql.Identifier(username)
-                        )
-                    )
-                    logger.info(f"  ↳ Granted role {role} to {username}")
-                
-                conn.commit()
-                logger.info(f"{WHITE}Updated roles for user: {username}{RESET}")
-        except psycopg2.Error as e:
-            logger.error(f"Error updating roles for user {username}: {e}")
-            if conn:
-                conn.rollback()
-            raise
-        finally:
-            if conn:
-                self.return_connection(conn)
+            logger.info("=" * 60)
+            cluster = f", cluster {self.name}" if self.name else ""
+            logger.info(f"Starting reconciliation cycle ({reason}{cluster})")
+            
+            self.reconcile_users(stats, dry_run=Config.DRY_RUN, usernames=usernames)
+            
+            stats.end_time = datetime.now()
+            if stats.standby:
+                return stats
+            self.metrics.record_reconciliation(stats)
+            
+            if stats.short_circuited:
+                logger.info(f"  • Short-circuited in {stats.duration_seconds():.3f}s")
+                return stats
+            
+            self.log_summary(stats)
+            
+        except Exception as e:
+            logger.error(f"Unexpected error in reconciliation loop: {e}", exc_info=True)
+            stats.errors += 1
+            stats.end_time = datetime.now()
+            self.metrics.record_reconciliation(stats)
+        
+        return stats
     
-    def drop_user(self, username: str, dry_run: bool = False):
+    def run_reconciliation_loop(self):
         """
-        Drop a PostgreSQL user and clean up all dependencies
+        Main control loop that runs continuously
+        """
+        logger.info(f"{GREEN}Controller started (DRY_RUN={Config.DRY_RUN}){RESET}")
+        logger.info(f"Sync interval: {Config.SYNC_INTERVAL}s")
+        
+        while True:
+            self.run_cycle()
+            
+            # Sleep until next cycle, or until a failed user is due for a retry
+            sleep_time = self.next_wakeup(Config.SYNC_INTERVAL)
+            logger.info(f"{BLUE}Sleeping for {sleep_time:.1f}s...{RESET}")
+            time.sleep(sleep_time)
+    
+    def handle_watch_event(self, kind: str, event_type: str, name: Optional[str]):
+        """
+        Watch callback: request a reconciliation as soon as possible
         
         Args:
-            username: Username to drop
-            dry_run: If True, only log the action without executing
+            kind: Resource kind of the event
+            event_type: ADDED, MODIFIED, DELETED or RELIST
+            name: Name of the changed object (None for relists)
         """
-        if dry_run:
-            logger.info(f"[DRY-RUN] Would drop user: {username}")
+        self.metrics.secrets_cached = len(self.secret_cache)
+        if event_type == "RELIST":
+            self.metrics.watch_relists_count += 1
+        else:
+            self.metrics.watch_events_count += 1
+            logger.info(f"Watch event: {event_type} {kind}/{name}")
+        if kind == "secret" and name:
+            # A changed Secret may fix a user that is backing off: retry it now
+            for username in self.queue.keys():
+                if secret_name_for_user(username) == name:
+                    self.queue.add(username)
+        if kind != "postgresqluser" or event_type == "RELIST":
+            with self._dirty_lock:
+                self._full_pending = True
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._trigger.set()
+    
+    def handle_drift_notification(self, database: str, payload: Optional[str]):
+        """
+        Drift listener callback: reconcile the users a hand-made change concerns
+        
+        Args:
+            database: Database the change was made in
+            payload: Notification payload, or None if notifications may have been missed
+        """
+        if payload is not None:
+            self.metrics.drift_notifications_count += 1
+        users = self.drift_index.users_of(payload) if payload is not None and self.drift_index else None
+        if users is None:
+            logger.info(f"Drift reported in {database} that cannot be attributed, running a full cycle")
+            with self._dirty_lock:
+                self._full_pending = True
+        elif not users:
             return
+        else:
+            logger.info(f"Drift reported in {database} for {', '.join(sorted(users)[:10])}")
+            self.mark_users_changed(users)
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._trigger.set()
+    
+    def mark_users_changed(self, usernames: Set[str]):
+        """Queue users for a single-user reconcile"""
+        with self._dirty_lock:
+            self._dirty_users.update(usernames)
+    
+    def handle_user_object(self, event_type: str, obj: dict) -> bool:
+        """
+        PostgreSQLUser watch callback: update the cache and note the changed users
+        
+        Returns:
+            False for status-only updates, which need no reconcile
+        """
+        changed = self.user_cache.apply_event(event_type, obj)
+        self.mark_users_changed(changed)
+        return bool(changed)
+    
+    def desired_state_watcher(self, on_event, on_object=None) -> ResourceWatcher:
+        """Watcher of the desired state source: the users ConfigMap(s) or PostgreSQLUser objects"""
+        if Config.USERS_SOURCE == "crd":
+            return self.k8s_client.user_watcher(
+                Config.NAMESPACE,
+                on_event,
+                on_list=self.user_cache.load,
+                on_object=on_object or self.handle_user_object
+            )
+        return self.k8s_client.configmap_watcher(Config.CONFIGMAP_NAME, Config.NAMESPACE, on_event)
+    
+    def start_watchers(self):
+        """Start watching the desired state source, user Secrets and, with DRIFT_NOTIFY, the database"""
+        self._watchers = [
+            self.desired_state_watcher(self.handle_watch_event),
+            self.k8s_client.secret_watcher(
+                Config.NAMESPACE,
+                self.handle_watch_event,
+                on_list=self.secret_cache.load,
+                on_object=self.secret_cache.apply_event
+            ),
+        ]
+        for watcher in self._watchers:
+            watcher.start()
+        self.secret_cache.watched = True
+        self.user_cache.watched = True
+        if Config.DRIFT_NOTIFY:
+            self.drift_listener = DriftListener(self.db_client, self.handle_drift_notification)
+            if self.drift_index is not None:
+                self.drift_listener.watch(self.drift_index.databases)
+            self.drift_listener.start()
+    
+    def stop_watchers(self):
+        """Stop all running watchers"""
+        for watcher in self._watchers:
+            watcher.stop()
+        self._watchers = []
+        if self.drift_listener is not None:
+            self.drift_listener.stop()
+            self.drift_listener = None
+        self.secret_cache.watched = False
+        self.user_cache.watched = False
+    
+    def run_watch_loop(self, stop_event: Optional[threading.Event] = None):
+        """
+        Event-driven control loop
+        
+        Reconciles shortly after any change to the ConfigMap or user Secrets
+        (or, with DRIFT_NOTIFY, a hand-made privilege change reported by the
+        database), and falls back to a full resync every RESYNC_INTERVAL seconds.
+        
+        Args:
+            stop_event: Optional event used to end the loop (tests/benchmarks)
+        """
+        logger.info(f"{GREEN}Controller started in watch mode (DRY_RUN={Config.DRY_RUN}){RESET}")
+        logger.info(f"Resync interval: {Config.RESYNC_INTERVAL}s")
+        
+        stop_event = stop_event or threading.Event()
+        self.start_watchers()
+        # Always reconcile once on startup
+        self._trigger.set()
         
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                # Revoke all privileges
-                cur.execute(
-                    sql.SQL("REVOKE ALL PRIVILEGES ON DATABASE {} FROM {};").format(
-                        sql.Identifier(Config.DB_NAME),
-                        sql.Identifier(username)
-                    )
-                )
-                
-                # Reassign owned objects
-                cur.execute(
-                    sql.SQL("REASSIGN OWNED BY {} TO {};").format(
-                        sql.Identifier(username),
-                        sql.Identifier(Config.DB_USER)
-                    )
-                )
-                
-                # Drop owned objects
-                cur.execute(
-                    sql.SQL("DROP OWNED BY {};").format(
-                        sql.Identifier(username)
-                    )
-                )
-                
-                # Drop the user
-                cur.execute(
-                    sql.SQL("DROP USER IF EXISTS {};").format(
-                        sql.Identifier(username)
-                    )
-                )
-                
-                conn.commit()
-                logger.info(f"{WHITE}Dropped user: {username}{RESET}")
-        except psycopg2.Error as e:
-            logger.error(f"Error dropping user {username}: {e}")
-            if conn:
-                conn.rollback()
-            raise
+            while not stop_event.is_set():
+                self.run_when_triggered(Config.RESYNC_INTERVAL, stop_event, debounce=Config.WATCH_DEBOUNCE_SECONDS)
         finally:
-            if conn:
-                self.return_connection(conn)
+            self.stop_watchers()
+    
+    def run_when_triggered(self, timeout: float, stop_event: threading.Event, debounce: float = 0.0,
+                           timeout_reason: str = "periodic resync") -> Optional[ReconciliationStats]:
+        """
+        Wait for a trigger (or the timeout) and run one cycle
+        
+        Args:
+            timeout: Maximum seconds to wait for a trigger
+            stop_event: Event ending the wait without running a cycle
+            debounce: Seconds to wait after a trigger to coalesce bursts
+            timeout_reason: Cycle reason logged when the timeout expired
+            
+        Returns:
+            Statistics of the cycle, or None if stopped
+        """
+        wait = self.next_wakeup(timeout)
+        triggered = self._trigger.wait(timeout=wait)
+        if stop_event.is_set():
+            return None
+        
+        if triggered:
+            # Coalesce bursts of events (e.g. an ArgoCD sync touching many Secrets)
+            time.sleep(debounce)
+            reason = "watch event" if self._pending_since is not None else "startup"
+        else:
+            reason = "retry" if wait < timeout else timeout_reason
+        
+        # Clear before running so events during the cycle trigger another one
+        self._trigger.clear()
+        pending_since, self._pending_since = self._pending_since, None
+        with self._dirty_lock:
+            usernames, self._dirty_users = self._dirty_users, set()
+            full = self._full_pending or not triggered or not usernames
+            self._full_pending = False
+        
+        # PostgreSQLUser changes alone only need their own users reconciled
+        stats = self.run_cycle(reason) if full else self.run_cycle(reason, usernames=usernames)
+        
+        if pending_since is not None:
+            self.metrics.last_event_to_applied_seconds = time.monotonic() - pending_since
+        return stats
+    
+    def is_ready(self) -> bool:
+        """Ready once the first reconciliation cycle has completed, or while standing by"""
+        if self.coordinator is not None and not self.coordinator.is_active():
+            return True
+        return self.metrics.reconciliation_count > 0
+    
+    def handle_coordination_change(self):
+        """Leadership or shard membership changed: reconcile the new share in full"""
+        self._last_fingerprint = None
+        with self._dirty_lock:
+            self._full_pending = True
+        self._trigger.set()
+    
+    def export_prometheus(self) -> str:
+        """Export this controller's metrics"""
+        return self.metrics.export_prometheus()
+    
+    def stop(self):
+        """Wake up the watch loop so it can observe its stop event"""
+        self._trigger.set()
+    
+    def cleanup(self):
+        """Cleanup resources"""
+        logger.info("Shutting down controller...")
+        self.db_client.close()
+        self.state_manager.close()
+
+
+# ============================================================================
+# MULTI-CLUSTER
+# ============================================================================
+
+def cluster_state_file(cluster: str, state_file: Optional[str] = None) -> str:
+    """Per-cluster state file path (users_state.json -> users_state.<cluster>.json)"""
+    root, ext = os.path.splitext(state_file or Config.STATE_FILE)
+    return f"{root}.{cluster}{ext or '.json'}"
+
+
+def label_metrics(text: str, labels: Dict[str, str]) -> str:
+    """
+    Add labels to every sample of a Prometheus text export
+    
+    Args:
+        text: Prometheus text format
+        labels: Labels to prepend to each sample
+        
+    Returns:
+        Prometheus text with the labels injected
+    """
+    extra = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    lines = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            lines.append(line)
+            continue
+        name, _, rest = line.partition(" ")
+        if "{" in name:
+            metric, _, existing = name.partition("{")
+            name = f"{metric}{{{extra},{existing}"
+        else:
+            name = f"{name}{{{extra}}}"
+        lines.append(f"{name} {rest}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_metric_families(texts: List[str]) -> str:
+    """
+    Merge Prometheus text exports so each family's HELP/TYPE appears once
+    
+    Args:
+        texts: Prometheus text exports with distinct label sets
+        
+    Returns:
+        Single Prometheus text export
+    """
+    families: Dict[str, List[str]] = {}
+    headers: Dict[str, List[str]] = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                header = headers.setdefault(family, [])
+                if len(header) < 2 and line not in header:
+                    header.append(line)
+                families.setdefault(family, [])
+            elif line and not line.startswith("#"):
+                name = line.split("{", 1)[0].split(" ", 1)[0]
+                families.setdefault(family or name, []).append(line)
+    blocks = ["\n".join(headers.get(family, []) + samples) for family, samples in families.items()]
+    return "\n\n".join(blocks) + "\n"
+
+
+class MultiClusterController:
+    """
+    Reconcile the same desired users into several Postgres clusters
+    
+    The ConfigMap, user Secrets and watchers are shared; each cluster gets its
+    own PostgresUserController, connection pool, state file and thread, so a
+    slow or unreachable cluster never delays the others.
+    """
+    
+    # Families recorded by the shared Kubernetes client, exported without a cluster label
+    SHARED_HISTOGRAMS = ("postgres_controller_kube_api_duration_seconds",)
+    
+    def __init__(self, targets: Optional[List[ClusterTarget]] = None,
+                 k8s_client: Optional[KubernetesClient] = None,
+                 db_client_factory=DatabaseClient,
+                 coordinator: Optional[ReplicaCoordinator] = None):
+        self.k8s_client = k8s_client or KubernetesClient()
+        # Kubernetes API calls are shared by all clusters, so they are timed here
+        # rather than by whichever child attaches its metrics first
+        self.metrics = Metrics()
+        self.k8s_client.metrics = self.metrics
+        self.coordinator = coordinator
+        self.static_targets = parse_cluster_targets(Config.DB_CLUSTERS) if targets is None else targets
+        self.db_client_factory = db_client_factory
+        self.secret_cache = SecretCache()
+        self.user_cache = UserResourceCache()
+        self.children: Dict[str, PostgresUserController] = {}
+        self._clusters: Dict[str, Tuple[threading.Thread, threading.Event]] = {}
+        self._watchers: List[ResourceWatcher] = []
+        self._lock = threading.Lock()
+        logger.info("Multi-cluster controller initialized")
+    
+    def resolve_targets(self) -> List[ClusterTarget]:
+        """
+        Static DB_CLUSTERS targets plus discovered clusters (static entries win)
+        
+        Returns:
+            List of cluster targets
+        """
+        targets = {target.name: target for target in self.static_targets}
+        if Config.DISCOVER_CLUSTERS:
+            try:
+                for target in self.k8s_client.discover_clusters(Config.CLUSTER_NAMESPACE or None):
+                    targets.setdefault(target.name, target)
+            except Exception as e:
+                logger.error(f"Cluster discovery failed, keeping current clusters: {e}")
+                with self._lock:
+                    for name in self._clusters:
+                        targets.setdefault(name, ClusterTarget(name, ""))
+        return list(targets.values())
     
-    def _grant_privileges(self, cursor, user_spec: UserSpec):
+    def sync_targets(self, targets: List[ClusterTarget]):
         """
-        Grant additional privileges to a user
+        Start threads for new clusters and stop those that disappeared
         
         Args:
-            cursor: Database cursor
-            user_spec: User specification with privileges
+            targets: Clusters that should be reconciled
         """
-        if not user_spec.privileges:
-            return
+        wanted = {target.name: target for target in targets}
+        with self._lock:
+            removed = [name for name in self._clusters if name not in wanted]
+            added = [target for name, target in wanted.items() if name not in self._clusters]
         
-        for object_type, privileges_list in user_spec.privileges.items():
-            for privilege in privileges_list:
-                # This is a simplified example - expand based on your needs
-                cursor.execute(
-                    sql.SQL("GRANT {} ON {} TO {};").format(
-                        sql.SQL(privilege),
-                        sql.Identifier(object_type),
-                        sql.Identifier(user_spec.username)
-                    )
-                )
-    
-    def close(self):
-        """Close the connection pool"""
-        if self.connection_pool:
-            self.connection_pool.closeall()
-            logger.info("Database connection pool closed")
-
-
-# ============================================================================
-# STATE MANAGER
-# ============================================================================
-
-class StateManager:
-    """Manages persistent state for drift detection"""
+        for name in removed:
+            logger.info(f"{YELLOW}Cluster {name} is gone, stopping its reconciler{RESET}")
+            self.stop_cluster(name)
+        for target in added:
+            params = target.connection_params()
+            logger.info(f"{GREEN}Reconciling cluster {target.name} ({params['host']}:{params['port']}){RESET}")
+            stop_event = threading.Event()
+            thread = threading.Thread(target=self._run_cluster, args=(target, stop_event),
+                                      name=f"cluster-{target.name}", daemon=True)
+            with self._lock:
+                self._clusters[target.name] = (thread, stop_event)
+            thread.start()
     
-    def __init__(self, state_file: str):
-        self.state_file = Path(state_file)
-        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+    def stop_cluster(self, name: str, join: bool = False):
+        """Stop the reconciler thread of one cluster"""
+        with self._lock:
+            thread, stop_event = self._clusters.pop(name, (None, None))
+            child = self.children.get(name)
+        if stop_event is None:
+            return
+        stop_event.set()
+        if child:
+            child.stop()
+        if join:
+            thread.join(timeout=Config.WATCH_TIMEOUT_SECONDS)
     
-    def load_state(self) -> Dict[str, UserSpec]:
-        """
-        Load last applied state from disk
+    def _run_cluster(self, target: ClusterTarget, stop_event: threading.Event):
+        """Per-cluster thread: connect, then reconcile on every trigger or interval"""
+        db_client = None
+        while db_client is None and not stop_event.is_set():
+            try:
+                db_client = self.db_client_factory(target)
+            except Exception as e:
+                logger.error(f"{RED}Cannot connect to cluster {target.name}: {e}{RESET}")
+                stop_event.wait(Config.SYNC_INTERVAL)
+        if db_client is None:
+            return
         
-        Returns:
-            Dictionary mapping username to UserSpec
-        """
-        if not self.state_file.exists():
-            logger.info("No previous state file found, starting fresh")
-            return {}
+        controller = PostgresUserController(
+            k8s_client=self.k8s_client,
+            db_client=db_client,
+            state_manager=create_state_manager(cluster_state_file(target.name)),
+            name=target.name,
+            coordinator=self.coordinator
+        )
+        controller.secret_cache = self.secret_cache
+        controller.user_cache = self.user_cache
+        with self._lock:
+            self.children[target.name] = controller
         
+        watch_mode = Config.RECONCILE_MODE == "watch"
+        timeout = Config.RESYNC_INTERVAL if watch_mode else Config.SYNC_INTERVAL
+        controller._trigger.set()
         try:
-            with open(self.state_file, 'r') as f:
-                data = json.load(f)
-                return {
-                    username: UserSpec(**spec)
-                    for username, spec in data.items()
-                }
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Error loading state file: {e}, starting fresh")
-            return {}
+            while not stop_event.is_set():
+                controller.run_when_triggered(
+                    timeout, stop_event,
+                    debounce=Config.WATCH_DEBOUNCE_SECONDS if watch_mode else 0.0,
+                    timeout_reason="periodic resync" if watch_mode else "scheduled"
+                )
+        finally:
+            with self._lock:
+                self.children.pop(target.name, None)
+            controller.cleanup()
     
-    def save_state(self, users: Dict[str, UserSpec]):
+    def handle_watch_event(self, kind: str, event_type: str, name: Optional[str]):
+        """Fan a watch event out to every cluster reconciler"""
+        with self._lock:
+            children = list(self.children.values())
+        for child in children:
+            child.handle_watch_event(kind, event_type, name)
+    
+    def handle_user_object(self, event_type: str, obj: dict) -> bool:
+        """Apply a PostgreSQLUser event to the shared cache and fan the changed users out"""
+        changed = self.user_cache.apply_event(event_type, obj)
+        with self._lock:
+            children = list(self.children.values())
+        for child in children:
+            child.mark_users_changed(changed)
+        return bool(changed)
+    
+    def handle_coordination_change(self):
+        """Fan a leadership or shard membership change out to every cluster reconciler"""
+        with self._lock:
+            children = list(self.children.values())
+        for child in children:
+            child.handle_coordination_change()
+    
+    def start_watchers(self):
+        """Start one desired state and one Secret watcher shared by all clusters"""
+        if Config.USERS_SOURCE == "crd":
+            desired_watcher = self.k8s_client.user_watcher(
+                Config.NAMESPACE,
+                self.handle_watch_event,
+                on_list=self.user_cache.load,
+                on_object=self.handle_user_object
+            )
+        else:
+            desired_watcher = self.k8s_client.configmap_watcher(
+                Config.CONFIGMAP_NAME,
+                Config.NAMESPACE,
+                self.handle_watch_event
+            )
+        self._watchers = [
+            desired_watcher,
+            self.k8s_client.secret_watcher(
+                Config.NAMESPACE,
+                self.handle_watch_event,
+                on_list=self.secret_cache.load,
+                on_object=self.secret_cache.apply_event
+            ),
+        ]
+        for watcher in self._watchers:
+            watcher.start()
+        self.secret_cache.watched = True
+        self.user_cache.watched = True
+    
+    def stop_watchers(self):
+        """Stop the shared watchers"""
+        for watcher in self._watchers:
+            watcher.stop()
+        self._watchers = []
+        self.secret_cache.watched = False
+        self.user_cache.watched = False
+    
+    def run(self, stop_event: Optional[threading.Event] = None):
         """
-        Save current state to disk
+        Run all cluster reconcilers, re-discovering clusters periodically
         
         Args:
-            users: Dictionary mapping username to UserSpec
+            stop_event: Optional event used to end the loop (tests/benchmarks)
         """
+        logger.info(f"{GREEN}Multi-cluster controller started (DRY_RUN={Config.DRY_RUN}, "
+                    f"mode={Config.RECONCILE_MODE}){RESET}")
+        stop_event = stop_event or threading.Event()
+        if Config.RECONCILE_MODE == "watch":
+            self.start_watchers()
         try:
-            data = {
-                username: asdict(spec)
-                for username, spec in users.items()
-            }
-            with open(self.state_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            logger.debug(f"State saved to {self.state_file}")
-        except IOError as e:
-            logger.error(f"Error saving state file: {e}")
+            while not stop_event.is_set():
+                self.sync_targets(self.resolve_targets())
+                stop_event.wait(Config.CLUSTER_DISCOVERY_INTERVAL)
+        finally:
+            self.stop_watchers()
+            self.cleanup()
+    
+    def is_ready(self) -> bool:
+        """Ready once every cluster has completed a cycle"""
+        with self._lock:
+            children = list(self.children.values())
+            expected = len(self._clusters)
+        return expected > 0 and len(children) == expected and all(c.is_ready() for c in children)
+    
+    def export_prometheus(self) -> str:
+        """Export metrics of all clusters with a cluster label, then those of the shared clients"""
+        with self._lock:
+            children = dict(self.children)
+        return merge_metric_families([
+            label_metrics(child.metrics.export_prometheus(), {"cluster": name})
+            for name, child in sorted(children.items())
+        ] + [self.metrics._export_histograms(self.SHARED_HISTOGRAMS)])
+    
+    def cleanup(self):
+        """Stop all cluster reconcilers"""
+        with self._lock:
+            names = list(self._clusters)
+        for name in names:
+            self.stop_cluster(name, join=True)
 
 
 # ============================================================================
-# RECONCILIATION CONTROLLER
+# ASYNCIO ENGINE
 # ============================================================================
 
-class PostgresUserController:
+def quote_ident(name: str) -> str:
+    """Quote an SQL identifier (for drivers without client-side composition)"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: str) -> str:
+    """Quote an SQL string literal as an escape string"""
+    return "E'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def render_statement(statement: sql.Composable, params: Optional[tuple] = None) -> str:
     """
-    Main controller for reconciling PostgreSQL users and roles
+    Render a StatementBuilder statement as plain SQL for asyncpg
+    
+    Utility statements take no bind parameters, so %s placeholders (the
+    passwords) are inlined as escape-string literals, like psycopg2 does
+    client-side.
+    
+    Args:
+        statement: sql.Composed built from SQL and Identifier parts
+        params: Values of the %s placeholders, in order
     """
+    values = iter(params or ())
+    
+    def render(part: sql.Composable) -> str:
+        if isinstance(part, sql.Composed):
+            return "".join(render(child) for child in part.seq)
+        if isinstance(part, sql.Identifier):
+            return ".".join(quote_ident(name) for name in part.strings)
+        if isinstance(part, sql.SQL):
+            return re.sub(r"%[s%]", lambda m: "%" if m.group() == "%%" else quote_literal(next(values)), part.string)
+        raise TypeError(f"Cannot render {part!r}")
+    
+    return render(statement)
+
+
+class AsyncKubernetesClient:
+    """Kubernetes API interactions on kubernetes_asyncio"""
     
     def __init__(self):
-        self.k8s_client = KubernetesClient()
-        self.db_client = DatabaseClient()
-        self.state_manager = StateManager(Config.STATE_FILE)
-        self.metrics = Metrics()
-        logger.info("PostgreSQL User Controller initialized")
+        self.api = None
+        self.v1 = None
+    
+    async def connect(self):
+        """Load cluster configuration and create the API client"""
+        try:
+            async_config.load_incluster_config()
+        except async_config.ConfigException:
+            logger.warning("Failed to load in-cluster config, trying local kubeconfig")
+            await async_config.load_kube_config()
+        self.api = async_client.ApiClient()
+        self.v1 = async_client.CoreV1Api(self.api)
+    
+    async def list_user_configmaps(self, namespace: str, label_selector: str) -> List[ConfigMapShard]:
+        """List all desired state shards in a single API call"""
+        result = await self.v1.list_namespaced_config_map(namespace, label_selector=label_selector)
+        return [configmap_shard(item) for item in result.items or []]
+    
+    async def fetch_configmap(self, name: str, namespace: str) -> Optional[Union[str, bytes]]:
+        """Fetch users.yaml (or a current sidecar of it) from the ConfigMap, None if it does not exist"""
+        try:
+            cm = await self.v1.read_namespaced_config_map(name, namespace)
+            return select_desired_document(cm.data, cm.binary_data)
+        except async_client.ApiException as e:
+            if e.status == 404:
+                logger.warning(f"ConfigMap {name} not found in namespace {namespace}")
+                return None
+            raise
+    
+    async def list_user_secrets(self, namespace: str) -> Tuple[list, str]:
+        """List all user-*-secret Secrets in a single API call"""
+        kwargs = {"label_selector": Config.SECRET_LABEL_SELECTOR} if Config.SECRET_LABEL_SELECTOR else {}
+        result = await self.v1.list_namespaced_secret(namespace, **kwargs)
+        items = [item for item in result.items or [] if is_user_secret_name(item.metadata.name)]
+        return items, result.metadata.resource_version
+    
+    async def close(self):
+        if self.api:
+            await self.api.close()
+
+
+class AsyncDatabaseClient(StatementBuilder):
+    """PostgreSQL interactions on an asyncpg connection pool"""
     
-    def parse_desired_users(self, yaml_content: str) -> Dict[str, UserSpec]:
+    def __init__(self, target: Optional[ClusterTarget] = None):
         """
-        Parse users.yaml content into UserSpec objects
-        
         Args:
-            yaml_content: YAML string from ConfigMap
-            
-        Returns:
-            Dictionary mapping username to UserSpec
+            target: Cluster to connect to (default: the global DB_* settings)
         """
-        if not yaml_content:
-            logger.warning("Empty ConfigMap content, no users to manage")
-            return {}
+        self.target = target
+        self.pool = None
+    
+    def connection_params(self) -> dict:
+        """Connection parameters of the target cluster"""
+        return (self.target or ClusterTarget("default", Config.DB_HOST)).connection_params()
+    
+    @property
+    def dbname(self) -> str:
+        """Maintenance database of the target cluster"""
+        return self.connection_params()["dbname"]
+    
+    @property
+    def admin_user(self) -> str:
+        """Admin role that receives reassigned objects"""
+        return self.connection_params()["user"]
+    
+    def _connect_kwargs(self, dbname: Optional[str] = None) -> dict:
+        """asyncpg connection arguments for a database of the target cluster"""
+        params = self.connection_params()
+        return {
+            "host": params["host"],
+            "port": int(params["port"]),
+            "database": dbname or params["dbname"],
+            "user": params["user"],
+            "password": params["password"],
+            "server_settings": {"application_name": APPLICATION_NAME},
+            "timeout": 10,
+        }
+    
+    async def connect(self):
+        """Create the connection pool"""
+        self.pool = await asyncpg.create_pool(
+            min_size=Config.DB_POOL_MIN_CONN,
+            max_size=Config.DB_POOL_MAX_CONN,
+            **self._connect_kwargs()
+        )
+        logger.info("Async database connection pool initialized successfully")
+    
+    async def fetch_catalog_snapshot(self) -> CatalogSnapshot:
+        """Load roles, login flags, memberships, CONNECT grants and verifiers in one round trip"""
+        rows = await self.pool.fetch("""
+            SELECT r.rolname,
+                   r.rolcanlogin,
+                   ARRAY(
+                       SELECT g.rolname
+                       FROM pg_auth_members m
+                       JOIN pg_roles g ON g.oid = m.roleid
+                       WHERE m.member = r.oid
+                   )::text[],
+                   ARRAY(
+                       SELECT d.datname
+                       FROM pg_database d, aclexplode(d.datacl) a
+                       WHERE a.grantee = r.oid AND a.privilege_type = 'CONNECT'
+                   )::text[],
+                   r.rolpassword,
+                   coalesce(shobj_description(r.oid, 'pg_authid') = $2, false)
+            FROM pg_authid r
+            WHERE r.rolname <> ALL($1::text[]);
+        """, list(Config.SYSTEM_ROLES), MANAGED_ROLE_COMMENT)
         
+        roles, memberships, connect_grants, verifiers, managed = {}, {}, {}, {}, set()
+        for rolname, can_login, member_of, databases, verifier, is_managed in rows:
+            roles[rolname] = can_login
+            if member_of:
+                memberships[rolname] = set(member_of)
+            if databases:
+                connect_grants[rolname] = set(databases)
+            if verifier:
+                verifiers[rolname] = verifier
+            if is_managed:
+                managed.add(rolname)
+        return CatalogSnapshot(roles, memberships, connect_grants, taken_at=datetime.now(), verifiers=verifiers,
+                               managed=managed)
+    
+    async def fetch_privilege_index(self, targets: Set[PrivilegeTarget]) -> PrivilegeIndex:
+        """Load the ACLs of the managed tables, schemas and databases in one round trip"""
+        tables = sorted(name for kind, name in targets if kind == "table")
+        rows = await self.pool.fetch("""
+            SELECT 'table', ref.name, c.relacl::text[]
+            FROM unnest($1::text[], $2::text[]) AS ref(name, regclass)
+            JOIN pg_class c ON c.oid = to_regclass(ref.regclass)
+            UNION ALL
+            SELECT 'schema', n.nspname::text, n.nspacl::text[]
+            FROM pg_namespace n
+            WHERE n.nspname = ANY($3::text[])
+            UNION ALL
+            SELECT 'database', d.datname::text, d.datacl::text[]
+            FROM pg_database d
+            WHERE d.datname = ANY($4::text[]);
+        """, tables, [".".join(quote_ident(part) for part in privilege_target_parts(("table", name))) for name in tables],
+            sorted(name for kind, name in targets if kind == "schema"),
+            sorted(name for kind, name in targets if kind == "database"))
+        return PrivilegeIndex({(kind, name): acl for kind, name, acl in rows})
+    
+    def render_batch(self, kind: str, operations: List[UserOperation]) -> List[str]:
+        """Statements of a batch, rendered for asyncpg (see render_statement)"""
+        return [render_statement(statement, params) for statement, params in self._batch_statements(kind, operations)]
+    
+    async def fetch_dependent_databases(self, usernames: List[str]) -> Dict[str, List[str]]:
+        """Find the databases holding objects or privileges of roles (see DatabaseClient)"""
+        rows = await self.pool.fetch("""
+            SELECT d.datname::text, array_agg(DISTINCT r.rolname::text ORDER BY r.rolname::text)
+            FROM pg_shdepend s
+            JOIN pg_database d ON d.oid = s.dbid
+            JOIN pg_roles r ON r.oid = s.refobjid
+            WHERE s.refclassid = 'pg_authid'::regclass
+              AND r.rolname = ANY($1::text[])
+              AND d.datallowconn
+            GROUP BY d.datname;
+        """, sorted(usernames))
+        return {dbname: list(names) for dbname, names in rows}
+    
+    async def drop_owned(self, dbname: str, usernames: List[str]) -> int:
+        """Reassign and drop what roles own in another database, on a connection of its own"""
+        statements = [render_statement(statement) for statement in self._drop_owned_statements(usernames)]
+        conn = await asyncpg.connect(**self._connect_kwargs(dbname))
         try:
-            parsed = yaml.safe_load(yaml_content)
-            users = {}
-            for user_data in parsed.get("users", []):
-                spec = UserSpec(
-                    username=user_data["username"],
-                    database=user_data.get("database", Config.DB_NAME),
-                    roles=user_data.get("roles", []),
-                    privileges=user_data.get("privileges")
-                )
-                users[spec.username] = spec
-            return users
-        except (yaml.YAMLError, KeyError) as e:
-            logger.error(f"Error parsing users.yaml: {e}")
-            return {}
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+        finally:
+            await conn.close()
+        return len(statements)
     
-    def detect_drift(self, desired: Dict[str, UserSpec], actual_users: Set[str]) -> Tuple[Set[str], Set[str], Set[str]]:
-        """
-        Detect drift between desired and actual state
+    async def release_dependencies(self, usernames: List[str]) -> int:
+        """Reassign and drop what roles own in the other databases, concurrently"""
+        by_database = await self.fetch_dependent_databases(usernames)
+        by_database.pop(self.dbname, None)
+        if not by_database:
+            return 0
+        logger.info(f"Dropping objects of {len(usernames)} roles in {len(by_database)} other databases")
+        return sum(await asyncio.gather(*(self.drop_owned(dbname, names) for dbname, names in by_database.items())))
+    
+    async def apply_batch(self, kind: str, operations: List[UserOperation]) -> int:
+        """Apply a batch of operations of the same kind in a single transaction"""
+        executed = 0
+        if kind in ("drop", "drop_role"):
+            executed += await self.release_dependencies([op.username for op in operations])
+        statements = self.render_batch(kind, operations)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+        return executed + len(statements)
+    
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+            logger.info("Async database connection pool closed")
+
+
+class AsyncPostgresUserController(ReconcilerBase):
+    """
+    asyncio variant of PostgresUserController
+    
+    Fetches the ConfigMap, lists Secrets and snapshots the catalog
+    concurrently, then applies DDL batches concurrently through an async
+    connection pool (bounded by DB_POOL_MAX_CONN). Planning, models and
+    state handling are shared with the threaded controller.
+    """
+    
+    def __init__(self, k8s_client: Optional[AsyncKubernetesClient] = None,
+                 db_client: Optional[AsyncDatabaseClient] = None,
+                 state_manager: Optional[StateManager] = None):
+        if k8s_client is None or db_client is None:
+            if asyncpg is None or async_client is None:
+                raise RuntimeError("The async engine requires the asyncpg and kubernetes_asyncio packages")
+        self.k8s_client = k8s_client or AsyncKubernetesClient()
+        self.db_client = db_client or AsyncDatabaseClient()
+        self.state_manager = state_manager or create_state_manager()
+        self.secret_cache = SecretCache()
+        self.metrics = Metrics()
+        self.queue = WorkQueue()
+        self.verifiers = VerifierCache()
+        self.desired_loader = DesiredStateLoader()
+        self.desired_state = ShardedDesiredState()
+        self.batch_size = max(1, Config.DDL_BATCH_SIZE)
+        logger.info("Async PostgreSQL User Controller initialized")
+    
+    async def connect(self):
+        """Connect both clients concurrently"""
+        await asyncio.gather(self.k8s_client.connect(), self.db_client.connect())
+    
+    async def _timed(self, phase: str, awaitable):
+        """Await while timing a cycle phase (phases may overlap)"""
+        with self.metrics.time_phase(phase):
+            return await awaitable
+    
+    async def _apply_batch(self, kind: str, ops: List[UserOperation], dry_run: bool) -> BatchResult:
+        result = BatchResult(kind=kind, size=len(ops))
+        started = time.monotonic()
         
-        Args:
-            desired: Desired user specifications
-            actual_users: Actual users in database
-            
-        Returns:
-            Tuple of (users_to_create, users_to_delete, users_to_update)
-        """
-        desired_usernames = set(desired.keys())
+        if dry_run:
+            for op in ops:
+                logger.info(f"[DRY-RUN] Would apply {kind} for {op.username}")
+            result.succeeded = [op.username for op in ops]
+            return result
         
-        users_to_create = desired_usernames - actual_users
-        users_to_delete = actual_users - desired_usernames
-        users_to_update = desired_usernames & actual_users
+        try:
+            result.statements = await self.db_client.apply_batch(kind, ops)
+            result.succeeded = [op.username for op in ops]
+        except Exception as e:
+            logger.warning(f"{YELLOW}{kind} batch of {len(ops)} failed, retrying individually: {e}{RESET}")
+            result.fallback = True
+            for op in ops:
+                try:
+                    result.statements += await self.db_client.apply_batch(kind, [op])
+                    result.succeeded.append(op.username)
+                except Exception as op_error:
+                    logger.error(f"Failed to apply {kind} for {op.username}: {op_error}")
+                    result.failed.append(op.username)
         
-        return users_to_create, users_to_delete, users_to_update
+        result.duration_seconds = time.monotonic() - started
+        logger.info(f"DDL batch {kind}: {len(result.succeeded)}/{result.size} applied, "
+                    f"{result.statements} statements in {result.duration_seconds:.3f}s"
+                    f"{' (fallback)' if result.fallback else ''}")
+        return result
     
-    def reconcile_roles(self, desired_users: Dict[str, UserSpec], stats: ReconciliationStats, dry_run: bool = False):
+    async def apply_operations(self, operations: List[UserOperation], stats: ReconciliationStats,
+                               dry_run: bool = False) -> List[BatchResult]:
         """
-        Ensure all required roles exist in the database
+        Apply operations phase by phase, running the batches of a phase concurrently
         
         Args:
-            desired_users: Desired user specifications
+            operations: Planned operations
             stats: Statistics object to update
             dry_run: If True, only simulate actions
+            
+        Returns:
+            Results of the executed batches
         """
-        # Collect all roles mentioned in desired state
-        all_desired_roles = set()
-        for user_spec in desired_users.values():
-            all_desired_roles.update(user_spec.roles)
-        
-        # Fetch existing roles from database
-        existing_roles = self.db_client.fetch_existing_roles()
-        
-        # Create missing roles
-        roles_to_create = all_desired_roles - existing_roles
-        for role in roles_to_create:
-            try:
-                self.db_client.create_role(role, dry_run=dry_run)
-                stats.roles_created += 1
-            except Exception as e:
-                logger.error(f"Failed to create role {role}: {e}")
-                stats.errors += 1
+        results: List[BatchResult] = []
+        for kind in PlanExecutor.ORDER:
+            ops = [op for op in operations if op.kind == kind]
+            batches = [ops[start:start + self.batch_size] for start in range(0, len(ops), self.batch_size)]
+            if kind in PlanExecutor.SEQUENTIAL:
+                for batch in batches:
+                    results.append(await self._apply_batch(kind, batch, dry_run))
+                continue
+            results.extend(await asyncio.gather(*(self._apply_batch(kind, batch, dry_run) for batch in batches)))
         
-        # Optionally clean up unused roles (be careful with this!)
-        # Commented out by default to prevent accidental deletions
-        # roles_to_delete = existing_roles - all_desired_roles
-        # for role in roles_to_delete:
-        #     try:
-        #         self.db_client.drop_role(role, dry_run=dry_run)
-        #         stats.roles_deleted += 1
-        #     except Exception as e:
-        #         logger.error(f"Failed to drop role {role}: {e}")
-        #         stats.errors += 1
+        for result in results:
+            stats.errors += len(result.failed)
+            stats.ddl_fallbacks += int(result.fallback)
+        stats.ddl_batches += len(results)
+        if results and not dry_run:
+            self.metrics.record_batches(results)
+        return results
     
-    def reconcile_users(self, stats: ReconciliationStats, dry_run: bool = False):
+    async def fetch_desired_shards(self) -> Optional[List[ConfigMapShard]]:
+        """Fetch every shard matching CONFIGMAP_SELECTOR, or the single users ConfigMap"""
+        if Config.CONFIGMAP_SELECTOR:
+            return await self.k8s_client.list_user_configmaps(Config.NAMESPACE, Config.CONFIGMAP_SELECTOR)
+        content = await self.k8s_client.fetch_configmap(Config.CONFIGMAP_NAME, Config.NAMESPACE)
+        if content is None:
+            return None
+        return [ConfigMapShard(Config.CONFIGMAP_NAME, None, content)]
+    
+    async def reconcile_users(self, stats: ReconciliationStats, dry_run: bool = False):
         """
         Main reconciliation logic
         
@@ -817,177 +6794,222 @@ class PostgresUserController:
             stats: Statistics object to update
             dry_run: If True, only simulate actions
         """
-        # Fetch desired state from ConfigMap
-        yaml_content = self.k8s_client.fetch_configmap(
-            Config.CONFIGMAP_NAME,
-            Config.NAMESPACE
+        loop = asyncio.get_running_loop()
+        
+        # Overlap all reads: ConfigMap, Secrets, catalog and the local state file
+        shards, secrets, snapshot, previous_state = await asyncio.gather(
+            self._timed("configmap_fetch", self.fetch_desired_shards()),
+            self._timed("secret_list", self.k8s_client.list_user_secrets(Config.NAMESPACE)),
+            self._timed("catalog_snapshot", self.db_client.fetch_catalog_snapshot()),
+            self._timed("state_load", loop.run_in_executor(None, self.state_manager.load_state)),
+            return_exceptions=True
         )
         
-        if yaml_content is None:
+        for name, value in (("ConfigMap", shards), ("catalog snapshot", snapshot),
+                            ("previous state", previous_state)):
+            if isinstance(value, BaseException):
+                logger.error(f"Failed to fetch {name}: {value}")
+                stats.errors += 1
+                return
+        
+        if shards is None:
             logger.error("Failed to fetch ConfigMap, skipping reconciliation")
             stats.errors += 1
             return
         
-        desired_users = self.parse_desired_users(yaml_content)
-        
-        # Load previous state
-        previous_state = self.state_manager.load_state()
+        if isinstance(secrets, BaseException):
+            logger.warning(f"Failed to list user Secrets: {secrets}")
+        else:
+            self.secret_cache.load(*secrets)
+            self.metrics.secrets_cached = len(self.secret_cache)
         
-        # Fetch actual database state
-        try:
-            actual_users = self.db_client.fetch_existing_users()
-        except Exception as e:
-            logger.error(f"Failed to fetch existing users: {e}")
-            stats.errors += 1
+        with self.metrics.time_phase("yaml_parse"):
+            desired_users, _ = self.load_desired_users(shards, stats)
+        if desired_users is None:
             return
+        actual_users = snapshot.users
         
         # Reconcile roles first
-        self.reconcile_roles(desired_users, stats, dry_run=dry_run)
+        role_results = await self._timed("role_reconcile", self.apply_operations(
+            self.plan_role_operations(desired_users, snapshot, stats=stats), stats, dry_run=dry_run
+        ))
+        self.count_results(role_results, stats, snapshot=None if dry_run else snapshot)
         
-        # Detect drift
-        users_to_create, users_to_delete, users_to_update = self.detect_drift(
-            desired_users, actual_users
+        drift = self.detect_drift(desired_users, actual_users)
+        skipped: Set[str] = set()
+        operations = self.plan_user_operations(
+            desired_users, previous_state, snapshot, drift, self.secret_cache.get_password, stats, skipped
         )
-        
-        # We'll calculate actual drift after checking database state
-        actual_drift_count = 0
-        
-        # Handle deletions
-        for username in users_to_delete:
-            # Only delete if it was in our previous state (we manage it)
-            if username in previous_state:
-                try:
-                    self.db_client.drop_user(username, dry_run=dry_run)
-                    stats.users_deleted += 1
-                    actual_drift_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to delete user {username}: {e}")
-                    stats.errors += 1
-        
-        # Handle creations
-        for username in users_to_create:
-            user_spec = desired_users[username]
-            try:
-                password = self.k8s_client.get_user_password(
-                    username,
-                    Config.NAMESPACE
+        if Config.RECONCILE_PASSWORDS and self.secret_cache.synced and drift[2]:
+            with self.metrics.time_phase("password_check"):
+                operations += self.plan_password_operations(
+                    desired_users, snapshot, drift[2], self.secret_cache.get_password, self.secret_cache.version_of
                 )
-                if not password:
-                    logger.error(f"No password found for user {username}, skipping creation")
-                    stats.errors += 1
-                    continue
-                
-                self.db_client.create_user(user_spec, password, dry_run=dry_run)
-                stats.users_created += 1
-                actual_drift_count += 1
+        if Config.RECONCILE_PRIVILEGES and drift[2]:
+            try:
+                index = await self._timed("privilege_snapshot", self.db_client.fetch_privilege_index(
+                    self.privilege_targets(desired_users)))
+                operations += self.plan_privilege_operations(desired_users, index, drift[2])
             except Exception as e:
-                logger.error(f"Failed to create user {username}: {e}")
+                logger.error(f"Failed to fetch object privileges: {e}")
                 stats.errors += 1
+        retries: List[str] = []
+        if not dry_run:
+            operations, retries = self.admit_operations(operations, stats)
         
-        # Handle updates
-        for username in users_to_update:
-            user_spec = desired_users[username]
-            prev_spec = previous_state.get(username)
-            
-            # Check if roles changed
-            if prev_spec and set(prev_spec.roles) != set(user_spec.roles):
-                try:
-                    actual_roles = self.db_client.fetch_user_roles(username)
-                    desired_roles = set(user_spec.roles)
-                    
-                    if actual_roles != desired_roles:
-                        self.db_client.update_user_roles(
-                            username,
-                            actual_roles,
-                            desired_roles,
-                            dry_run=dry_run
-                        )
-                        stats.users_updated += 1
-                        actual_drift_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to update user {username}: {e}")
-                    stats.errors += 1
+        results = await self._timed("user_apply", self.apply_operations(operations, stats, dry_run=dry_run))
+        actual_drift_count = self.count_results(results, stats)
+        if not dry_run:
+            self.record_outcomes(results, skipped, retries)
         
-        # Log drift only if actual changes were needed
         if actual_drift_count > 0:
             logger.info(f"{YELLOW}Drift detected: {actual_drift_count} changes needed{RESET}")
         else:
             logger.info(f"{GREEN}No drift detected - system in desired state{RESET}")
-        
         stats.drift_detected = actual_drift_count
         
-        # Save new state
         if not dry_run:
-            self.state_manager.save_state(desired_users)
+            state = self.state_to_save(desired_users, previous_state)
+            await self._timed("state_save", loop.run_in_executor(None, self.state_manager.save_state, state))
         
-        # Update metrics
         self.metrics.users_managed = len(desired_users)
-        self.metrics.roles_managed = len(self.db_client.fetch_existing_roles())
+        self.metrics.roles_managed = len(snapshot.group_roles)
     
-    def run_reconciliation_loop(self):
-        """
-        Main control loop that runs continuously
-        """
-        logger.info(f"{GREEN}Controller started (DRY_RUN={Config.DRY_RUN}){RESET}")
+    async def run_cycle(self, reason: str = "periodic sync") -> ReconciliationStats:
+        """Run a single reconciliation cycle and record its metrics"""
+        stats = ReconciliationStats(start_time=datetime.now())
+        
+        try:
+            logger.info("=" * 60)
+            logger.info(f"Starting reconciliation cycle ({reason})")
+            
+            await self.reconcile_users(stats, dry_run=Config.DRY_RUN)
+            
+            stats.end_time = datetime.now()
+            self.metrics.record_reconciliation(stats)
+            self.log_summary(stats)
+        except Exception as e:
+            logger.error(f"Unexpected error in reconciliation loop: {e}", exc_info=True)
+            stats.errors += 1
+            stats.end_time = datetime.now()
+            self.metrics.record_reconciliation(stats)
+        
+        return stats
+    
+    async def run_reconciliation_loop(self):
+        """Main control loop that runs continuously"""
+        logger.info(f"{GREEN}Async controller started (DRY_RUN={Config.DRY_RUN}){RESET}")
         logger.info(f"Sync interval: {Config.SYNC_INTERVAL}s")
         
+        await self.connect()
         while True:
-            stats = ReconciliationStats(start_time=datetime.now())
-            
-            try:
-                logger.info("=" * 60)
-                logger.info("Starting reconciliation cycle")
-                
-                self.reconcile_users(stats, dry_run=Config.DRY_RUN)
-                
-                stats.end_time = datetime.now()
-                self.metrics.record_reconciliation(stats)
-                
-                # Print summary
-                logger.info("=" * 60)
-                logger.info(f"{WHITE}Reconciliation Summary:{RESET}")
-                logger.info(f"  • Users created: {stats.users_created}")
-                logger.info(f"  • Users updated: {stats.users_updated}")
-                logger.info(f"  • Users deleted: {stats.users_deleted}")
-                logger.info(f"  • Roles created: {stats.roles_created}")
-                logger.info(f"  • Roles deleted: {stats.roles_deleted}")
-                logger.info(f"  • Drift detected: {stats.drift_detected}")
-                logger.info(f"  • Errors: {stats.errors}")
-                logger.info(f"  • Duration: {stats.duration_seconds():.2f}s")
-                logger.info("=" * 60)
-                
-            except Exception as e:
-                logger.error(f"Unexpected error in reconciliation loop: {e}", exc_info=True)
-                stats.errors += 1
-                stats.end_time = datetime.now()
-                self.metrics.record_reconciliation(stats)
+            await self.run_cycle()
             
-            # Sleep until next cycle
-            logger.info(f"{BLUE}Sleeping for {Config.SYNC_INTERVAL}s...{RESET}")
-            time.sleep(Config.SYNC_INTERVAL)
+            # Wake up early when a failed user is due for a retry
+            sleep_time = self.next_wakeup(Config.SYNC_INTERVAL)
+            logger.info(f"{BLUE}Sleeping for {sleep_time:.1f}s...{RESET}")
+            await asyncio.sleep(sleep_time)
     
-    def cleanup(self):
+    def is_ready(self) -> bool:
+        """Ready once the first reconciliation cycle has completed"""
+        return self.metrics.reconciliation_count > 0
+    
+    def export_prometheus(self) -> str:
+        """Export this controller's metrics"""
+        return self.metrics.export_prometheus()
+    
+    async def cleanup(self):
         """Cleanup resources"""
         logger.info("Shutting down controller...")
-        self.db_client.close()
+        await asyncio.gather(self.k8s_client.close(), self.db_client.close())
+        self.state_manager.close()
 
 
 # ============================================================================
 # MAIN ENTRY POINT
 # ============================================================================
 
+def run_async():
+    """Entry point for the asyncio engine"""
+    async def run():
+        controller = AsyncPostgresUserController()
+        server = start_metrics_server(controller)
+        try:
+            await controller.run_reconciliation_loop()
+        finally:
+            if server:
+                server.stop()
+            await controller.cleanup()
+    
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        logger.info("Received interrupt signal, shutting down gracefully...")
+    except Exception as e:
+        logger.critical(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+def start_metrics_server(controller) -> Optional[MetricsServer]:
+    """Start the metrics/health endpoint unless METRICS_PORT is 0"""
+    if Config.METRICS_PORT <= 0:
+        return None
+    server = MetricsServer(controller)
+    try:
+        server.start()
+    except OSError as e:
+        logger.error(f"Failed to start metrics server on port {Config.METRICS_PORT}: {e}")
+        return None
+    return server
+
+
+def create_coordinator(k8s_client: KubernetesClient) -> Optional[ReplicaCoordinator]:
+    """Build the replica coordinator if leader election or sharding is enabled"""
+    if not (Config.LEADER_ELECTION or Config.SHARDING):
+        return None
+    return ReplicaCoordinator(k8s_client)
+
+
 def main():
     """Main entry point"""
+    if Config.CONTROLLER_ENGINE == "async":
+        if Config.LEADER_ELECTION or Config.SHARDING:
+            logger.critical("LEADER_ELECTION and SHARDING are only supported by the sync engine")
+            sys.exit(1)
+        if Config.USERS_SOURCE == "crd":
+            logger.critical("USERS_SOURCE=crd is only supported by the sync engine")
+            sys.exit(1)
+        return run_async()
+    
     controller = None
+    coordinator = None
     try:
-        controller = PostgresUserController()
-        controller.run_reconciliation_loop()
+        k8s_client = KubernetesClient()
+        coordinator = create_coordinator(k8s_client)
+        if Config.DB_CLUSTERS or Config.DISCOVER_CLUSTERS:
+            controller = MultiClusterController(k8s_client=k8s_client, coordinator=coordinator)
+        else:
+            controller = PostgresUserController(k8s_client=k8s_client, coordinator=coordinator)
+        if coordinator:
+            coordinator.on_change = controller.handle_coordination_change
+            coordinator.start()
+            logger.info(f"Replica coordination started: {coordinator.status()}")
+        start_metrics_server(controller)
+        
+        if isinstance(controller, MultiClusterController):
+            controller.run()
+        elif Config.RECONCILE_MODE == "watch":
+            controller.run_watch_loop()
+        else:
+            controller.run_reconciliation_loop()
     except KeyboardInterrupt:
         logger.info("Received interrupt signal, shutting down gracefully...")
     except Exception as e:
         logger.critical(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
     finally:
+        if coordinator:
+            coordinator.stop()
         if controller:
             controller.cleanup()
 
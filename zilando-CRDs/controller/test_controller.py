@@ -50,11 +50,64 @@ def test_state_manager():
             os.unlink(state_file)
 
 
+def test_sqlite_state_manager():
+    """Test the indexed state store"""
+    print("\n🧪 Testing SQLiteStateManager...")
+    
+    from controller import SQLiteStateManager, StateManager, UserSpec
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy = os.path.join(tmpdir, "users_state.json")
+        StateManager(legacy).save_state({"old": UserSpec(username="old", database="test", roles=["r"])})
+        
+        db_file = os.path.join(tmpdir, "users_state.db")
+        store = SQLiteStateManager(db_file, legacy_json=legacy)
+        assert store.generation == 1 and "old" in store.load_state(), "JSON state should be imported"
+        
+        users = {
+            "alice": UserSpec(username="alice", database="test", roles=["read_only"]),
+            "bob": UserSpec(username="bob", database="test", roles=["read_write"]),
+        }
+        store.save_state(users)
+        assert store.generation == 2
+        store.save_state(users)
+        assert store.generation == 2, "Unchanged state should not be written"
+        
+        users["alice"] = users["alice"].replace(roles=["read_only", "analyst"])
+        writes = []
+        store._conn.set_trace_callback(writes.append)
+        store.save_state(users)
+        store._conn.set_trace_callback(None)
+        upserts = [w for w in writes if w.startswith("INSERT OR REPLACE INTO users")]
+        assert len(upserts) == 1 and "alice" in upserts[0], "Only the changed row should be written"
+        assert store.generation == 3
+        store.close()
+        
+        reopened = SQLiteStateManager(db_file, legacy_json=legacy)
+        state = reopened.load_state()
+        assert set(state) == {"alice", "bob"} and len(state) == 2, "Dropped users should be deleted"
+        assert state["alice"].roles == ["read_only", "analyst"], "State should survive reopening"
+        assert state.get("charlie") is None and "charlie" not in state
+        assert reopened.generation == 3, "Legacy JSON should only be imported once"
+        
+        # Rows are read once per process, not once per lookup
+        reads = []
+        reopened._conn.set_trace_callback(reads.append)
+        state = reopened.load_state()
+        assert [state.get(name) for name in ("alice", "bob", "charlie")][2] is None
+        reopened.save_state(dict(state))
+        reopened._conn.set_trace_callback(None)
+        assert reads == [], "Later loads and unchanged saves should not query the store"
+        reopened.close()
+    
+    print("✅ SQLiteStateManager tests passed!")
+
+
 def test_user_spec():
-    """Test UserSpec hashing"""
+    """Test UserSpec hashing and its compact representation"""
     print("\n🧪 Testing UserSpec...")
     
-    from controller import UserSpec
+    from controller import UserSpec, NameTable, ROLE_NAMES
     
     user1 = UserSpec(username="alice", database="test", roles=["read_only"])
     user2 = UserSpec(username="alice", database="test", roles=["read_only"])
@@ -62,6 +115,33 @@ def test_user_spec():
     
     assert hash(user1) == hash(user2), "Identical users should have same hash"
     assert hash(user1) != hash(user3), "Different roles should have different hash"
+    assert user1 == user2 and user1 != user3
+    
+    # Role sets are bitsets: the order roles are listed in does not matter
+    table = NameTable()
+    assert table.encode(["b", "a", "b"]) == table.encode(["a", "b"]) == 0b11 and len(table) == 2
+    assert table.decode(0b10) == ["a"] and table.decode(0) == []
+    user4 = UserSpec(username="bob", database="test", roles=["read_write", "read_only"])
+    user5 = UserSpec(username="bob", database="test", roles=["read_only", "read_write"])
+    assert user4 == user5 and hash(user4) == hash(user5)
+    assert sorted(user4.roles) == ["read_only", "read_write"]
+    assert user4.role_bits == user1.role_bits | user3.role_bits
+    assert user4.roles[0] is ROLE_NAMES.decode(user1.role_bits)[0], "Role names should be interned"
+    
+    # Values are shared, not copied per user
+    privileges = {"public.orders": ["SELECT"]}
+    user6 = UserSpec(username="carol", database="".join(["te", "st"]), roles=[], privileges=privileges)
+    user7 = UserSpec(username="dave", database="test", roles=[], privileges=dict(privileges))
+    assert user6.database is user7.database, "Database names should be interned"
+    assert user6._privileges is user7._privileges, "Identical privilege maps should be shared"
+    assert user6.privileges == privileges and user1.privileges is None
+    assert not hasattr(user1, "__dict__"), "Specs should not carry a __dict__"
+    
+    # The fingerprint is computed once and is stable across processes
+    assert user6.fingerprint == user6.replace(roles=[]).fingerprint
+    assert user6._fingerprint is not None and user1.fingerprint != user3.fingerprint
+    assert UserSpec(**user6.to_dict()) == user6
+    assert user6.replace(privileges=None).privileges is None and user6.privileges == privileges
     
     print("✅ UserSpec tests passed!")
 
@@ -101,7 +181,7 @@ def test_drift_detection():
     # Mock Kubernetes and Database clients
     with patch('controller.KubernetesClient'), \
          patch('controller.DatabaseClient'), \
-         patch('controller.StateManager'):
+         patch('controller.create_state_manager'):
         
         controller = PostgresUserController()
         
@@ -186,6 +266,1809 @@ def test_dry_run_mode():
     print("✅ Dry-run mode tests passed!")
 
 
+def test_watch_events():
+    """Test watch-driven reconciliation triggers"""
+    print("\n🧪 Testing watch events...")
+    
+    from controller import PostgresUserController, ResourceWatcher, is_user_secret_name
+    from types import SimpleNamespace
+    
+    assert is_user_secret_name("user-alice-secret"), "User secrets should match"
+    assert not is_user_secret_name("postgres.credentials"), "Other secrets should be ignored"
+    
+    def obj(name, rv):
+        return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=rv))
+    
+    received = []
+    list_result = SimpleNamespace(metadata=SimpleNamespace(resource_version="10"))
+    watcher = ResourceWatcher(
+        "secret",
+        Mock(return_value=list_result),
+        "postgres",
+        lambda kind, event_type, name: received.append((event_type, name)),
+        name_filter=is_user_secret_name
+    )
+    watcher._watch = Mock()
+    watcher._watch.resource_version = "13"
+    watcher._watch.stream.return_value = iter([
+        {"type": "ADDED", "object": obj("user-alice-secret", "11")},
+        {"type": "MODIFIED", "object": obj("unrelated", "12")},
+        {"type": "BOOKMARK", "object": None},
+    ])
+    watcher.watch_once()
+    
+    assert received == [("RELIST", None), ("ADDED", "user-alice-secret")], "Should relist then filter events"
+    assert watcher.resource_version == "13", "Bookmark should advance resourceVersion"
+    assert watcher._watch.stream.call_args.kwargs["resource_version"] == "10", "Watch should resume from list"
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.handle_watch_event("configmap", "MODIFIED", "postgres-users-config")
+        
+        assert controller._trigger.is_set(), "Event should trigger reconciliation"
+        assert controller.metrics.watch_events_count == 1, "Event should be counted"
+    
+    print("✅ Watch event tests passed!")
+
+
+def test_catalog_snapshot():
+    """Test catalog snapshot indexing and its use during reconciliation"""
+    print("\n🧪 Testing CatalogSnapshot...")
+    
+    from controller import PostgresUserController, CatalogSnapshot, ReconciliationStats, UserSpec
+    
+    snapshot = CatalogSnapshot(
+        roles={"alice": True, "charlie": True, "read_only": False},
+        memberships={"alice": {"read_only"}},
+        connect_grants={"alice": {"test"}}
+    )
+    
+    assert snapshot.users == {"alice", "charlie", "read_only"}, "Users should include all roles"
+    assert snapshot.group_roles == {"read_only"}, "Group roles should be non-login roles"
+    assert snapshot.roles_of("alice") == {"read_only"}, "Memberships should be indexed"
+    assert snapshot.roles_of("nobody") == set(), "Unknown users should have no roles"
+    assert snapshot.members_of["read_only"] == {"alice"}, "Reverse index should be built"
+    assert snapshot.can_connect("alice", "test"), "CONNECT grants should be indexed"
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = (
+            "users:\n"
+            "  - username: alice\n"
+            "    database: test\n"
+            "    roles: [read_write]\n"
+        )
+        controller.state_manager.load_state.return_value = {
+            "alice": UserSpec(username="alice", database="test", roles=["read_only"]),
+            "charlie": UserSpec(username="charlie", database="test", roles=[]),
+        }
+        controller.db_client.fetch_catalog_snapshot.return_value = snapshot
+        
+        stats = ReconciliationStats()
+        controller.reconcile_users(stats)
+        
+        db = controller.db_client
+        assert db.fetch_catalog_snapshot.call_count == 1, "Catalog should be read once per cycle"
+        assert not db.fetch_user_roles.called, "Per-user role queries should not be issued"
+        assert not db.fetch_existing_roles.called, "Roles should come from the snapshot"
+        batches = {call.args[0]: call.args[1] for call in db.apply_batch.call_args_list}
+        assert [op.username for op in batches["create_role"]] == ["read_write"], "Missing role should be created"
+        update = batches["update"][0]
+        assert (update.username, update.grant, update.revoke) == ("alice", {"read_write"}, {"read_only"}), \
+            "Role update should be diffed against the snapshot"
+        assert [op.username for op in batches["drop"]] == ["charlie"], "Removed user should be dropped"
+        assert controller.metrics.roles_managed == 2, "Created roles should be counted"
+    
+    print("✅ CatalogSnapshot tests passed!")
+
+
+def test_privilege_reconciliation():
+    """Test ACL parsing, privilege bitmaps and fleet-wide GRANT/REVOKE planning"""
+    print("\n🧪 Testing privilege reconciliation...")
+    
+    from controller import (PostgresUserController, DatabaseClient, AsyncDatabaseClient, PrivilegeIndex,
+                            ReconciliationStats, CatalogSnapshot, UserSpec, PRIVILEGE_BITS,
+                            parse_aclitem, desired_privileges, privilege_names)
+    
+    SELECT, INSERT, DELETE = PRIVILEGE_BITS["SELECT"], PRIVILEGE_BITS["INSERT"], PRIVILEGE_BITS["DELETE"]
+    assert parse_aclitem("alice=arw/postgres") == ("alice", SELECT | INSERT | PRIVILEGE_BITS["UPDATE"])
+    assert parse_aclitem("=r/postgres") == ("", SELECT), "PUBLIC should have an empty grantee"
+    assert parse_aclitem('"we""ird=x"=r*/postgres') == ('we"ird=x', SELECT), "Quoted grantees should be unescaped"
+    
+    spec = UserSpec(username="alice", database="app", roles=[],
+                    privileges={"public.orders": ["select", "INSERT"], "schema:app": ["ALL"],
+                                "database:analytics": ["TEMP"]})
+    wanted = desired_privileges(spec)
+    assert wanted[("table", "public.orders")] == SELECT | INSERT
+    assert privilege_names(wanted[("schema", "app")]) == ["USAGE", "CREATE"], "ALL should expand per object kind"
+    assert privilege_names(wanted[("database", "app")]) == ["CONNECT"], "CONNECT on the user database is implied"
+    assert privilege_names(wanted[("database", "analytics")]) == ["TEMPORARY"]
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = (
+            "users:\n"
+            "  - username: alice\n"
+            "    database: app\n"
+            "    privileges: {public.orders: [SELECT, INSERT]}\n"
+            "  - username: bob\n"
+            "    database: app\n"
+            "    privileges: {public.orders: [SELECT, INSERT]}\n"
+            "  - username: carol\n"
+            "    database: app\n"
+            "    privileges: {public.orders: [SELECT], public.missing: [SELECT]}\n"
+        )
+        previous = {name: UserSpec(username=name, database="app", roles=[]) for name in ("alice", "bob", "carol")}
+        controller.state_manager.load_state.return_value = previous
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot(
+            {"alice": True, "bob": True, "carol": True}, {}, {}
+        )
+        controller.db_client.map_databases.side_effect = lambda func, items: {
+            database: func(controller.db_client, item) for database, item in items.items()}
+        controller.db_client.fetch_privilege_index.return_value = PrivilegeIndex({
+            ("table", "public.orders"): ["postgres=arwdDxt/postgres", "alice=rd/postgres",
+                                         "bob=r/postgres", "carol=r/postgres"],
+            ("database", "app"): ["=Tc/postgres", "alice=c/postgres", "bob=c/postgres", "carol=c/postgres"],
+        })
+        
+        stats = ReconciliationStats()
+        controller.reconcile_users(stats)
+        
+        db = controller.db_client
+        assert db.fetch_privilege_index.call_count == 1, "ACLs should be read in a single round trip per database"
+        assert db.map_databases.call_args.args[1] == {"app": {"alice", "bob", "carol"}}
+        assert db.fetch_privilege_index.call_args.args[0] == {
+            ("table", "public.orders"), ("table", "public.missing"), ("database", "app")}
+        ops = {op.username: op for op in db.apply_batch.call_args.args[1]}
+        assert db.apply_batch.call_args.args[0] == "privileges"
+        assert set(ops) == {"alice", "bob"}, "Users in line with their ACL entries should not be touched"
+        assert ops["alice"].privilege_changes == {("table", "public.orders"): (INSERT, DELETE)}, \
+            "Only the missing privileges should be granted and the extra ones revoked"
+        assert stats.privileges_updated == 2 and stats.errors == 0
+    
+    # Users needing the same change on the same object share one statement
+    statements = [repr(statement) for statement, _ in DatabaseClient.__new__(DatabaseClient)._batch_statements(
+        "privileges", list(ops.values()))]
+    assert len(statements) == 2, "Expected one REVOKE for alice and one coalesced GRANT"
+    assert "REVOKE" in statements[0] and "'DELETE'" in statements[0] and "'alice'" in statements[0]
+    assert "'INSERT'" in statements[1] and "'alice'" in statements[1] and "'bob'" in statements[1]
+    assert AsyncDatabaseClient().render_batch("privileges", list(ops.values())) == [
+        'REVOKE DELETE ON TABLE "public"."orders" FROM "alice";',
+        'GRANT INSERT ON TABLE "public"."orders" TO "alice", "bob";',
+    ]
+    
+    print("✅ Privilege reconciliation tests passed!")
+
+
+def test_password_drift():
+    """Test local SCRAM/MD5 verification, the verifier cache and password rotation"""
+    print("\n🧪 Testing password drift detection...")
+    
+    import base64
+    import hashlib
+    from types import SimpleNamespace
+    from controller import (PostgresUserController, ReconciliationStats, CatalogSnapshot, UserSpec,
+                            DatabaseClient, UserOperation, scram_keys, verify_password)
+    
+    salt = b"0123456789abcdef"
+    stored_key, server_key = scram_keys("s3cret", salt, 4096)
+    scram = "SCRAM-SHA-256$4096:{}${}:{}".format(*(base64.b64encode(v).decode() for v in (salt, stored_key, server_key)))
+    assert verify_password("alice", "s3cret", scram), "SCRAM verifier should be recomputed from its salt"
+    assert not verify_password("alice", "wrong", scram)
+    md5 = "md5" + hashlib.md5(b"oldbob").hexdigest()
+    assert verify_password("bob", "old", md5) and not verify_password("bob", "new", md5), "MD5 is salted by username"
+    assert not verify_password("carol", "x", None), "Roles without a password never match"
+    
+    def secret(name, password, rv):
+        data = {"password": base64.b64encode(password.encode()).decode()}
+        return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=rv), data=data)
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = "users:\n  - username: alice\n  - username: bob\n"
+        controller.k8s_client.list_user_secrets.return_value = (
+            [secret("user-alice-secret", "s3cret", "1"), secret("user-bob-secret", "new", "1")], "5"
+        )
+        controller.state_manager.load_state.return_value = {
+            name: UserSpec(username=name, database="postgres", roles=[]) for name in ("alice", "bob")
+        }
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot(
+            {"alice": True, "bob": True}, {}, {}, verifiers={"alice": scram, "bob": md5}
+        )
+        controller.db_client.fetch_catalog_digest.side_effect = Exception("no digest")
+        
+        stats = ReconciliationStats()
+        controller.reconcile_users(stats)
+        rotated = [call.args[1] for call in controller.db_client.apply_batch.call_args_list if call.args[0] == "password"]
+        assert [[op.username for op in ops] for ops in rotated] == [["bob"]], "Only mismatches should be rotated"
+        assert rotated[0][0].password == "new" and stats.passwords_updated == 1
+        assert controller.k8s_client.list_user_secrets.call_count == 1, "Secrets should be listed once per cycle"
+        assert controller.verifiers.computed == 2
+        
+        controller.reconcile_users(ReconciliationStats())
+        assert controller.verifiers.computed == 2, "Unchanged Secrets and verifiers should not be recomputed"
+        
+        controller.k8s_client.list_user_secrets.return_value = (
+            [secret("user-alice-secret", "rotated", "2"), secret("user-bob-secret", "new", "1")], "6"
+        )
+        controller.db_client.apply_batch.reset_mock()
+        controller.reconcile_users(ReconciliationStats())
+        assert controller.verifiers.computed == 3, "A new Secret version should be checked again"
+        rotated = [op.username for call in controller.db_client.apply_batch.call_args_list
+                   if call.args[0] == "password" for op in call.args[1]]
+        assert rotated == ["alice", "bob"], "Rotated Secrets should be applied in one batch"
+    
+    statements = DatabaseClient.__new__(DatabaseClient)._batch_statements(
+        "password", [UserOperation("password", "alice", password="a"), UserOperation("password", "bob", password="b")])
+    assert [params for _, params in statements] == [("a",), ("b",)], "Passwords should be bound parameters"
+    
+    print("✅ Password drift tests passed!")
+
+
+def test_desired_state_loader():
+    """Test memoized, streaming and sidecar parsing of the desired state"""
+    print("\n🧪 Testing DesiredStateLoader...")
+    
+    import hashlib
+    from controller import DesiredStateLoader, PostgresUserController, select_desired_document
+    
+    document = (
+        "timestamp: '2024-01-01'\n"
+        "users:\n"
+        "  - username: alice\n"
+        "    roles: &shared [read_only, analyst]\n"
+        "  - {username: bob, database: app, roles: *shared, privileges: {orders: [SELECT]}}\n"
+        "notes: [ignored]\n"
+    )
+    full = DesiredStateLoader(streaming=False)
+    streaming = DesiredStateLoader(streaming=True)
+    expected = full.load(document)
+    assert set(expected) == {"alice", "bob"} and expected["bob"].roles == ["read_only", "analyst"]
+    assert streaming.load(document) == expected, "Streaming parse should match the full parse"
+    
+    users = full.load(document)
+    users.pop("alice")
+    assert full.parses == 1 and "alice" in full.load(document), "Unchanged content should not be re-parsed"
+    
+    sidecar = json.dumps({"users": [{"username": "alice", "roles": ["read_only", "analyst"]},
+                                    {"username": "bob", "database": "app", "roles": ["read_only", "analyst"],
+                                     "privileges": {"orders": ["SELECT"]}}]})
+    assert DesiredStateLoader().load(sidecar) == expected, "JSON sidecar should yield the same users"
+    flow = "{users: [{username: alice, roles: [read_only, analyst]}]}"
+    for loader in (DesiredStateLoader(streaming=False), DesiredStateLoader(streaming=True)):
+        assert loader.load(flow) == {"alice": expected["alice"]}, "Flow-style YAML is not always JSON"
+    
+    digest = hashlib.sha256(document.encode()).hexdigest()
+    data = {"users.yaml": document, "users.json": sidecar, "users.sha256": digest}
+    assert select_desired_document(data) == sidecar, "Current sidecar should be preferred"
+    assert select_desired_document({**data, "users.yaml": document + "# edited\n"}) == document + "# edited\n", \
+        "Stale sidecar should be ignored"
+    assert select_desired_document({"users.yaml": document}) == document
+    assert select_desired_document(None) == ""
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        controller = PostgresUserController()
+        assert controller.parse_desired_users("users: [") == {}, "Invalid YAML should be reported, not raised"
+        assert controller.parse_desired_users('{"users": [') == {}, "Invalid JSON should be reported, not raised"
+    
+    print("✅ DesiredStateLoader tests passed!")
+
+
+def test_configmap_shards():
+    """Test sharded desired state: per-shard re-parsing, duplicates and incremental diffs"""
+    print("\n🧪 Testing ConfigMap shards...")
+    
+    import base64
+    from types import SimpleNamespace
+    from controller import (Config, ConfigMapShard, ShardedDesiredState, PostgresUserController,
+                            ReconciliationStats, CatalogSnapshot)
+    
+    def users(*names):
+        return "users:\n" + "".join(f"  - username: {name}\n" for name in names)
+    
+    state = ShardedDesiredState()
+    merged, changed = state.merge([ConfigMapShard("b", "1", users("bob", "alice")), ConfigMapShard("a", "1", users("alice"))])
+    assert set(merged) == {"alice", "bob"} and changed == {"alice", "bob"}
+    assert state.duplicates == {"alice": ["a", "b"]}, "Duplicates across shards should be reported"
+    
+    merged, changed = state.merge([ConfigMapShard("a", "1", users("alice")), ConfigMapShard("b", "2", users("bob", "carol"))])
+    assert state._loaders["a"].parses == 1, "Shards with an unchanged resourceVersion should not be re-parsed"
+    assert changed == {"alice", "bob", "carol"} and not state.duplicates
+    
+    merged, changed = state.merge([ConfigMapShard("a", "2", "users: ["), ConfigMapShard("b", "2", users("bob", "carol"))])
+    assert set(merged) == {"alice", "bob", "carol"} and state.errors == 1, "A broken shard should keep its last users"
+    
+    merged, changed = state.merge([ConfigMapShard("b", "2", users("bob", "carol"))])
+    assert set(merged) == {"bob", "carol"} and changed == {"alice"}, "Users of deleted shards should be re-diffed"
+    
+    try:
+        ShardedDesiredState().merge([ConfigMapShard("a", "1", "users: [")])
+        assert False, "A shard that never parsed should abort the cycle"
+    except ValueError:
+        pass
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'), \
+         patch.object(Config, 'CONFIGMAP_SELECTOR', 'postgres-controller/users-shard'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.list_user_configmaps.return_value = [
+            ConfigMapShard("shard-0", "1", users("alice")), ConfigMapShard("shard-1", "1", users("bob"))
+        ]
+        secret = SimpleNamespace(metadata=SimpleNamespace(name="user-carol-secret", resource_version="1"),
+                                 data={"password": base64.b64encode(b"pw").decode()})
+        controller.k8s_client.list_user_secrets.return_value = ([secret], "1")
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"alice": True, "bob": True}, {}, {})
+        controller.db_client.fetch_catalog_digest.return_value = "catalog"
+        controller.reconcile_users(ReconciliationStats())
+        
+        # Only shard-1 changed, so alice is not diffed even though she vanished from the catalog
+        controller.k8s_client.list_user_configmaps.return_value = [
+            ConfigMapShard("shard-0", "1", users("alice")), ConfigMapShard("shard-1", "2", users("bob", "carol"))
+        ]
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"bob": True}, {}, {})
+        controller.db_client.apply_batch.reset_mock()
+        controller.reconcile_users(ReconciliationStats())
+        created = [op.username for call in controller.db_client.apply_batch.call_args_list
+                   if call.args[0] == "create" for op in call.args[1]]
+        assert created == ["carol"], "Only users of changed shards should be diffed"
+        controller.k8s_client.fetch_configmap.assert_not_called()
+    
+    print("✅ ConfigMap shard tests passed!")
+
+
+def test_user_resources():
+    """Test the PostgreSQLUser informer cache, single-user reconciles and status write-back"""
+    print("\n🧪 Testing PostgreSQLUser resources...")
+    
+    import base64
+    import threading
+    from types import SimpleNamespace
+    from controller import (Config, PostgresUserController, ResourceWatcher, UserResourceCache,
+                            CatalogSnapshot, ReconciliationStats)
+    
+    def user(name, generation, roles=(), username=None, status=None):
+        spec = {"roles": list(roles), "password": "ignored"}
+        if username:
+            spec["username"] = username
+        return {"metadata": {"name": name, "uid": f"uid-{name}", "generation": generation,
+                             "resourceVersion": str(generation * 10)},
+                "spec": spec, "status": status or {}}
+    
+    cache = UserResourceCache()
+    assert cache.load([user("alice", 1), user("bob", 1)]) == {"alice", "bob"}
+    assert cache.load([user("alice", 1), user("bob", 1)]) == set(), "An unchanged relist should change nothing"
+    assert cache.apply_event("MODIFIED", user("alice", 1, status={"phase": "Ready"})) == set(), \
+        "Status-only updates should not count as changes"
+    assert cache.resources_of({"alice"})[0].status == {"phase": "Ready"}
+    assert cache.apply_event("MODIFIED", user("alice", 2, roles=["ro"])) == {"alice"}
+    assert cache.apply_event("MODIFIED", user("bob", 2, username="robert")) == {"bob", "robert"}, \
+        "A renamed user should reconcile both usernames"
+    assert cache.apply_event("DELETED", user("alice", 2)) == {"alice"} and len(cache) == 1
+    
+    # Custom objects arrive as dicts; on_object can drop irrelevant events
+    received = []
+    listed = {"metadata": {"resourceVersion": "5"}, "items": [user("alice", 1)]}
+    watcher = ResourceWatcher("postgresqluser", Mock(return_value=listed), "postgres",
+                              lambda kind, event_type, name: received.append((event_type, name)),
+                              on_list=cache.load,
+                              on_object=lambda event_type, obj: bool(cache.apply_event(event_type, obj)))
+    watcher._watch = Mock()
+    watcher._watch.stream.return_value = iter([
+        {"type": "MODIFIED", "object": user("alice", 1, status={"phase": "Ready"})},
+        {"type": "MODIFIED", "object": user("alice", 3, roles=["rw"])},
+    ])
+    watcher.watch_once()
+    assert received == [("RELIST", None), ("MODIFIED", "alice")], "Status-only events should be dropped"
+    assert watcher.resource_version == "30"
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'), \
+         patch.object(Config, 'USERS_SOURCE', 'crd'):
+        
+        controller = PostgresUserController()
+        controller.user_cache.load([user("alice", 1), user("bob", 1), user("bob-copy", 1, username="bob")])
+        controller.user_cache.watched = True
+        secrets = [SimpleNamespace(metadata=SimpleNamespace(name=f"user-{name}-secret", resource_version="1"),
+                                   data={"password": base64.b64encode(b"pw").decode()}) for name in ("alice", "bob")]
+        controller.k8s_client.list_user_secrets.return_value = (secrets, "1")
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"alice": True}, {}, {})
+        controller.db_client.fetch_catalog_digest.return_value = "catalog"
+        controller._full_pending = False
+        
+        # A single changed object reconciles only its user
+        assert controller.handle_user_object("MODIFIED", user("bob", 2, roles=["ro"])) is True
+        controller._trigger.set()
+        controller.run_when_triggered(0, threading.Event())
+        controller.db_client.fetch_catalog_snapshot.assert_called_once_with({"bob"})
+        created = [op.username for call in controller.db_client.apply_batch.call_args_list
+                   if call.args[0] == "create" for op in call.args[1]]
+        assert created == ["bob"]
+        assert controller.db_client.apply_batch.call_args_list[-1].args[1][0].spec.roles == ["ro"]
+        controller.state_manager.save_users.assert_called_once()
+        controller.state_manager.save_state.assert_not_called()
+        patches = {call.args[0]: call.args[2]["phase"] for call in controller.k8s_client.patch_user_status.call_args_list}
+        assert patches == {"bob": "Ready", "bob-copy": "Conflict"}, "Duplicates should be reported on the object"
+        
+        # Written statuses are remembered, so a full cycle patches nothing new
+        controller.k8s_client.patch_user_status.reset_mock()
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"alice": True, "bob": True}, {}, {})
+        controller.run_cycle("test")
+        patched = [call.args[0] for call in controller.k8s_client.patch_user_status.call_args_list]
+        assert patched == ["alice"], "Only objects whose status changed should be patched"
+        assert controller.metrics.status_patches_count == 3
+        controller.k8s_client.fetch_configmap.assert_not_called()
+    
+    print("✅ PostgreSQLUser resource tests passed!")
+
+
+def test_retrier():
+    """Test jittered retries, per-endpoint circuit breakers and cycle deadline budgets"""
+    print("\n🧪 Testing Retrier...")
+    
+    from types import SimpleNamespace
+    from kubernetes.client.rest import ApiException
+    from controller import (CircuitBreaker, CircuitOpenError, Retrier, KubernetesClient, Metrics,
+                            PostgresUserController, ReconciliationStats, CatalogSnapshot)
+    
+    now = [0.0]
+    clock = lambda: now[0]
+    
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.record_failure() and not breaker.allow(), "Should open after 2 failures"
+    now[0] = 10
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(), "Only one trial call should pass while half-open"
+    assert breaker.record_failure() and breaker.state == CircuitBreaker.OPEN, "A failed trial should re-open"
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    
+    delays = []
+    owner = SimpleNamespace(metrics=Metrics())
+    retrier = Retrier(owner=owner, max_retries=3, base_delay=1, max_delay=2, clock=clock, sleep=delays.append)
+    Retrier.start_cycle(budget=0)
+    
+    flaky = Mock(side_effect=[ApiException(status=503), ApiException(status=503), "ok"])
+    assert retrier.call("kubernetes", flaky) == "ok" and len(delays) == 2
+    assert all(0 <= delay <= 2 for delay in delays), "Backoff should be jittered and capped"
+    assert owner.metrics.retries_count == 2
+    
+    missing = Mock(side_effect=ApiException(status=404))
+    try:
+        retrier.call("kubernetes", missing)
+        assert False, "Non-transient errors should be raised"
+    except ApiException:
+        pass
+    assert missing.call_count == 1 and len(delays) == 2, "Non-transient errors should not be retried"
+    
+    # Only transport failures are transient, not bugs, bad passwords or missing databases
+    import psycopg2
+    import psycopg2.pool
+    import urllib3
+    from controller import is_transient
+    
+    def pg_error(pgcode):
+        # pgcode is read-only on psycopg2 errors
+        return type("PgError", (psycopg2.OperationalError,), {"pgcode": pgcode})("failed")
+    
+    assert is_transient(pg_error(None)) and is_transient(pg_error("57P01")), "Lost connections should be retried"
+    assert not is_transient(pg_error("28P01")) and not is_transient(pg_error("3D000"))
+    assert is_transient(psycopg2.InterfaceError("connection already closed"))
+    assert not is_transient(psycopg2.ProgrammingError("syntax error"))
+    assert not is_transient(psycopg2.pool.PoolError("connection pool exhausted"))
+    assert not is_transient(KeyError("data")) and not is_transient(ValueError("bad spec"))
+    assert is_transient(urllib3.exceptions.MaxRetryError(None, "/api", "connection refused"))
+    assert is_transient(urllib3.exceptions.ProtocolError("Connection aborted."))
+    assert is_transient(ConnectionResetError()) and is_transient(TimeoutError())
+    
+    # The cycle budget stops retries that would overrun it
+    Retrier.start_cycle(budget=0.01, clock=clock)
+    slow = Retrier(owner=owner, max_retries=3, base_delay=100, max_delay=100, clock=clock, sleep=delays.append)
+    down = Mock(side_effect=ApiException(status=500))
+    with patch('controller.full_jitter', side_effect=lambda value: value):
+        try:
+            slow.call("postgres/db:5432", down)
+            assert False, "An exhausted budget should raise"
+        except ApiException:
+            pass
+    assert down.call_count == 1 and len(delays) == 2
+    Retrier.start_cycle(budget=0)
+    
+    # Once open, calls fail fast without touching the endpoint
+    while slow.breaker("postgres/db:5432").state != CircuitBreaker.OPEN:
+        try:
+            slow.call("postgres/db:5432", down)
+        except ApiException:
+            pass
+    calls = down.call_count
+    try:
+        slow.call("postgres/db:5432", down)
+        assert False, "An open circuit should fail fast"
+    except CircuitOpenError as e:
+        assert e.endpoint == "postgres/db:5432"
+    assert down.call_count == calls and slow.breaker("kubernetes").state == CircuitBreaker.CLOSED, \
+        "Breakers should be per endpoint"
+    assert owner.metrics.circuit_states["postgres/db:5432"] == 1 and owner.metrics.circuit_rejections_count == 1
+    assert 'postgres_controller_circuit_state{endpoint="postgres/db:5432"} 1' in owner.metrics.export_prometheus()
+    
+    # Clients retry through their retrier instead of sleeping inline
+    k8s = KubernetesClient(api_client=Mock())
+    k8s.v1 = Mock()
+    k8s.retrier.sleep = lambda delay: None
+    configmap = SimpleNamespace(data={"users.yaml": "users: []"}, binary_data=None)
+    k8s.v1.read_namespaced_config_map.side_effect = [ApiException(status=500), configmap]
+    assert k8s.fetch_configmap("users", "postgres") == "users: []"
+    k8s.v1.read_namespaced_config_map.side_effect = ApiException(status=404)
+    assert k8s.fetch_configmap("users", "postgres") is None
+    
+    # A degraded API server leaves the controller working from its last fetched desired state
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = "users:\n  - username: alice\n"
+        controller.k8s_client.list_user_secrets.return_value = ([], "1")
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"alice": True}, {}, {})
+        controller.db_client.fetch_catalog_digest.side_effect = Exception("no digest")
+        controller.reconcile_users(ReconciliationStats())
+        
+        controller.k8s_client.fetch_configmap.side_effect = CircuitOpenError("kubernetes", 30)
+        controller.k8s_client.list_user_secrets.side_effect = CircuitOpenError("kubernetes", 30)
+        stats = ReconciliationStats()
+        controller.reconcile_users(stats)
+        assert stats.errors == 1 and stats.users_deleted == 0, "Cached desired state should still be applied"
+        assert controller.metrics.users_managed == 1
+    
+    print("✅ Retrier tests passed!")
+
+
+def test_failover_connections():
+    """Test primary validation on checkout and pool invalidation after Patroni failovers"""
+    print("\n🧪 Testing failover-aware connections...")
+    
+    import psycopg2
+    from controller import Config, DatabaseClient, Metrics, Retrier
+    
+    cluster = {"primary": ("10.0.0.1", "t0"), "in_recovery": False, "down": False}
+    
+    def connect():
+        conn = MagicMock(autocommit=False)
+        cursor = conn.cursor.return_value.__enter__.return_value
+        
+        def execute(query):
+            if cluster["down"]:
+                raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        cursor.execute.side_effect = execute
+        cursor.fetchone.side_effect = lambda: (cluster["in_recovery"],) + cluster["primary"]
+        return conn
+    
+    pools = []
+    
+    def make_pool(*args, **kwargs):
+        pools.append(Mock(getconn=Mock(side_effect=connect)))
+        return pools[-1]
+    
+    with patch('controller.psycopg2.pool.ThreadedConnectionPool', side_effect=make_pool) as factory:
+        db = DatabaseClient()
+        db.metrics = Metrics()
+        db.retrier.sleep = lambda delay: None
+        db.retrier.max_retries = 1
+        Retrier.start_cycle(budget=0)
+        assert factory.call_args[1]["target_session_attrs"] == "read-write"
+        
+        conn = db.get_connection()
+        assert not conn.autocommit, "The probe should restore the connection's autocommit mode"
+        db.return_connection(conn)
+        
+        # Role operations leave autocommit on; the pool must not hand that out to a batch
+        conn = db.get_connection()
+        conn.autocommit, conn.closed = True, 0
+        db.return_connection(conn)
+        assert conn.autocommit is False and pools[0].putconn.called
+        assert len(pools) == 1 and db.metrics.pool_invalidations_count == 0
+        
+        # A promoted member behind the same address: the pool is rebuilt proactively
+        cluster["primary"] = ("10.0.0.2", "t1")
+        conn = db.get_connection()
+        assert len(pools) == 2 and pools[0].closeall.called
+        assert db.connection_pool is pools[1] and db.metrics.pool_invalidations_count == 1
+        
+        # Returning a connection of the invalidated pool closes it
+        stale = pools[0].getconn()
+        pools[1].putconn.side_effect = psycopg2.pool.PoolError("trying to put unkeyed connection")
+        db.return_connection(stale)
+        assert stale.close.called
+        pools[1].putconn.side_effect = None
+        
+        # A demoted primary fails checkouts until a new primary accepts connections
+        cluster["in_recovery"] = True
+        try:
+            db.get_connection()
+            assert False, "A server in recovery should not be handed out"
+        except psycopg2.OperationalError as e:
+            assert "in recovery" in str(e)
+        assert db.metrics.pool_invalidations_count >= 2
+        cluster["in_recovery"] = False
+        db.get_connection()
+        
+        # Dead connections are detected before any DDL runs on them
+        cluster["down"] = True
+        try:
+            db.get_connection()
+            assert False, "A dead primary should fail the checkout"
+        except psycopg2.OperationalError:
+            pass
+        cluster["down"] = False
+        invalidations = db.metrics.pool_invalidations_count
+        db.get_connection()
+        
+        histogram = db.metrics.histograms[("postgres_controller_failover_recovery_seconds", "")]
+        assert histogram.count == 3, "Each failover should record one recovery"
+        assert "postgres_controller_db_pool_invalidations_total" in db.metrics.export_prometheus()
+        
+        with patch.object(Config, 'DB_VALIDATE_ON_CHECKOUT', False):
+            cluster["primary"] = ("10.0.0.1", "t2")
+            db.get_connection()
+            assert db.metrics.pool_invalidations_count == invalidations, "Validation can be turned off"
+    
+    print("✅ Failover-aware connection tests passed!")
+
+
+def test_multi_database():
+    """Test per-database pools, the parallel drop pipeline and grants in users' own databases"""
+    print("\n🧪 Testing multi-database grants and drops...")
+    
+    import threading
+    import psycopg2
+    import psycopg2.errors
+    from controller import Config, DatabaseClient, UserOperation, UserSpec
+    
+    executed = []
+    pools = {}
+    acls = {"postgres": "p1", "app": "a1", "analytics": "x1"}
+    failing = set()
+    
+    def make_pool(minconn, maxconn, **params):
+        dbname = params["dbname"]
+        cursor = MagicMock()
+        cursor.__enter__.return_value = cursor
+        
+        def execute(statement, params=None):
+            executed.append((dbname, repr(statement), threading.current_thread().name))
+            if dbname in failing:
+                raise psycopg2.errors.InsufficientPrivilege("permission denied for table orders")
+        cursor.execute.side_effect = execute
+        # Every role of the batch has objects in app, only y in analytics
+        cursor.fetchall.return_value = [("postgres", ["x", "y"]), ("app", ["x", "y"]), ("analytics", ["y"])]
+        cursor.fetchone.side_effect = lambda: (acls[dbname],)
+        conn = MagicMock()
+        conn.cursor.return_value = cursor
+        pools[dbname] = Mock(getconn=Mock(return_value=conn), sizes=(minconn, maxconn))
+        return pools[dbname]
+    
+    with patch('controller.psycopg2.pool.ThreadedConnectionPool', side_effect=make_pool), \
+         patch.object(Config, 'DB_VALIDATE_ON_CHECKOUT', False), \
+         patch.object(Config, 'DB_NAME', "postgres"):
+        db = DatabaseClient()
+        assert db.for_database("postgres") is db and not db.databases
+        
+        count = db.apply_batch("drop", [UserOperation("drop", "x"), UserOperation("drop", "y")])
+        assert set(db.databases) == {"app", "analytics"}, "Only databases holding dependencies should be visited"
+        assert pools["app"].sizes == (0, Config.DATABASE_POOL_MAX_CONN)
+        shdepend = [statement for dbname, statement, _ in executed if "pg_shdepend" in statement]
+        assert len(shdepend) == 1, "Dependencies should be found with a single query"
+        app = [statement for dbname, statement, _ in executed if dbname == "app"]
+        assert len(app) == 2 and "REASSIGN OWNED" in app[0] and "'x'" in app[0] and "'y'" in app[0]
+        analytics = [statement for dbname, statement, _ in executed if dbname == "analytics"]
+        assert "DROP OWNED" in analytics[1] and "'x'" not in analytics[1]
+        assert all(thread.startswith("database") for dbname, _, thread in executed if dbname != "postgres"), \
+            "Databases should be worked on in parallel"
+        main = [statement for dbname, statement, _ in executed if dbname == "postgres" and "pg_shdepend" not in statement]
+        assert "DROP USER" in main[-1] and executed.index(
+            next(e for e in executed if e[0] == "postgres" and "DROP USER" in e[1])) == len(executed) - 1, \
+            "Users should only be dropped once their dependencies are gone"
+        assert count == len(main) + 4
+        
+        # Object privileges are granted in the user's own database, after the user exists
+        executed.clear()
+        spec = UserSpec(username="carol", database="app", roles=[], privileges={"public.orders": ["SELECT"]})
+        local = UserSpec(username="dave", database="postgres", roles=[], privileges={"public.audit": ["SELECT"]})
+        db.apply_batch("create", [UserOperation("create", "carol", spec=spec, password="pw"),
+                                  UserOperation("create", "dave", spec=local, password="pw")])
+        main = [statement for dbname, statement, _ in executed if dbname == "postgres"]
+        assert any("CREATE USER" in s and "'carol'" in s for s in main)
+        assert not any("orders" in s for s in main) and any("audit" in s for s in main)
+        app = [statement for dbname, statement, _ in executed if dbname == "app"]
+        assert len(app) == 1 and "GRANT" in app[0] and "orders" in app[0] and "'carol'" in app[0]
+        
+        executed.clear()
+        db.apply_batch("privileges", [UserOperation("privileges", "carol", spec=spec, privilege_changes={
+            ("table", "public.orders"): (0, 1)})])
+        assert [dbname for dbname, _, _ in executed] == ["app"], "Drift corrections should run where the object is"
+        
+        # The catalog digest covers the ACLs of the users' own databases
+        assert db.fetch_catalog_digest() == "p1"
+        digest = db.fetch_catalog_digest({"postgres", "app"})
+        assert digest != "p1"
+        acls["analytics"] = "x2"
+        assert db.fetch_catalog_digest({"postgres", "app"}) == digest, "Unused databases should not be digested"
+        acls["app"] = "a2"
+        assert db.fetch_catalog_digest({"postgres", "app"}) != digest, "A GRANT in a user's database should be noticed"
+        
+        # A create batch whose grants in another database failed has committed the user already:
+        # the individual fallback grants them without creating the user again
+        executed.clear()
+        failing.add("app")
+        try:
+            db.apply_batch("create", [UserOperation("create", "carol", spec=spec, password="pw")])
+            assert False, "Failed grants should fail the batch"
+        except psycopg2.Error:
+            pass
+        assert any("CREATE USER" in s for dbname, s, _ in executed if dbname == "postgres")
+        executed.clear()
+        failing.clear()
+        db.apply_operation(UserOperation("create", "carol", spec=spec, password="pw"))
+        assert not any("CREATE USER" in s for _, s, _ in executed), "Existing users should not be created again"
+        app = [statement for dbname, statement, _ in executed if dbname == "app"]
+        assert len(app) == 1 and "GRANT" in app[0] and "orders" in app[0]
+        
+        # Parallel batches wait for one of the few connections of a database's pool
+        from concurrent.futures import ThreadPoolExecutor
+        import psycopg2.pool
+        import time
+        checked_out = []
+        
+        def getconn():
+            if len(checked_out) >= Config.DATABASE_POOL_MAX_CONN:
+                raise psycopg2.pool.PoolError("connection pool exhausted")
+            checked_out.append(MagicMock())
+            return checked_out[-1]
+        
+        def work(_):
+            conn = db.for_database("app").get_connection()
+            time.sleep(0.01)
+            db.for_database("app").return_connection(conn)
+        
+        pools["app"].getconn.reset_mock()
+        pools["app"].getconn.side_effect = getconn
+        pools["app"].putconn.side_effect = checked_out.remove
+        with ThreadPoolExecutor(max_workers=Config.DATABASE_POOL_MAX_CONN * 3) as executor:
+            list(executor.map(work, range(12)))
+        assert pools["app"].getconn.call_count == 12 and not checked_out
+        
+        db.close()
+        assert pools["app"].closeall.called and pools["postgres"].closeall.called
+    
+    print("✅ Multi-database tests passed!")
+
+
+def test_reconcile_plan():
+    """Test the costed reconcile plan shared by dry and live runs"""
+    print("\n🧪 Testing reconcile plan...")
+    
+    from controller import (PostgresUserController, PlanExecutor, ReconcilePlan, ReconciliationStats,
+                            CatalogSnapshot, UserOperation, UserSpec, Config, PRIVILEGE_BITS)
+    
+    client = Mock()
+    client.dbname = "postgres"
+    client.apply_batch.side_effect = lambda kind, ops: len(ops)
+    client.fetch_dependency_counts.return_value = {"old": {None: (0, 1), "app": (40, 3), "postgres": (2, 0)}}
+    
+    spec = UserSpec(username="alice", database="app", roles=["reader"],
+                    privileges={"public.orders": ["SELECT"]})
+    update = UserOperation("update", "bob", grant={"writer"}, revoke={"reader"})
+    privileges = UserOperation("privileges", "carol", spec=UserSpec(username="carol", database="app", roles=[]),
+                               privilege_changes={("table", "public.orders"): (PRIVILEGE_BITS["SELECT"], 0)})
+    operations = [update, privileges, UserOperation("drop", "old"),
+                  UserOperation("create", "alice", spec=spec, password="s3cret"),
+                  UserOperation("create_role", "reader")]
+    
+    executor = PlanExecutor(client, batch_size=2)
+    plan = executor.plan(operations)
+    assert [op.kind for op in plan] == ["create_role", "drop", "create", "update", "privileges"], \
+        "Roles should come first and drops before creations"
+    assert len(plan) == 5 and [kind for kind, _ in plan.phases()] == [op.kind for op in plan]
+    client.fetch_dependency_counts.assert_called_once_with(["old"])
+    
+    drop = plan.cost_of(plan.batches[1][1][0])
+    assert drop.owned_objects == 42 and drop.privilege_entries == 4, "Dependencies should be summed over databases"
+    assert drop.databases == ["app"] and drop.statements == 6, "Other databases need their own REASSIGN and DROP"
+    create = plan.cost_of(plan.batches[2][1][0])
+    assert create.grants == 2 and create.statements == 4 and create.databases == ["app"]
+    assert plan.cost_of(update).statements == 2 and plan.cost_of(privileges).grants == 1
+    assert create.estimated_seconds == 4 * Config.PLAN_STATEMENT_SECONDS, "Unmeasured kinds use the default latency"
+    
+    document = json.loads(plan.to_json(dry_run=True))
+    assert document["dry_run"] and document["totals"]["operations"] == 5
+    assert document["totals"]["statements"] == sum(op["statements"] for op in document["operations"])
+    assert [op["order"] for op in document["operations"]] == list(range(5))
+    assert document["operations"][2]["roles"] == ["reader"]
+    assert "s3cret" not in json.dumps(document), "Passwords must never be part of a plan"
+    
+    # A live run executes the very same batches
+    results = executor.execute(plan)
+    assert [result.kind for result in results] == [kind for kind, _ in plan.batches]
+    assert client.fetch_dependency_counts.call_count == 1, "Executing a plan should not re-estimate it"
+    
+    # Estimates are best effort
+    client.fetch_dependency_counts.side_effect = Exception("permission denied")
+    fallback = executor.plan([UserOperation("drop", "old")])
+    assert fallback.cost_of(next(iter(fallback))).statements == 4, "Failed counts should not block the plan"
+    
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         patch.object(Config, 'PLAN_OUTPUT', os.path.join(tmpdir, "plan.json")), \
+         patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = (
+            "users:\n"
+            "  - username: alice\n"
+            "    database: app\n"
+            "    roles: [reader]\n"
+        )
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({}, {}, {})
+        controller.db_client.fetch_dependency_counts.return_value = {}
+        controller.k8s_client.get_user_password.return_value = "s3cret"
+        
+        controller.reconcile_users(ReconciliationStats(), dry_run=True)
+        
+        assert isinstance(controller.last_plan, ReconcilePlan)
+        with open(Config.PLAN_OUTPUT) as f:
+            document = json.load(f)
+        assert document["dry_run"], "The plan should record that it was not applied"
+        assert [(op["kind"], op["username"]) for op in document["operations"]] == [
+            ("create_role", "reader"), ("create", "alice")], "Role creations should be part of the plan"
+        controller.db_client.apply_batch.assert_not_called()
+        controller.db_client.create_role.assert_not_called()
+    
+    print("✅ Reconcile plan tests passed!")
+
+
+def test_role_graph():
+    """Test the role graph: reference counts, incremental updates, ordering, cycles and unused-role drops"""
+    print("\n🧪 Testing role graph...")
+    
+    from controller import (PostgresUserController, DatabaseClient, AsyncDatabaseClient, DesiredStateLoader,
+                            RoleGraph, RoleSpec, RoleCycleError, ReconciliationStats, CatalogSnapshot,
+                            UserOperation, UserSpec, Config)
+    
+    content = (
+        "roles:\n"
+        "  - name: analyst\n"
+        "    member_of: [reader]\n"
+        "  - name: reader\n"
+        "users:\n"
+        "  - username: alice\n"
+        "    roles: [analyst, legacy]\n"
+    )
+    for streaming in (False, True):
+        loader = DesiredStateLoader(streaming=streaming)
+        assert set(loader.load(content)) == {"alice"}
+        assert loader.roles == {"analyst": RoleSpec("analyst", ["reader"]), "reader": RoleSpec("reader")}, \
+            "The roles section should be parsed by both loaders"
+    roles = loader.roles
+    
+    users = {"alice": UserSpec("alice", "test", ["analyst", "legacy"]), "bob": UserSpec("bob", "test", ["legacy"])}
+    graph = RoleGraph()
+    assert graph.update(users, roles) == 4
+    assert graph.refcounts == {"analyst": 2, "reader": 2, "legacy": 2}, "Declared roles count as a reference"
+    assert graph.parents_of("analyst") == ["reader"] and graph.roles == {"analyst", "reader", "legacy"}
+    assert graph.topological_order() == ["reader", "analyst", "legacy"], "Parents should come first"
+    assert graph.update(users, roles, []) == 0, "Unchanged users should cost nothing"
+    
+    # Only the changed edges are touched; roles losing their last reference become orphans
+    users["alice"] = users["alice"].replace(roles=["analyst"])
+    assert graph.update(users, roles, ["alice"]) == 1 and not graph.orphans
+    del users["bob"]
+    assert graph.update(users, roles, ["bob"]) == 1 and graph.orphans == {"legacy"}
+    assert graph.update(users, roles, ["alice"]) == 0 and "legacy" not in graph.refcounts
+    
+    # Diff against pg_auth_members
+    snapshot = CatalogSnapshot({"analyst": False, "reader": False, "writer": False}, {"analyst": {"writer"}}, {})
+    actual = RoleGraph.from_catalog(snapshot, ["analyst", "reader"])
+    assert graph.diff(actual, ["analyst", "reader"]) == {"analyst": ({"reader"}, {"writer"})}
+    
+    # A cycle is reported with its path
+    cyclic = RoleGraph()
+    cyclic.update({}, {"a": RoleSpec("a", ["b"]), "b": RoleSpec("b", ["c"]), "c": RoleSpec("c", ["a"])})
+    try:
+        cyclic.topological_order()
+        assert False, "A membership cycle should be rejected"
+    except RoleCycleError as e:
+        assert e.cycle[0] == e.cycle[-1] and set(e.cycle) == {"a", "b", "c"}
+    
+    # Roles are created parents first, joining their parents in the same statement
+    db = DatabaseClient.__new__(DatabaseClient)
+    statements = [repr(statement) for statement, _ in db._batch_statements(
+        "create_role", [UserOperation("create_role", "reader"),
+                        UserOperation("create_role", "analyst", grant={"reader"})])]
+    assert "NOLOGIN" in statements[0] and "IN ROLE" not in statements[0]
+    assert "IN ROLE" in statements[1] and "'reader'" in statements[1]
+    assert AsyncDatabaseClient().render_batch("create_role", [
+        UserOperation("create_role", "analyst", grant={"reader"})]) == ['CREATE ROLE "analyst" NOLOGIN IN ROLE "reader";']
+    assert "DROP ROLE" in repr(db._batch_statements("drop_role", [UserOperation("drop_role", "legacy")])[-1][0])
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'), \
+         patch.object(Config, 'RECONCILE_PRIVILEGES', False), \
+         patch.object(Config, 'DROP_UNUSED_ROLES', True):
+        
+        controller = PostgresUserController()
+        stats = ReconciliationStats()
+        operations = controller.plan_role_operations(users, snapshot, graph=graph, stats=stats)
+        assert [(op.kind, op.username) for op in operations] == [("role_update", "analyst")], \
+            "Existing declared roles should only be diffed"
+        operations = controller.plan_role_operations(users, CatalogSnapshot({}, {}, {}), graph=graph)
+        assert [(op.username, op.grant) for op in operations] == [("reader", set()), ("analyst", {"reader"})]
+        assert controller.plan_role_operations({}, snapshot, graph=cyclic, stats=stats)[0].kind == "create_role"
+        assert stats.errors == 1, "A cycle should be counted as an error"
+        
+        # A full cycle loads the roles section and plans the whole hierarchy
+        controller.k8s_client.fetch_configmap.return_value = content
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({}, {}, {})
+        controller.db_client.fetch_dependency_counts.return_value = {}
+        controller.k8s_client.get_user_password.return_value = "s3cret"
+        controller.reconcile_users(ReconciliationStats(), dry_run=True)
+        planned = [(op.kind, op.username) for op in controller.last_plan]
+        assert planned[:3] == [("create_role", "reader"), ("create_role", "analyst"), ("create_role", "legacy")]
+        assert controller.role_graph.refcounts["reader"] == 2
+        
+        # Unused roles are dropped only once nobody outside the desired state holds them
+        graph = controller.role_graph
+        previous = {"alice": UserSpec("alice", "test", ["analyst", "legacy"]),
+                    "bob": UserSpec("bob", "test", ["shared"])}
+        graph.update(previous, roles)
+        desired = {"alice": UserSpec("alice", "test", ["analyst"])}
+        graph.update(desired, roles, ["alice", "bob"])
+        graph.orphans.add("gone")
+        assert graph.orphans == {"legacy", "shared", "gone"}
+        snapshot = CatalogSnapshot(
+            {"alice": True, "bob": True, "carol": True, "analyst": False, "reader": False,
+             "legacy": False, "shared": False},
+            {"alice": {"analyst", "legacy"}, "bob": {"shared"}, "carol": {"shared"}, "analyst": {"reader"}}, {})
+        cleanup = controller.plan_role_cleanup(desired, snapshot, graph, {"bob"})
+        assert [op.username for op in cleanup] == ["legacy"], "carol still holds shared"
+        assert graph.orphans == {"legacy", "shared"}, "Roles that no longer exist should be forgotten"
+        
+        controller.db_client.apply_batch.side_effect = lambda kind, ops: len(ops)
+        stats = ReconciliationStats()
+        controller.apply_drift(desired, {"alice", "bob", "carol"}, previous, snapshot, stats, role_graph=graph)
+        kinds = [op.kind for op in controller.last_plan]
+        assert kinds == ["drop", "update", "drop_role"], "Unused roles should be dropped last"
+        assert stats.roles_deleted == 1 and graph.orphans == {"shared"} and "legacy" not in snapshot.roles
+        
+        # Without DROP_UNUSED_ROLES nothing is dropped
+        with patch.object(Config, 'DROP_UNUSED_ROLES', False):
+            graph.orphans.add("legacy")
+            snapshot.roles["legacy"] = False
+            controller.apply_drift(desired, {"alice"}, desired, snapshot, ReconciliationStats(), role_graph=graph)
+            assert "drop_role" not in [op.kind for op in controller.last_plan]
+    
+    print("✅ Role graph tests passed!")
+
+
+def test_drift_notifications():
+    """Test drift notifications: trigger install, listener dispatch, attribution and single-user repair"""
+    print("\n🧪 Testing drift notifications...")
+    
+    from controller import (PostgresUserController, DatabaseClient, DriftIndex, DriftListener, CatalogSnapshot,
+                            ReconciliationStats, UserSpec, Config, DRIFT_TRIGGER_TAGS)
+    
+    desired = {
+        "alice": UserSpec("alice", "app", ["reader"]),
+        "Bob": UserSpec("Bob", "postgres", [], privileges={"public.orders": ["SELECT"]}),
+    }
+    index = DriftIndex(desired)
+    assert index.databases == {"app", "postgres"} and index.objects == {"orders": {"Bob"}}
+    
+    def event(**fields):
+        return json.dumps({"tag": "GRANT", "object": None, "query": None, "truncated": False, **fields})
+    
+    assert index.users_of(event(query="GRANT SELECT ON t TO Alice, mallory")) == {"alice"}, \
+        "Bare identifiers fold to lower case, unmanaged roles are ignored"
+    assert index.users_of(event(query='REVOKE ALL ON t FROM "Bob"')) == {"Bob"}
+    assert index.users_of(event(tag="CREATE TABLE", object="public.orders")) == {"Bob"}, \
+        "A new object should concern the users holding privileges on it"
+    assert index.users_of(event(query="GRANT SELECT ON t TO carol")) == set()
+    assert index.users_of(event(query="GRANT ...", truncated=True)) is None
+    assert index.users_of("not json") is None
+    
+    # The trigger is installed idempotently for the reported tags only
+    db = DatabaseClient.__new__(DatabaseClient)
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    with patch.object(DatabaseClient, 'get_connection', return_value=conn), \
+         patch.object(DatabaseClient, 'return_connection'), \
+         patch.object(DatabaseClient, 'connection_params', return_value={"dbname": "postgres"}):
+        assert db.install_drift_trigger("drift")
+        function, trigger = [repr(call.args[0]) for call in cursor.execute.call_args_list]
+        assert "pg_notify" in function and "Literal('drift')" in function
+        assert "IF NOT EXISTS" in trigger and all(f"Literal('{tag}')" in trigger for tag in DRIFT_TRIGGER_TAGS)
+        assert "ROLE" not in " ".join(DRIFT_TRIGGER_TAGS), "Event triggers never fire for shared objects"
+    
+    # The listener dispatches notifications of ready connections and reports reconnects
+    received = []
+    client = Mock()
+    client.dbname = "postgres"
+    client.for_database.return_value = client
+    connections = [MagicMock(), MagicMock()]
+    connections[0].notifies = [Mock(payload="one"), Mock(payload="two")]
+    connections[1].notifies = []
+    client.listen.side_effect = connections
+    listener = DriftListener(client, lambda database, payload: received.append((database, payload)), "drift")
+    with patch('controller.select.select', side_effect=lambda ready, *_: (ready, [], [])):
+        assert listener.poll(0) == 2
+        assert received == [("postgres", "one"), ("postgres", "two")]
+        client.install_drift_trigger.assert_called_once_with("drift")
+        listener.close()
+        listener.poll(0)
+        assert received[-1] == ("postgres", None), "A reconnect should report missed notifications"
+    
+    # A database that cannot be reached backs off alone; one without a trigger is skipped
+    now = [0.0]
+    healthy, broken, untriggered = Mock(), Mock(), Mock()
+    healthy.install_drift_trigger.return_value = True
+    healthy.listen.return_value.notifies = []
+    broken.install_drift_trigger.return_value = True
+    broken.listen.side_effect = Exception("connection refused")
+    untriggered.install_drift_trigger.return_value = False
+    client = Mock()
+    client.dbname = "postgres"
+    client.for_database.side_effect = {"postgres": healthy, "app": broken, "reports": untriggered}.get
+    received = []
+    listener = DriftListener(client, lambda database, payload: received.append((database, payload)), "drift",
+                             clock=lambda: now[0])
+    listener.watch({"app", "reports"})
+    with patch('controller.select.select', side_effect=lambda ready, *_: (ready, [], [])):
+        listener.poll(0)
+        listener.poll(0)
+        assert set(listener._connections) == {"postgres"}, "A failing database should not affect the others"
+        assert broken.listen.call_count == 1, "A failing database should back off before reconnecting"
+        untriggered.listen.assert_not_called()
+        now[0] += 60
+        listener.poll(0)
+        assert broken.listen.call_count == 2 and untriggered.install_drift_trigger.call_count == 1
+        assert healthy.listen.call_count == 1 and received == [], "Healthy connections should be kept"
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'), \
+         patch.object(Config, 'USERS_SOURCE', 'configmap'), \
+         patch.object(Config, 'RECONCILE_PRIVILEGES', False), \
+         patch.object(Config, 'RECONCILE_PASSWORDS', False):
+        
+        controller = PostgresUserController()
+        controller._full_pending = False
+        controller.handle_drift_notification("app", event(query="GRANT x TO alice"))
+        assert controller._trigger.is_set() and controller._dirty_users == set() and controller._full_pending, \
+            "Without a full cycle nothing can be attributed"
+        
+        controller._full_pending = False
+        controller._trigger.clear()
+        controller.drift_index = index
+        controller.handle_drift_notification("app", event(query="GRANT x TO carol"))
+        assert not controller._trigger.is_set(), "Changes to unmanaged roles need no cycle"
+        controller.handle_drift_notification("app", event(query="REVOKE reader FROM alice"))
+        assert controller._dirty_users == {"alice"} and not controller._full_pending
+        assert controller.metrics.drift_notifications_count == 3
+        
+        # Only the notified user is read and repaired
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"reader": False}, {}, {})
+        controller.db_client.fetch_dependency_counts.return_value = {}
+        controller.db_client.apply_batch.side_effect = lambda kind, ops: len(ops)
+        controller.k8s_client.get_user_password.return_value = "s3cret"
+        stats = controller.run_cycle("drift", usernames={"alice", "carol"})
+        controller.db_client.fetch_catalog_snapshot.assert_called_once_with({"alice"})
+        assert stats.users_created == 1 and [op.username for op in controller.last_plan] == ["alice"]
+        controller.state_manager.save_users.assert_called_once_with({"alice": desired["alice"]})
+        
+        # Hand-made role memberships are repaired even though the spec did not change,
+        # but only roles the controller grants are revoked
+        users = {**desired, "carol": UserSpec("carol", "app", ["writer"])}
+        snapshot = CatalogSnapshot({"alice": True, "reader": False, "writer": False, "admin": False},
+                                   {"alice": {"writer", "admin", "pg_monitor"}}, {})
+        ops = controller.plan_user_operations(users, {"alice": users["alice"]}, snapshot,
+                                              (set(), set(), {"alice"}), lambda username: None,
+                                              ReconciliationStats())
+        assert [(op.kind, op.grant, op.revoke) for op in ops] == [("update", {"reader"}, {"writer"})], \
+            "Memberships granted by others and system roles should be kept"
+        
+        # Roles of the previous spec are managed too, system roles never are
+        previous = {"alice": UserSpec("alice", "app", ["admin", "pg_monitor"])}
+        ops = controller.plan_user_operations(users, previous, snapshot, (set(), set(), {"alice"}),
+                                              lambda username: None, ReconciliationStats())
+        assert [(op.grant, op.revoke) for op in ops] == [({"reader"}, {"writer", "admin"})]
+    
+    print("✅ Drift notification tests passed!")
+
+
+def test_plan_executor():
+    """Test batched DDL execution and per-user fallback"""
+    print("\n🧪 Testing PlanExecutor...")
+    
+    from controller import DatabaseClient, PlanExecutor, UserOperation, UserSpec
+    
+    def create(username, roles):
+        spec = UserSpec(username=username, database="test", roles=roles)
+        return UserOperation("create", username, spec=spec, password="pw")
+    
+    # Statements are coalesced across users sharing the same role set
+    db = DatabaseClient.__new__(DatabaseClient)
+    ops = [create("alice", ["a", "b"]), create("bob", ["b", "a"]), create("carol", ["c"])]
+    statements = [repr(statement) for statement, _ in db._batch_statements("create", ops)]
+    assert len(statements) == 9, "Expected 3 CREATE USER with their comments, 1 CONNECT and 2 role GRANTs"
+    assert "COMMENT ON ROLE" in statements[1] and "'alice'" in statements[1], "New users should be marked as managed"
+    grants = [s for s in statements if "GRANT " in s and "CONNECT" not in s]
+    assert any("'alice'" in s and "'bob'" in s for s in grants), "Identical role sets should be coalesced"
+    
+    drops = db._batch_statements("drop", [UserOperation("drop", "x"), UserOperation("drop", "y")])
+    assert len(drops) == 4, "Drops should use multi-user statements"
+    
+    # A failing batch falls back to per-user execution for that batch only
+    client = Mock()
+    client.apply_batch.side_effect = [Exception("duplicate role"), 3]
+    client.apply_operation.side_effect = lambda op: (_ for _ in ()).throw(Exception("boom")) \
+        if op.username == "bob" else None
+    
+    executor = PlanExecutor(client, batch_size=2)
+    results = executor.execute([create("alice", []), create("bob", []), create("carol", [])])
+    
+    assert len(results) == 2, "Three users in batches of two should give two batches"
+    assert results[0].fallback and results[0].succeeded == ["alice"], "Fallback should apply healthy users"
+    assert results[0].failed == ["bob"], "Only the poisoned user should fail"
+    assert not results[1].fallback and results[1].statements == 3, "Second batch should commit as a whole"
+    assert client.apply_operation.call_count == 2, "Only the failed batch should be retried"
+    
+    print("✅ PlanExecutor tests passed!")
+
+
+def test_secret_cache():
+    """Test bulk Secret listing and the password cache"""
+    print("\n🧪 Testing SecretCache...")
+    
+    import base64
+    from types import SimpleNamespace
+    from controller import PostgresUserController, SecretCache, ReconciliationStats, CatalogSnapshot
+    
+    def secret(name, password, rv="1"):
+        data = {"password": base64.b64encode(password.encode()).decode()} if password else {}
+        return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=rv), data=data)
+    
+    cache = SecretCache()
+    cache.load([secret("user-demo-user-secret", "s3cret"), secret("user-empty-secret", None)], "5")
+    assert cache.synced and len(cache) == 2, "Cache should hold listed Secrets"
+    assert cache.get_password("demo_user") == "s3cret", "Usernames should map to Secret names"
+    assert cache.get_password("empty") is None, "Secrets without password should return None"
+    assert cache.get_password("missing") is None, "Unknown users should return None"
+    
+    cache.apply_event("MODIFIED", secret("user-demo-user-secret", "rotated", "6"))
+    assert cache.get_password("demo_user") == "rotated", "Watch events should invalidate decoded values"
+    cache.apply_event("DELETED", secret("user-demo-user-secret", "rotated", "7"))
+    assert cache.get_password("demo_user") is None, "Deleted Secrets should be evicted"
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = (
+            "users:\n"
+            "  - username: alice\n"
+            "  - username: bob\n"
+        )
+        controller.k8s_client.list_user_secrets.return_value = (
+            [secret("user-alice-secret", "a"), secret("user-bob-secret", "b")], "9"
+        )
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({}, {}, {})
+        
+        stats = ReconciliationStats()
+        controller.reconcile_users(stats)
+        
+        assert controller.k8s_client.list_user_secrets.call_count == 1, "Secrets should be listed once"
+        assert not controller.k8s_client.get_user_password.called, "No per-user Secret reads expected"
+        created = controller.db_client.apply_batch.call_args.args[1]
+        assert sorted(op.password for op in created) == ["a", "b"], "Passwords should come from the cache"
+    
+    print("✅ SecretCache tests passed!")
+
+
+def test_fingerprint_short_circuit():
+    """Test skipping cycles when nothing changed"""
+    print("\n🧪 Testing fingerprint short-circuit...")
+    
+    from controller import PostgresUserController, ReconciliationStats, CatalogSnapshot, UserSpec
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.k8s_client.fetch_configmap.return_value = "users:\n  - username: alice\n"
+        controller.state_manager.load_state.return_value = {
+            "alice": UserSpec(username="alice", database="postgres", roles=[])
+        }
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({"alice": True}, {}, {})
+        controller.db_client.fetch_catalog_digest.return_value = "digest-1"
+        
+        first = ReconciliationStats()
+        controller.reconcile_users(first)
+        second = ReconciliationStats()
+        controller.reconcile_users(second)
+        
+        assert not first.short_circuited, "First cycle should run fully"
+        assert second.short_circuited, "Unchanged cycle should be skipped"
+        assert controller.db_client.fetch_catalog_snapshot.call_count == 1, "Skipped cycle should not snapshot"
+        assert controller.state_manager.load_state.call_count == 1, "Skipped cycle should not load state"
+        
+        controller.metrics.record_reconciliation(second)
+        assert controller.metrics.cycles_short_circuited_count == 1, "Skipped cycles should be counted"
+        assert "postgres_controller_cycles_short_circuited_total 1" in controller.metrics.export_prometheus()
+        
+        # Out-of-band catalog change forces a full cycle
+        controller.db_client.fetch_catalog_digest.return_value = "digest-2"
+        third = ReconciliationStats()
+        controller.reconcile_users(third)
+        assert not third.short_circuited, "Catalog drift should trigger a full cycle"
+        
+        # Desired state change forces a full cycle
+        controller.k8s_client.fetch_configmap.return_value = "users:\n  - username: bob\n"
+        fourth = ReconciliationStats()
+        controller.reconcile_users(fourth)
+        assert not fourth.short_circuited, "ConfigMap change should trigger a full cycle"
+        
+        # Dry runs never short-circuit, so they should not pay for the digest query
+        controller.db_client.fetch_catalog_digest.reset_mock()
+        controller.reconcile_users(ReconciliationStats(), dry_run=True)
+        controller.db_client.fetch_catalog_digest.assert_not_called()
+    
+    print("✅ Fingerprint short-circuit tests passed!")
+
+
+def test_parallel_executor():
+    """Test parallel batch execution with ordered phases"""
+    print("\n🧪 Testing parallel PlanExecutor...")
+    
+    import threading
+    import time
+    from controller import PlanExecutor, UserOperation, UserSpec, Metrics
+    
+    events = []
+    active = [0, 0]
+    lock = threading.Lock()
+    
+    def apply_batch(kind, ops):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+            events.append(("start", kind))
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            events.append(("end", kind))
+        return len(ops)
+    
+    client = Mock()
+    client.apply_batch.side_effect = apply_batch
+    metrics = Metrics()
+    executor = PlanExecutor(client, batch_size=10, workers=4, metrics=metrics)
+    
+    spec = UserSpec(username="u", database="test", roles=["r"])
+    ops = [UserOperation("create_role", f"role{i}") for i in range(4)]
+    ops += [UserOperation("create", f"user{i}", spec=spec, password="pw") for i in range(8)]
+    results = executor.execute(ops)
+    
+    assert len(results) == 5, "Small phases should be spread across workers"
+    assert results[0].kind == "create_role" and results[0].size == 4, \
+        "Role creations are ordered, so they stay in one sequential batch"
+    assert active[1] > 1, "Batches of a phase should run concurrently"
+    last_role_end = max(i for i, e in enumerate(events) if e == ("end", "create_role"))
+    first_create_start = min(i for i, e in enumerate(events) if e == ("start", "create"))
+    assert last_role_end < first_create_start, "Roles must be created before grants"
+    assert sum(metrics.worker_batches.values()) == 5, "Worker batches should be recorded"
+    assert metrics.executor_queue_depth == 0, "Queue should be drained"
+    assert metrics.executor_workers == 4, "Worker count should be exported"
+    assert 'postgres_controller_worker_batches_total{worker="ddl-worker_0"}' in metrics.export_prometheus()
+    
+    print("✅ Parallel PlanExecutor tests passed!")
+
+
+def test_work_queue():
+    """Test the rate-limited per-user work queue"""
+    print("\n🧪 Testing WorkQueue...")
+    
+    from controller import (
+        WorkQueue, PostgresUserController, ReconciliationStats, CatalogSnapshot, UserSpec, BatchResult
+    )
+    
+    now = [100.0]
+    queue = WorkQueue(base_delay=1.0, max_delay=8.0, clock=lambda: now[0])
+    queue.add("carol")
+    queue.add("alice")
+    queue.add("bob")
+    queue.add("alice")
+    assert len(queue) == 3, "Duplicate keys should collapse"
+    assert queue.pop_ready() == ["carol", "alice", "bob"], "Keys should be served in the order they became ready"
+    assert len(queue) == 0
+    
+    with patch("controller.random.uniform", side_effect=lambda low, high: high):
+        delays = [queue.add_rate_limited("poison") for _ in range(5)]
+    assert delays == [1.0, 2.0, 4.0, 8.0, 8.0], "Backoff should grow per key up to the cap"
+    assert queue.num_requeues("poison") == 5 and len(queue) == 1
+    queue.add_after("healthy", 0.5)
+    assert queue.ready_in() == 0.5
+    now[0] += 0.5
+    assert queue.pop_ready() == ["healthy"] and queue.is_waiting("poison"), "Others should not wait"
+    queue.add("poison")
+    assert queue.pop_ready() == ["poison"], "A fresh event should skip the remaining backoff"
+    queue.forget("poison")
+    assert queue.num_requeues("poison") == 0
+    
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController()
+        controller.queue = WorkQueue(base_delay=60.0, clock=lambda: now[0])
+        controller.k8s_client.fetch_configmap.return_value = (
+            "users:\n"
+            "  - username: alice\n"
+            "    roles: [analyst]\n"
+            "  - username: poison\n"
+            "    roles: [analyst]\n"
+        )
+        controller.k8s_client.list_user_secrets.return_value = ([], "1")
+        previous = {name: UserSpec(username=name, database="postgres", roles=[]) for name in ("alice", "poison")}
+        controller.state_manager.load_state.return_value = previous
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot(
+            {"alice": True, "poison": True, "analyst": False}, {}, {}
+        )
+        controller.executor.execute = Mock(side_effect=lambda ops, dry_run=False: [
+            BatchResult("update", len(ops), succeeded=[op.username for op in ops if op.username != "poison"],
+                        failed=[op.username for op in ops if op.username == "poison"])
+        ])
+        
+        with patch("controller.random.uniform", side_effect=lambda low, high: high):
+            first = ReconciliationStats()
+            controller.reconcile_users(first)
+        assert first.errors == 1 and controller.queue.is_waiting("poison"), "Failed user should back off"
+        saved = controller.state_manager.save_state.call_args.args[0]
+        assert saved["alice"].roles == ["analyst"] and saved["poison"].roles == [], \
+            "Failed users should keep their last applied spec"
+        
+        previous["alice"] = saved["alice"]
+        controller.k8s_client.list_user_secrets.return_value = ([], "2")
+        second = ReconciliationStats()
+        controller.reconcile_users(second)
+        applied = [op.username for op in controller.executor.execute.call_args.args[0]]
+        assert "poison" not in applied and second.users_deferred == 1, "Poisoned user should be held back"
+        assert controller._last_fingerprint is None, "Cycles with deferred users should not short-circuit"
+        
+        controller.handle_watch_event("secret", "MODIFIED", "user-poison-secret")
+        assert not controller.queue.is_waiting("poison"), "Secret change should make the user ready"
+        third = ReconciliationStats()
+        controller.reconcile_users(third)
+        applied = [op.username for op in controller.executor.execute.call_args.args[0]]
+        assert "poison" in applied and third.users_deferred == 0, "Ready user should be retried"
+        assert controller.queue.num_requeues("poison") == 2, "Backoff should keep growing while failing"
+        assert "postgres_controller_workqueue_retries_total 2" in controller.metrics.export_prometheus()
+    
+    print("✅ WorkQueue tests passed!")
+
+
+def test_replica_coordination():
+    """Test Lease leader election, consistent-hash sharding and advisory locks"""
+    print("\n🧪 Testing replica coordination...")
+    
+    import copy
+    from kubernetes.client.rest import ApiException
+    from controller import (
+        ReplicaCoordinator, HashRing, DatabaseClient, PostgresUserController, ReconciliationStats,
+        UserOperation, UserSpec, CatalogSnapshot
+    )
+    
+    class FakeLeases:
+        """Lease API with resourceVersion compare-and-swap"""
+        
+        def __init__(self):
+            self.leases = {}
+            self.version = 0
+        
+        def read_lease(self, name, namespace):
+            return copy.deepcopy(self.leases.get(name))
+        
+        def _store(self, lease):
+            self.version += 1
+            lease.metadata.resource_version = str(self.version)
+            self.leases[lease.metadata.name] = copy.deepcopy(lease)
+        
+        def create_lease(self, namespace, lease):
+            if lease.metadata.name in self.leases:
+                raise ApiException(status=409)
+            self._store(lease)
+        
+        def replace_lease(self, name, namespace, lease):
+            if self.leases[name].metadata.resource_version != lease.metadata.resource_version:
+                raise ApiException(status=409)
+            self._store(lease)
+        
+        def list_leases(self, namespace, label_selector):
+            key, _, value = label_selector.partition("=")
+            return [copy.deepcopy(lease) for lease in self.leases.values()
+                    if (lease.metadata.labels or {}).get(key) == value]
+        
+        def delete_lease(self, name, namespace):
+            self.leases.pop(name, None)
+    
+    now = [0.0]
+    api = FakeLeases()
+    a = ReplicaCoordinator(api, identity="a", sharded=False, clock=lambda: now[0])
+    b = ReplicaCoordinator(api, identity="b", sharded=False, clock=lambda: now[0])
+    a.step()
+    b.step()
+    assert a.is_active() and not b.is_active(), "Only one replica should lead"
+    
+    # a stops renewing: b takes over once the Lease has not changed for its duration
+    for _ in range(4):
+        now[0] += 5
+        b.step()
+    assert not a.is_active(), "A replica must stop acting once its renewals are too old"
+    assert b.is_active() and api.leases["user-controller"].spec.lease_transitions == 1
+    b.stop()
+    assert api.leases["user-controller"].spec.holder_identity is None, "Leader should release its Lease"
+    a.step()
+    assert a.is_active(), "A released Lease should be taken over at once"
+    
+    # Consistent hashing: removing a member only moves that member's users
+    usernames = [f"user{i}" for i in range(2000)]
+    three, two = HashRing(["a", "b", "c"]), HashRing(["a", "b"])
+    shares = {member: sum(1 for u in usernames if three.owner(u) == member) for member in "abc"}
+    assert all(400 < share < 900 for share in shares.values()), f"Users should spread evenly: {shares}"
+    moved = [u for u in usernames if three.owner(u) != two.owner(u)]
+    assert moved and all(three.owner(u) == "c" for u in moved), "Only users of the removed shard should move"
+    
+    api = FakeLeases()
+    changes = []
+    shards = [ReplicaCoordinator(api, identity=name, sharded=True, clock=lambda: now[0],
+                                 on_change=lambda name=name: changes.append(name)) for name in "abc"]
+    for _ in range(2):
+        for shard in shards:
+            shard.step()
+    assert all(shard.ring.members == ["a", "b", "c"] for shard in shards), "Shards should see each other"
+    owners = [[shard.identity for shard in shards if shard.owns(u)] for u in usernames]
+    assert all(len(owner) == 1 for owner in owners), "Every user should have exactly one shard"
+    shards[2].stop()
+    for shard in shards[:2]:
+        shard.step()
+    assert shards[0].ring.members == ["a", "b"] and "a" in changes, "Leaving shards should rebalance"
+    
+    # Sharded reconcile only sees its own users
+    with patch('controller.KubernetesClient'), \
+         patch('controller.DatabaseClient'), \
+         patch('controller.create_state_manager'):
+        
+        controller = PostgresUserController(coordinator=shards[0])
+        assert controller.db_client.advisory_locks, "Coordinated replicas should lock around DDL"
+        controller.k8s_client.fetch_configmap.return_value = "users:\n" + "".join(
+            f"  - username: {u}\n" for u in usernames[:50])
+        controller.state_manager.load_state.return_value = {}
+        controller.db_client.fetch_catalog_snapshot.return_value.users = set()
+        controller.db_client.fetch_catalog_snapshot.return_value.group_roles = set()
+        controller.k8s_client.list_user_secrets.return_value = ([], "1")
+        controller.secret_cache.get_password = lambda username: "pw"
+        controller.executor.execute = Mock(return_value=[])
+        controller.reconcile_users(ReconciliationStats())
+        planned = [op.username for op in controller.executor.execute.call_args_list[-1].args[0]]
+        assert planned and all(shards[0].owns(u) for u in planned), "Shards should only plan their own users"
+        
+        # Users taken over from another shard are dropped without this replica's previous state
+        gone, manual = [u for u in usernames[50:] if shards[0].owns(u)][:2]
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot(
+            {gone: True, manual: True}, {}, {}, managed={gone})
+        controller._last_fingerprint = None
+        controller.reconcile_users(ReconciliationStats())
+        drops = [op.username for op in controller.executor.execute.call_args_list[-1].args[0] if op.kind == "drop"]
+        assert drops == [gone], "Only users the controller created should be dropped"
+        
+        # Existing users created before the comment are marked once
+        controller.db_client.fetch_catalog_snapshot.return_value = CatalogSnapshot({planned[0]: True}, {}, {})
+        controller._last_fingerprint = None
+        controller.reconcile_users(ReconciliationStats())
+        controller.db_client.mark_managed.assert_called_once_with([planned[0]])
+        
+        now[0] += 60
+        standby = ReconciliationStats()
+        controller.reconcile_users(standby)
+        assert standby.standby and controller.is_ready(), "Replicas without a fresh Lease should stand by"
+    
+    # Advisory locks, then skip work another replica already did
+    executed = []
+    cursor = MagicMock()
+    cursor.__enter__.return_value = cursor
+    cursor.execute.side_effect = lambda statement, params=None: executed.append((statement, params))
+    cursor.fetchall.return_value = [("alice",)]
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    db = DatabaseClient.__new__(DatabaseClient)
+    db.target = None
+    db.advisory_locks = True
+    db.get_connection = lambda: conn
+    db.return_connection = lambda c: None
+    spec = UserSpec(username="x", database="postgres", roles=[])
+    ops = [UserOperation("create", name, spec=spec, password="pw") for name in ("bob", "alice")]
+    count = db.apply_batch("create", ops)
+    assert "pg_advisory_xact_lock" in executed[0][0] and executed[0][1][1] == ["alice", "bob"], \
+        "Locks should be taken in name order"
+    ddl = [repr(statement) for statement, _ in executed[2:]]
+    assert count == len(ddl) and not any("'alice'" in s for s in ddl), "Existing users should be skipped"
+    
+    print("✅ Replica coordination tests passed!")
+
+
+def test_async_controller():
+    """Test the asyncio engine with in-memory async clients"""
+    print("\n🧪 Testing AsyncPostgresUserController...")
+    
+    import asyncio
+    import base64
+    import time
+    from types import SimpleNamespace
+    from controller import (
+        AsyncPostgresUserController, AsyncDatabaseClient, CatalogSnapshot, ClusterTarget,
+        ReconciliationStats, UserOperation, UserSpec, StateManager
+    )
+    
+    # Statements come from the shared builder, rendered for asyncpg
+    statements = AsyncDatabaseClient().render_batch("create", [
+        UserOperation("create", "o'neil", spec=UserSpec("o'neil", "test", ["a"]), password="p'w"),
+    ])
+    assert statements[0] == "CREATE USER \"o'neil\" WITH PASSWORD E'p''w';", "Literals should be quoted"
+    assert statements[-1] == "GRANT \"a\" TO \"o'neil\";", "Roles should be granted"
+    statements = AsyncDatabaseClient(ClusterTarget("main", "db", dbname="app", user="admin")).render_batch(
+        "drop", [UserOperation("drop", "alice")])
+    assert 'ON DATABASE "app"' in statements[0] and 'TO "admin"' in statements[1], \
+        "Drops should use the client's database and admin user"
+    
+    # Drops release what the roles own in the other databases first
+    class FakePool:
+        def __init__(self):
+            self.executed = []
+        
+        async def fetch(self, query, *args):
+            return [("postgres", ["alice"]), ("orders", ["alice"])]
+        
+        def acquire(self):
+            pool = self
+            
+            class Connection:
+                async def __aenter__(self):
+                    return self
+                
+                async def __aexit__(self, *exc):
+                    return False
+                
+                def transaction(self):
+                    return self
+                
+                async def execute(self, statement):
+                    pool.executed.append(statement)
+            
+            return Connection()
+    
+    client = AsyncDatabaseClient()
+    client.pool = FakePool()
+    released = []
+    
+    async def drop_owned(dbname, usernames):
+        released.append((dbname, usernames))
+        return 2
+    
+    client.drop_owned = drop_owned
+    assert asyncio.run(client.apply_batch("drop", [UserOperation("drop", "alice")])) == 6
+    assert released == [("orders", ["alice"])], "Only the other databases should be worked on separately"
+    assert client.pool.executed[-1] == 'DROP USER IF EXISTS "alice";'
+    
+    class FakeK8s:
+        async def fetch_configmap(self, name, namespace):
+            await asyncio.sleep(0.1)
+            return "users:\n  - username: alice\n    roles: [read_only]\n"
+        
+        async def list_user_secrets(self, namespace):
+            await asyncio.sleep(0.1)
+            secret = SimpleNamespace(metadata=SimpleNamespace(name="user-alice-secret"),
+                                     data={"password": base64.b64encode(b"pw").decode()})
+            return [secret], "3"
+    
+    class FakeDB:
+        def __init__(self):
+            self.batches = []
+        
+        async def fetch_catalog_snapshot(self):
+            await asyncio.sleep(0.1)
+            return CatalogSnapshot({}, {}, {})
+        
+        async def apply_batch(self, kind, ops):
+            self.batches.append((kind, [op.username for op in ops]))
+            return len(ops)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeDB()
+        controller = AsyncPostgresUserController(
+            k8s_client=FakeK8s(), db_client=db, state_manager=StateManager(os.path.join(tmp, "state.json"))
+        )
+        stats = ReconciliationStats()
+        started = time.monotonic()
+        asyncio.run(controller.reconcile_users(stats))
+        elapsed = time.monotonic() - started
+        
+        assert elapsed < 0.25, "ConfigMap, Secrets and catalog should be fetched concurrently"
+        assert db.batches == [("create_role", ["read_only"]), ("create", ["alice"])], "Plan should be applied"
+        assert stats.users_created == 1 and stats.roles_created == 1, "Stats should be shared"
+        assert "alice" in controller.state_manager.load_state(), "State should be saved"
+    
+    print("✅ AsyncPostgresUserController tests passed!")
+
+
+def test_multi_cluster():
+    """Test cluster targets, labeled metrics and per-cluster isolation"""
+    print("\n🧪 Testing MultiClusterController...")
+    
+    import threading
+    import time
+    import controller
+    from controller import (MultiClusterController, ClusterTarget, Metrics, parse_cluster_targets,
+                            label_metrics, merge_metric_families, cluster_state_file)
+    
+    targets = parse_cluster_targets("eu=pg-eu.db:5433, us=pg-us.db")
+    params = [t.connection_params() for t in targets]
+    assert [(t.name, p["host"], p["port"]) for t, p in zip(targets, params)] == [
+        ("eu", "pg-eu.db", "5433"), ("us", "pg-us.db", controller.Config.DB_PORT)]
+    targets = parse_cluster_targets('[{"name": "ap", "host": "pg-ap.db", "dbname": "app"}]')
+    assert targets[0].connection_params()["dbname"] == "app", "JSON targets should override defaults"
+    assert cluster_state_file("eu", "/tmp/users_state.json") == "/tmp/users_state.eu.json"
+    
+    metrics = Metrics()
+    metrics.record_worker_batch("ddl-worker_0", 0.1)
+    text = label_metrics(metrics.export_prometheus(), {"cluster": "eu"})
+    assert 'postgres_controller_reconciliations_total{cluster="eu"} 0' in text
+    assert 'postgres_controller_worker_batches_total{cluster="eu",worker="ddl-worker_0"} 1' in text
+    merged = merge_metric_families([text, label_metrics(Metrics().export_prometheus(), {"cluster": "us"})])
+    assert merged.count("# TYPE postgres_controller_reconciliations_total") == 1, "Families should be merged"
+    assert 'postgres_controller_reconciliations_total{cluster="us"} 0' in merged
+    
+    cycles = []
+    
+    def factory(target):
+        if target.name == "down":
+            raise Exception("connection refused")
+        return Mock()
+    
+    def run_cycle(self, reason="scheduled"):
+        cycles.append((self.name, reason))
+    
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            patch.object(controller.Config, "STATE_FILE", os.path.join(tmpdir, "users_state.json")), \
+            patch.object(controller.Config, "SYNC_INTERVAL", 60), \
+            patch.object(controller.PostgresUserController, "run_cycle", run_cycle):
+        multi = MultiClusterController(
+            targets=[ClusterTarget("down", "a"), ClusterTarget("eu", "b"), ClusterTarget("us", "c")],
+            k8s_client=Mock(),
+            db_client_factory=factory
+        )
+        stop = threading.Event()
+        thread = threading.Thread(target=multi.run, args=(stop,))
+        thread.start()
+        deadline = time.time() + 5
+        while len(cycles) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        
+        assert sorted(cycles) == [("eu", "startup"), ("us", "startup")], "Healthy clusters should not wait"
+        assert sorted(multi.children) == ["eu", "us"], "Unreachable cluster should have no reconciler"
+        assert os.path.exists(os.path.join(tmpdir, "users_state.eu.db")), "State should be per cluster"
+        
+        multi.handle_watch_event("Secret", "MODIFIED", "user-alice-secret")
+        assert all(c._trigger.is_set() or c._pending_since is not None for c in multi.children.values())
+        
+        # The shared Kubernetes client reports its latency once, without a cluster label
+        assert multi.k8s_client.metrics is multi.metrics
+        assert all(c.k8s_client.metrics is multi.metrics for c in multi.children.values())
+        multi.metrics.observe("postgres_controller_kube_api_duration_seconds", 0.01, "list_secrets")
+        exported = multi.export_prometheus()
+        assert exported.count("# TYPE postgres_controller_kube_api_duration_seconds") == 1
+        assert 'postgres_controller_kube_api_duration_seconds_count{call="list_secrets"} 1' in exported
+        
+        stop.set()
+        thread.join(timeout=5)
+        assert not thread.is_alive(), "Controller should stop"
+        assert not multi.children, "Cluster reconcilers should be cleaned up"
+    
+    print("✅ MultiClusterController tests passed!")
+
+
+def test_metrics_server():
+    """Test latency histograms and the metrics/health HTTP endpoint"""
+    print("\n🧪 Testing metrics server and histograms...")
+    
+    import urllib.request
+    import urllib.error
+    from controller import Metrics, MetricsServer, PlanExecutor, UserOperation, UserSpec
+    
+    metrics = Metrics()
+    with metrics.time_phase("yaml_parse"):
+        pass
+    metrics.observe("postgres_controller_ddl_statement_duration_seconds", 0.2, "create")
+    metrics.observe("postgres_controller_ddl_statement_duration_seconds", 3.0, "create")
+    metrics.observe("postgres_controller_db_pool_wait_seconds", 0.0001)
+    
+    client = Mock()
+    client.apply_batch.side_effect = lambda kind, ops: len(ops)
+    spec = UserSpec(username="u", database="test", roles=["r"])
+    PlanExecutor(client, metrics=metrics).execute([UserOperation("create", "alice", spec=spec, password="pw")])
+    
+    text = metrics.export_prometheus()
+    assert "# TYPE postgres_controller_phase_duration_seconds histogram" in text
+    assert 'postgres_controller_phase_duration_seconds_count{phase="yaml_parse"} 1' in text
+    assert 'postgres_controller_phase_duration_seconds_count{phase="user_create"} 1' in text, \
+        "Executor phases should be timed"
+    assert 'postgres_controller_ddl_statement_duration_seconds_bucket{kind="create",le="0.25"} 1' in text
+    assert 'postgres_controller_ddl_statement_duration_seconds_bucket{kind="create",le="+Inf"} 2' in text
+    assert 'postgres_controller_ddl_statement_duration_seconds_sum{kind="create"} 3.2' in text
+    assert 'postgres_controller_db_pool_wait_seconds_bucket{le="0.001"} 1' in text
+    
+    controller = Mock()
+    controller.export_prometheus.return_value = text
+    controller.is_ready.return_value = False
+    server = MetricsServer(controller, port=0, host="127.0.0.1")
+    port = server.start()
+    try:
+        base = f"http://127.0.0.1:{port}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.status == 200
+            assert "postgres_controller_phase_duration_seconds" in response.read().decode()
+        with urllib.request.urlopen(f"{base}/healthz") as response:
+            assert response.status == 200
+        try:
+            urllib.request.urlopen(f"{base}/readyz")
+            assert False, "Should not be ready before the first cycle"
+        except urllib.error.HTTPError as e:
+            assert e.code == 503
+        controller.is_ready.return_value = True
+        with urllib.request.urlopen(f"{base}/readyz") as response:
+            assert response.status == 200
+    finally:
+        server.stop()
+    
+    print("✅ Metrics server tests passed!")
+
+
 def run_integration_test():
     """Run a mock integration test"""
     print("\n🧪 Running integration test...")
@@ -212,9 +2095,32 @@ def main():
         test_user_spec()
         test_reconciliation_stats()
         test_state_manager()
+        test_sqlite_state_manager()
         test_drift_detection()
         test_metrics()
         test_dry_run_mode()
+        test_watch_events()
+        test_catalog_snapshot()
+        test_plan_executor()
+        test_privilege_reconciliation()
+        test_password_drift()
+        test_desired_state_loader()
+        test_configmap_shards()
+        test_user_resources()
+        test_retrier()
+        test_failover_connections()
+        test_multi_database()
+        test_reconcile_plan()
+        test_role_graph()
+        test_drift_notifications()
+        test_secret_cache()
+        test_fingerprint_short_circuit()
+        test_parallel_executor()
+        test_work_queue()
+        test_replica_coordination()
+        test_async_controller()
+        test_multi_cluster()
+        test_metrics_server()
         run_integration_test()
         
         print("\n" + "=" * 60)